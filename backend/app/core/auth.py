@@ -7,7 +7,8 @@ from jose import jwt, JWTError
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from .config import settings
-from .database import SessionLocal
+from .deps import get_db
+from .principal_cache import principal_cache
 from app import models, schemas
 
 router = APIRouter(tags=["auth"])
@@ -16,13 +17,6 @@ router = APIRouter(tags=["auth"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__truncate_error=False)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password[:72], hashed_password)
 
@@ -69,13 +63,13 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "role": user.role, "uid": user.id}, 
+        data={"sub": user.username, "role": user.role, "uid": user.id, "tv": user.token_version or 0}, 
         expires_delta=access_token_expires
     )
     
     refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
     refresh_token = create_refresh_token(
-        data={"sub": user.username}, 
+        data={"sub": user.username, "uid": user.id, "tv": user.token_version or 0}, 
         expires_delta=refresh_token_expires
     )
     
@@ -107,20 +101,21 @@ def refresh_access_token(payload: schemas.TokenRefreshRequest, db: Session = Dep
         raise credentials_exception
     
     user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    # Token cấp trước lần đổi mật khẩu gần nhất (token_version tăng) không còn hiệu lực
+    if user is None or decoded_payload.get("tv", 0) != (user.token_version or 0):
         raise credentials_exception
         
     # Tạo access token mới
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     new_access_token = create_access_token(
-        data={"sub": user.username, "role": user.role, "uid": user.id}, 
+        data={"sub": user.username, "role": user.role, "uid": user.id, "tv": user.token_version or 0}, 
         expires_delta=access_token_expires
     )
     
     # Tạo refresh token mới (xoay vòng token để tăng bảo mật)
     new_refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
     new_refresh_token = create_refresh_token(
-        data={"sub": user.username}, 
+        data={"sub": user.username, "uid": user.id, "tv": user.token_version or 0}, 
         expires_delta=new_refresh_token_expires
     )
 
@@ -138,17 +133,29 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        import logging
-        logging.info(f"Validating token. Alg: {settings.ALGORITHM}, KeyPrefix: {settings.SECRET_KEY[:3]}...")
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+
+    uid = payload.get("uid")
+    token_version = payload.get("tv", 0)
+    if uid is not None:
+        cached = principal_cache.get(uid, token_version)
+        # id của user đã xóa có thể được cấp lại cho user mới (INTEGER PRIMARY KEY không
+        # AUTOINCREMENT): token chỉ hợp lệ khi "sub" vẫn khớp username
+        if cached is not None and cached.username == username:
+            # Gắn bản sao vào session của request, không truy vấn CSDL
+            return db.merge(cached, load=False)
+        user = db.get(models.User, uid)
+    else:
+        # Token cũ (chưa có uid)
+        user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None or user.username != username or (user.token_version or 0) != token_version:
         raise credentials_exception
+    principal_cache.put(user)
     return user
 
 def require_roles(*roles):
@@ -28,6 +28,7 @@ class Settings(BaseSettings):
     ADMIN_PASSWORD: str = "admin123"
     GEMINI_API_KEY: Optional[str] = None
     ID_CARD_EXTRACTOR_URL: str = "http://127.0.0.1:5009/extract"
+    MAX_UPLOAD_MB: int = 15  # Giới hạn dung lượng một ảnh upload
 
     # Telegram
     NOTIFY_TELEGRAM_ENABLED: bool = False
@@ -40,6 +41,7 @@ class Settings(BaseSettings):
     GSHEETS_LIVE_SHEET_ID: str = "1zenHc1PuDHvVcuctJnTVp8tdD-3xWMf36ozynLk7jHw"
     GSHEETS_ARCHIVE_SHEETS: Dict[str, str] = {}
     GSHEETS_SHEET_NAME: str = "Trang tính1"
+    VEHICLE_LOG_SYNC_SECONDS: int = 60  # Chu kỳ đồng bộ nhật ký xe vào bảng cục bộ
 
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), "..", "..", ".env")
@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 import unicodedata
-from typing import Generator
+import zlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Generator, List, Optional
 
 from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
@@ -28,6 +31,78 @@ def unaccent_string(text: str) -> str:
         return text
 
 
+def _search_fold_map() -> dict:
+    """
+    Ký tự -> dạng chuẩn hóa (bỏ dấu, đ/Đ -> d, chữ thường) cho chữ Latin-1 và tiếng Việt,
+    kèm các dấu kết hợp (văn bản dạng NFD) -> bỏ. Ký tự ngoài bảng giữ nguyên ở cả
+    search_fold() và search_fold_steps() nên hai phía luôn khớp nhau.
+    """
+    chars = [chr(cp) for cp in range(ord("A"), ord("Z") + 1)]
+    chars += [chr(cp) for cp in range(0x00C0, 0x0100)]   # Latin-1 Supplement
+    chars += ["Ă", "ă", "Đ", "đ", "Ĩ", "ĩ", "Ũ", "ũ", "Ơ", "ơ", "Ư", "ư"]
+    chars += [chr(cp) for cp in range(0x1EA0, 0x1EFA)]   # chữ có dấu tiếng Việt
+    # sắc, huyền, hỏi, ngã, nặng, mũ, trăng, móc
+    mapping = {chr(cp): "" for cp in (0x0300, 0x0301, 0x0302, 0x0303, 0x0306, 0x0309, 0x031B, 0x0323)}
+    for c in chars:
+        folded = unaccent_string(c).replace("đ", "d").replace("Đ", "D").lower()
+        if folded != c:
+            mapping[c] = folded
+    return mapping
+
+
+_SEARCH_FOLD_MAP = _search_fold_map()
+_SEARCH_FOLD_TABLE = str.maketrans(_SEARCH_FOLD_MAP)
+# Số replace() lồng nhau mỗi câu UPDATE (parser SQLite tràn stack khi lồng ~35 cấp)
+_SEARCH_FOLD_CHUNK = 24
+
+
+def search_fold(text: str) -> str:
+    """
+    Chuẩn hóa chuỗi cho chỉ mục tìm kiếm: bỏ dấu, đổi đ/Đ -> d, chữ thường.
+    Dùng cho từ khóa tìm kiếm; phía CSDL trigger dùng lower() + search_fold_steps().
+    """
+    if not isinstance(text, str):
+        return text
+    return text.translate(_SEARCH_FOLD_TABLE)
+
+
+def search_fold_steps(table: str, column: str, where: str) -> List[str]:
+    """
+    Các câu UPDATE (SQL thuần) hoàn tất search_fold cho `column` đã được ghi bằng lower(...).
+    Trigger không gọi hàm Python đăng ký trên kết nối, nên sqlite3 CLI, script sửa dữ
+    liệu hay trình duyệt CSDL vẫn ghi được vào guests.
+    """
+    items = [(c, f) for c, f in _SEARCH_FOLD_MAP.items() if not "A" <= c <= "Z"]
+    steps = []
+    for i in range(0, len(items), _SEARCH_FOLD_CHUNK):
+        expr = column
+        for char, folded in items[i:i + _SEARCH_FOLD_CHUNK]:
+            expr = f"replace({expr}, '{char}', '{folded}')"
+        steps.append(f"UPDATE {table} SET {column} = {expr} WHERE {where};")
+    return steps
+
+
+def search_fold_outdated(conn, name: str) -> bool:
+    """
+    True nếu dữ liệu đã chuẩn hóa của `name` (bảng chỉ mục) được tạo bằng định nghĩa
+    search_fold khác hiện tại (hoặc chưa ghi nhận); đồng thời ghi nhận định nghĩa mới.
+    Dấu vết lưu trong sync_state với name = 'search_fold:<name>'.
+    """
+    from sqlalchemy import text
+
+    key = f"search_fold:{name}"
+    signature = zlib.crc32("".join(search_fold_steps("t", "c", "1")).encode("utf-8"))
+    stored = conn.execute(text("SELECT version FROM sync_state WHERE name = :name"), {"name": key}).scalar()
+    if stored == signature:
+        return False
+    conn.execute(
+        text("INSERT INTO sync_state(name, version) VALUES (:name, :version) "
+             "ON CONFLICT(name) DO UPDATE SET version = excluded.version"),
+        {"name": key, "version": signature},
+    )
+    return True
+
+
 # -----------------------------
 # 2) Engine & Session
 # -----------------------------
@@ -71,12 +146,45 @@ SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, futu
 Base = declarative_base()
 
 
+def ensure_columns() -> None:
+    """
+    create_all() không thêm cột mới vào bảng đã tồn tại.
+    Hàm này ALTER TABLE ADD COLUMN cho các cột (nullable) còn thiếu trong CSDL cũ.
+    """
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in present:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{col.name}" {col_type}')
+
+
+def ensure_indexes() -> None:
+    """
+    create_all() không thêm index mới vào bảng đã tồn tại.
+    Hàm này tạo các index còn thiếu (idempotent) cho CSDL cũ.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
 # -----------------------------
 # 3) Dependency cho FastAPI
 # -----------------------------
 def get_db() -> Generator:
     """
-    Dependency chuẩn cho FastAPI.
+    Dependency chuẩn cho FastAPI: một Session (một unit-of-work) cho mỗi request.
+    Mọi nơi (core.deps, core.auth, routers) đều dùng chính hàm này, nên FastAPI
+    cache dependency và get_current_user dùng chung session với handler.
     Ví dụ dùng:
         def endpoint(db: Session = Depends(get_db)):
             ...
@@ -87,4 +195,47 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+
+# -----------------------------
+# 4) Đo số kết nối CSDL mỗi request
+# -----------------------------
+@dataclass
+class RequestDbStats:
+    path: str
+    in_use: int = 0
+    peak: int = 0
+    checkouts: int = 0
+
+
+_request_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def begin_request_db_stats(path: str):
+    """Bắt đầu đếm kết nối cho request hiện tại (gọi từ middleware). Trả về (stats, token)."""
+    stats = RequestDbStats(path=path)
+    return stats, _request_db_stats.set(stats)
+
+
+def end_request_db_stats(token) -> None:
+    _request_db_stats.reset(token)
+
+
+@event.listens_for(engine, "checkout")
+def _track_checkout(dbapi_connection, connection_record, connection_proxy):
+    # ContextVar được threadpool của FastAPI sao chép sang luồng chạy handler sync
+    stats = _request_db_stats.get()
+    if stats is None:
+        return
+    stats.in_use += 1
+    stats.checkouts += 1
+    stats.peak = max(stats.peak, stats.in_use)
+    connection_record.info["request_db_stats"] = stats
+
+
+@event.listens_for(engine, "checkin")
+def _track_checkin(dbapi_connection, connection_record):
+    stats = connection_record.info.pop("request_db_stats", None)
+    if stats is not None:
+        stats.in_use -= 1
+
 # Imports removed to adhere to architecture standards. Models are registered via app.models import in main.py
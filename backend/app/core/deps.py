@@ -1,10 +1,6 @@
 # File: security_mgmt_dev/backend/app/deps.py
-from typing import Generator
-from .database import SessionLocal
+# get_db dùng chung một hàm với core.database / core.auth: FastAPI cache dependency theo
+# hàm, nên mỗi request chỉ mở một Session dù endpoint phụ thuộc cả get_current_user.
+from .database import get_db
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+__all__ = ["get_db"]
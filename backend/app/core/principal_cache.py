@@ -0,0 +1,74 @@
+# File: backend/app/core/principal_cache.py
+"""
+Cache (LRU + TTL, trong bộ nhớ tiến trình) người dùng đã xác thực cho get_current_user.
+
+Khóa là (uid, token_version) lấy từ JWT: request thông thường không cần truy vấn
+bảng users. Giá trị là bản sao User ở trạng thái detached; get_current_user gắn vào
+session của request bằng db.merge(load=False) nên không phát sinh câu SELECT.
+
+UserService gọi invalidate()/clear() sau khi commit thay đổi người dùng; TTL giới
+hạn thời gian dữ liệu cũ tồn tại nếu bảng users bị sửa ngoài ứng dụng.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+PRINCIPAL_CACHE_SIZE = 1024
+PRINCIPAL_CACHE_TTL_SECONDS = 300
+
+
+def snapshot_user(user):
+    """Bản sao detached chỉ gồm các cột của User (không kèm relationship)."""
+    cls = type(user)
+    copy = cls(**{attr.key: getattr(user, attr.key) for attr in sa_inspect(cls).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+
+class PrincipalCache:
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid: int, token_version: int):
+        key = (uid, token_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def put(self, user) -> None:
+        key = (user.id, user.token_version or 0)
+        snapshot = snapshot_user(user)
+        with self._lock:
+            # Mỗi uid chỉ giữ một phiên bản
+            for stale in [k for k in self._entries if k[0] == user.id and k != key]:
+                del self._entries[stale]
+            self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uid: Optional[int]) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == uid]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
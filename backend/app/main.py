@@ -4,7 +4,7 @@ import logging
 from datetime import datetime
 import pytz
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
@@ -23,11 +23,23 @@ except Exception:
     pass
 
 from .core.config import settings
-from .core.database import engine, Base, get_db, SessionLocal
+from .core.database import (
+    engine, Base, get_db, SessionLocal, ensure_columns, ensure_indexes,
+    begin_request_db_stats, end_request_db_stats,
+)
+from .modules.guest.search_index import ensure_search_index
+from .modules.guest.suggestion_index import ensure_suggestion_index
+from .modules.guest.estimated_utc import backfill_estimated_utc
+from .modules.sync.tracking import ensure_change_tracking
+from .modules.blob.refcount import ensure_blob_refcounts
+from .modules.report.rollups import ensure_report_rollups
+from .modules.report.cache import ensure_report_version
 from .utils.logging_config import setup_logging
 from . import models
 from .services.form_sync_service import sync_google_form_registrations # Import Form Sync Service
+from .services.vehicle_log_sync_service import shutdown_fetch_pool, sync_vehicle_log_mirror
 from .modules.guest.service import long_term_guest_service
+from .services.image_derivatives import image_derivatives
 
 # Routers
 from .core.auth import router as auth_router, get_password_hash
@@ -46,6 +58,8 @@ from .routers.security_events import router as security_events_router
 from .routers.security_events import router as security_events_router
 from .routers.purchasing import router as purchasing_router
 from .routers.notifications import router as notifications_router
+from .routers.sync import router as sync_router
+from .routers.events import router as events_router
 
 app = FastAPI(
     title="Ứng dụng an ninh nội bộ - Local Security App",
@@ -73,9 +87,34 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# Mỗi request chỉ nên giữ một kết nối CSDL (Session từ get_db dùng chung cho auth và handler).
+# Request nào mở đồng thời nhiều hơn sẽ bị ghi cảnh báo để dễ phát hiện Session tạo thừa.
+@app.middleware("http")
+async def check_db_connections_per_request(request: Request, call_next):
+    stats, token = begin_request_db_stats(request.url.path)
+    try:
+        return await call_next(request)
+    finally:
+        end_request_db_stats(token)
+        if stats.peak > 1:
+            logging.warning(
+                f"[db] {request.method} {request.url.path} held {stats.peak} database connections at once "
+                f"({stats.checkouts} checkouts)"
+            )
+
 # Tạo CSDL (nếu chưa có) và thư mục
 try:
     Base.metadata.create_all(bind=engine)
+    ensure_columns()
+    ensure_indexes()
+    backfill_estimated_utc(engine)
+    ensure_search_index(engine)
+    ensure_suggestion_index(engine)
+    ensure_change_tracking(engine)
+    ensure_blob_refcounts(engine)
+    ensure_report_rollups(engine)
+    ensure_report_version(engine)
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 except Exception as e:
     logging.error(f"Error initializing database or directories: {e}")
@@ -98,6 +137,8 @@ app.include_router(print_tracking_router)
 app.include_router(security_events_router)
 app.include_router(purchasing_router)
 app.include_router(notifications_router)
+app.include_router(sync_router)
+app.include_router(events_router)
 
 # Mount static files
 app.mount(f"/{os.path.basename(settings.UPLOAD_DIR)}", StaticFiles(directory=settings.UPLOAD_DIR), name="static")
@@ -155,6 +196,28 @@ def on_startup():
         finally:
              db.close()
 
+    # Job dọn tombstone delta-sync cũ (hằng ngày)
+    def prune_sync_tombstones_job():
+        db = SessionLocal()
+        try:
+            from app.modules.sync.service import sync_service
+            sync_service.prune_tombstones(db)
+        except Exception as e:
+             logging.error(f"[sync] Tombstone prune failed: {e}", exc_info=True)
+        finally:
+             db.close()
+
+    # Job dọn blob ảnh không còn tham chiếu (hằng ngày)
+    def collect_blob_garbage_job():
+        db = SessionLocal()
+        try:
+            from app.modules.blob.service import blob_service
+            blob_service.collect_garbage(db)
+        except Exception as e:
+             logging.error(f"[blob] GC failed: {e}", exc_info=True)
+        finally:
+             db.close()
+
     # Chạy ngay khi startup
     try:
         create_daily_guest_entries()
@@ -169,15 +232,19 @@ def on_startup():
     # Bắt đầu scheduler
     try:
         sched = BackgroundScheduler(timezone=settings.TZ)
+        # Job Khách dài hạn: một lần lúc sang ngày mới (giờ địa phương). Thay đổi đăng ký
+        # dài hạn trong ngày được LongTermGuestService cập nhật ngay, không cần quét định kỳ.
         sched.add_job(
             create_daily_guest_entries,
-            trigger=IntervalTrigger(minutes=30),
+            trigger='cron',
+            hour=0,
+            minute=0,
             id="create_daily_guests_job",
             name="Create daily guest entries from long-term registrations",
             replace_existing=True,
             coalesce=True,
             max_instances=1,
-            misfire_grace_time=30,
+            misfire_grace_time=3600,
         )
         # Job đồng bộ Google Form (30 giây/lần)
         sched.add_job(
@@ -190,6 +257,32 @@ def on_startup():
             max_instances=1,
             misfire_grace_time=10,
         )
+        # Job đồng bộ nhật ký xe vào bảng cục bộ (chạy ngay khi khởi động, sau đó định kỳ)
+        sched.add_job(
+            sync_vehicle_log_mirror,
+            trigger=IntervalTrigger(seconds=settings.VEHICLE_LOG_SYNC_SECONDS),
+            next_run_time=datetime.now(pytz.timezone(settings.TZ)),
+            id="sync_vehicle_log_job",
+            name="Mirror vehicle log sheets into the local table",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=30,
+        )
+        # Đọc lại toàn bộ mỗi đêm để bắt các dòng cũ bị sửa trên sheet
+        sched.add_job(
+            sync_vehicle_log_mirror,
+            trigger='cron',
+            hour=2,
+            minute=0,
+            kwargs={"full": True},
+            id="full_sync_vehicle_log_job",
+            name="Full re-sync of vehicle log sheets",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=3600,
+        )
         # Job No-Show Guests (23:55)
         sched.add_job(
             process_no_show_guests_job,
@@ -203,6 +296,30 @@ def on_startup():
             max_instances=1,
             misfire_grace_time=60,
         )
+        sched.add_job(
+            prune_sync_tombstones_job,
+            trigger='cron',
+            hour=3,
+            minute=0,
+            id="prune_sync_tombstones_job",
+            name="Prune old delta-sync tombstones",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=60,
+        )
+        sched.add_job(
+            collect_blob_garbage_job,
+            trigger='cron',
+            hour=3,
+            minute=30,
+            id="collect_blob_garbage_job",
+            name="Remove unreferenced image blobs",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+            misfire_grace_time=3600,
+        )
         sched.start()
         app.state.scheduler = sched
         logging.info(f"[scheduler] Scheduler started (TZ={settings.TZ}).")
@@ -217,6 +334,8 @@ def on_shutdown():
         if sched:
             sched.shutdown()
             logging.info("[long_term] Scheduler shut down.")
+        image_derivatives.shutdown()
+        shutdown_fetch_pool()
     except Exception as e:
         logging.error(f"Error shutting down scheduler: {e}", exc_info=True)
 
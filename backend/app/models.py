@@ -4,7 +4,7 @@
 # This file re-exports models from their new modular locations.
 
 from app.modules.user.model import User, get_local_time
-from app.modules.guest.model import Guest, GuestImage, LongTermGuest
+from app.modules.guest.model import Guest, GuestImage, LongTermGuest, GuestSuggestion
 from app.modules.notification.model import Notification
 from app.modules.asset.model import (
     AssetLog, AssetImage, 
@@ -16,5 +16,11 @@ from app.modules.purchasing.model import (
     PURCHASING_STATUS_NEW, PURCHASING_STATUS_PENDING, 
     PURCHASING_STATUS_APPROVED, PURCHASING_STATUS_REJECTED
 )
+from app.modules.sync.model import SyncState, SyncTombstone
+from app.modules.blob.model import Blob
+from app.modules.report.model import (
+    GuestDailyRollup, GuestCheckinRollup, GuestPlateRollup, AssetDailyRollup, AssetReturnRollup
+)
+from app.modules.vehicle_log.model import VehicleLogEntry, VehicleLogSheetState
 
 # Re-export handy things if needed, but preferably use modules directly.
\ No newline at end of file
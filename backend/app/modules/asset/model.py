@@ -55,6 +55,8 @@ class AssetLog(Base):
     check_in_back_by = relationship("User", foreign_keys=[check_in_back_by_user_id])
 
     created_at = Column(DateTime, default=get_local_time)
+    # Phiên bản thay đổi, do trigger của app/modules/sync gán (dùng cho /sync/changes)
+    row_version = Column(Integer, index=True)
     
     # Image relationship
     images = relationship("AssetImage", back_populates="asset", cascade="all, delete-orphan")
@@ -64,5 +66,8 @@ class AssetImage(Base):
     id = Column(Integer, primary_key=True, index=True)
     asset_id = Column(Integer, ForeignKey("asset_log.id"), nullable=False)
     image_path = Column(String(255), nullable=False)
+    # Ảnh phái sinh WebP (app/services/image_derivatives.py), NULL khi chưa tạo xong
+    thumb_path = Column(String(255), nullable=True)
+    preview_path = Column(String(255), nullable=True)
     
     asset = relationship("AssetLog", back_populates="images")
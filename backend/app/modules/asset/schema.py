@@ -6,6 +6,8 @@ from app.modules.user.schema import UserRead
 class AssetImageRead(BaseModel):
     id: int
     image_path: str
+    thumb_path: Optional[str] = None
+    preview_path: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
 class AssetLogBase(BaseModel):
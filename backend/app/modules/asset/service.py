@@ -5,18 +5,51 @@ import os
 import uuid
 import logging
 from typing import List, Optional
-import io
-import pandas as pd
 
 from app import models
 from app.modules.asset import schema as schemas
 from app.core import config
 from app.utils.notifications import send_telegram_message, send_asset_event_to_archive_background
+from app.services.image_derivatives import image_derivatives, remove_derivatives
+from app.modules.blob.service import blob_service, is_blob_path
+from app.services.upload_service import StagedUpload
+from app.services.event_broker import event_broker, publish_asset_event, ASSET_GATE_ROLES
+from app.utils.excel_export import EXPORT_YIELD_PER, ROW_NUMBER, ExcelColumn, ExcelSheetSpec, stream_xlsx
 
 logger = logging.getLogger(__name__)
 
 SECURITY_EVENT_STATUS = "security_event"
 
+_ASSET_CELL = {"border": 1, "valign": "top"}
+
+# Cột file Excel "Sổ theo dõi tài sản"; mỗi dòng là một AssetLog (đã joinedload người đăng ký / bảo vệ)
+ASSET_EXPORT_SHEET = ExcelSheetSpec(
+    sheet_name="Assets",
+    header_format={"bold": True, "align": "center", "bg_color": "#D3D3D3", "border": 1},
+    cell_format=_ASSET_CELL,
+    columns=[
+        ROW_NUMBER,
+        ExcelColumn("Mã phiếu", lambda a: a.id, kind="number", width=20),
+        ExcelColumn("Ngày tạo", lambda a: a.created_at, kind="datetime", width=20),
+        ExcelColumn("Người đăng ký", lambda a: a.registered_by.full_name if a.registered_by else "N/A", width=20),
+        ExcelColumn("Mã NV", lambda a: a.employee_code, width=20),
+        ExcelColumn("Bộ phận", lambda a: a.department, width=20),
+        ExcelColumn("Nơi đến", lambda a: a.destination, width=20),
+        ExcelColumn("Lý do/Mô tả", lambda a: a.description_reason, width=40),
+        ExcelColumn("Tài sản", lambda a: a.asset_description, width=40),
+        ExcelColumn("Số lượng", lambda a: a.quantity, kind="number", width=20),
+        ExcelColumn("Trạng thái", lambda a: a.status, width=20),
+        ExcelColumn("Giờ ra", lambda a: a.check_out_time, kind="datetime", width=20),
+        ExcelColumn("BV cho ra", lambda a: a.check_out_by.full_name if a.check_out_by else "", width=20),
+        ExcelColumn("Dự kiến về", lambda a: a.expected_return_date, kind="date", width=20),
+        ExcelColumn("Giờ về", lambda a: a.check_in_back_time, kind="datetime", width=20),
+        ExcelColumn("BV nhận về", lambda a: a.check_in_back_by.full_name if a.check_in_back_by else "", width=20),
+        ExcelColumn("QL Việt", lambda a: a.vietnamese_manager_name, width=20),
+        ExcelColumn("QL Hàn", lambda a: a.korean_manager_name, width=20),
+    ],
+)
+
+
 class AssetService:
     @staticmethod
     def create_asset(
@@ -54,6 +87,7 @@ class AssetService:
         db.add(db_asset)
         db.commit()
         db.refresh(db_asset)
+        publish_asset_event("asset.created", db_asset)
 
         # Basic Telegram notification
         try:
@@ -84,12 +118,11 @@ class AssetService:
     def upload_asset_image(
         db: Session,
         asset_id: int,
-        file_filename: str,
-        file_content: bytes,
+        upload: StagedUpload,
         current_user: models.User
     ) -> models.AssetImage:
         """
-        Upload asset image logic.
+        Upload asset image logic (file đã nhận qua receive_upload()).
         """
         if current_user.role not in ["admin", "manager", "staff"]:
             raise PermissionError("Access denied")
@@ -101,26 +134,20 @@ class AssetService:
         if current_user.role == "staff" and db_asset.registered_by_user_id != current_user.id:
             raise PermissionError("Not owner")
             
-        ext = os.path.splitext(file_filename)[1]
-        unique_filename = f"{uuid.uuid4()}{ext}"
-        
-        save_path = os.path.join(config.settings.UPLOAD_DIR, "assets", unique_filename)
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        
-        with open(save_path, "wb") as buffer:
-            buffer.write(file_content)
-            
         db_image = models.AssetImage(
             asset_id=asset_id,
-            image_path=f"assets/{unique_filename}"
+            image_path=blob_service.put_staged(db, upload)
         )
         db.add(db_image)
         db.commit()
         db.refresh(db_image)
+        image_derivatives.submit(models.AssetImage, db_image.id, db_image.image_path)
         return db_image
 
     @staticmethod
     def _archive_asset_image(image_path: str):
+        if is_blob_path(image_path):
+            return  # Ảnh trong blob store: job GC xóa khi không còn tham chiếu
         try:
             archive_dir = os.path.join(config.settings.UPLOAD_DIR, "archived_assets")
             os.makedirs(archive_dir, exist_ok=True)
@@ -160,6 +187,7 @@ class AssetService:
             raise PermissionError("Access denied")
             
         AssetService._archive_asset_image(db_image.image_path)
+        remove_derivatives(db_image)
         db.delete(db_image)
         db.commit()
         return True
@@ -186,6 +214,12 @@ class AssetService:
             .order_by(models.AssetLog.created_at.desc())
         )
 
+        # Router truyền chuỗi YYYY-MM-DD
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+
         if start_date:
             start_dt = datetime.combine(start_date, datetime.min.time())
             query = query.filter(models.AssetLog.created_at >= start_dt)
@@ -241,6 +275,43 @@ class AssetService:
         results = db.scalars(query).unique().all()
         return results
 
+    @staticmethod
+    def _apply_checkout(db_asset: models.AssetLog, current_user: models.User) -> bool:
+        """
+        Chuyển trạng thái RA cổng (chưa commit). Trả về True nếu là hàng có hẹn về.
+        Raises ValueError nếu trạng thái hiện tại không cho phép.
+        """
+        if db_asset.status == SECURITY_EVENT_STATUS:
+             raise ValueError("Security event cannot be checked out")
+        
+        if db_asset.status != models.ASSET_STATUS_PENDING_OUT:
+            raise ValueError(f"Asset status is '{db_asset.status}', cannot checkout")
+
+        is_returnable = (db_asset.estimated_datetime is not None) or (db_asset.expected_return_date is not None)
+        now = models.get_local_time()
+        db_asset.check_out_time = now
+        db_asset.check_out_by_user_id = current_user.id
+        if is_returnable:
+            db_asset.status = models.ASSET_STATUS_CHECKED_OUT
+        else:
+            db_asset.status = models.ASSET_STATUS_RETURNED
+            db_asset.check_in_back_time = now
+            db_asset.check_in_back_by_user_id = current_user.id
+        return is_returnable
+
+    @staticmethod
+    def _apply_return(db_asset: models.AssetLog, current_user: models.User) -> None:
+        """Chuyển trạng thái VỀ cổng (chưa commit). Raises ValueError nếu không hợp lệ."""
+        if db_asset.status == SECURITY_EVENT_STATUS:
+            raise ValueError("Security event")
+            
+        if db_asset.status != models.ASSET_STATUS_CHECKED_OUT:
+            raise ValueError(f"Status is '{db_asset.status}', cannot confirm return")
+
+        db_asset.status = models.ASSET_STATUS_RETURNED
+        db_asset.check_in_back_time = models.get_local_time()
+        db_asset.check_in_back_by_user_id = current_user.id
+
     @staticmethod
     def confirm_asset_checkout(
         db: Session,
@@ -256,29 +327,11 @@ class AssetService:
         if not db_asset:
             return None
         
-        if db_asset.status == SECURITY_EVENT_STATUS:
-             raise ValueError("Security event cannot be checked out")
-        
-        if db_asset.status != models.ASSET_STATUS_PENDING_OUT:
-            raise ValueError(f"Asset status is '{db_asset.status}', cannot checkout")
-
-        is_returnable = (db_asset.estimated_datetime is not None) or (db_asset.expected_return_date is not None)
-        
-        status_msg = ""
-        if is_returnable:
-            db_asset.status = models.ASSET_STATUS_CHECKED_OUT
-            db_asset.check_out_time = models.get_local_time()
-            db_asset.check_out_by_user_id = current_user.id
-            status_msg = "HÀNG ĐÃ RA"
-        else:
-            db_asset.status = models.ASSET_STATUS_RETURNED
-            db_asset.check_out_time = models.get_local_time()
-            db_asset.check_out_by_user_id = current_user.id
-            db_asset.check_in_back_time = models.get_local_time()
-            db_asset.check_in_back_by_user_id = current_user.id
-            status_msg = "HÀNG ĐÃ RA (KHÔNG VỀ)"
+        is_returnable = AssetService._apply_checkout(db_asset, current_user)
+        status_msg = "HÀNG ĐÃ RA" if is_returnable else "HÀNG ĐÃ RA (KHÔNG VỀ)"
         
         db.commit()
+        publish_asset_event("asset.checked_out", db_asset)
 
         try:
             msg = f"""
@@ -317,16 +370,9 @@ class AssetService:
         if not db_asset:
             return None
             
-        if db_asset.status == SECURITY_EVENT_STATUS:
-            raise ValueError("Security event")
-            
-        if db_asset.status != models.ASSET_STATUS_CHECKED_OUT:
-            raise ValueError(f"Status is '{db_asset.status}', cannot confirm return")
-
-        db_asset.status = models.ASSET_STATUS_RETURNED
-        db_asset.check_in_back_time = models.get_local_time()
-        db_asset.check_in_back_by_user_id = current_user.id
+        AssetService._apply_return(db_asset, current_user)
         db.commit()
+        publish_asset_event("asset.returned", db_asset)
 
         try:
             msg = f"""
@@ -419,8 +465,13 @@ class AssetService:
             AssetService._archive_asset_image(image.image_path)
             db.delete(image)
         
+        deleted_info = {"id": db_asset.id, "registered_by_user_id": db_asset.registered_by_user_id}
         db.delete(db_asset)
         db.commit()
+        event_broker.publish(
+            "asset.deleted", {"id": deleted_info["id"]},
+            roles=ASSET_GATE_ROLES, user_ids=[deleted_info["registered_by_user_id"]]
+        )
         return True
 
     @staticmethod
@@ -458,6 +509,12 @@ class AssetService:
         if current_user.role == 'staff':
             query = query.filter(models.AssetLog.registered_by_user_id == current_user.id)
 
+        # Router truyền chuỗi YYYY-MM-DD
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+
         if start_date:
             start_dt = datetime.combine(start_date, datetime.min.time())
             query = query.filter(models.AssetLog.created_at >= start_dt)
@@ -471,60 +528,8 @@ class AssetService:
         if department:
             query = query.filter(models.AssetLog.department.ilike(f"%{department}%"))
 
-        results = db.scalars(query).all()
-
-        data = []
-        for idx, asset in enumerate(results, start=1):
-            reg = asset.registered_by
-            out_by = asset.check_out_by
-            in_by = asset.check_in_back_by
-            
-            data.append({
-                "STT": idx,
-                "Mã phiếu": asset.id,
-                "Ngày tạo": asset.created_at.strftime("%d/%m/%Y %H:%M") if asset.created_at else "",
-                "Người đăng ký": reg.full_name if reg else "N/A",
-                "Mã NV": asset.employee_code,
-                "Bộ phận": asset.department,
-                "Nơi đến": asset.destination,
-                "Lý do/Mô tả": asset.description_reason,
-                "Tài sản": asset.asset_description or "",
-                "Số lượng": asset.quantity,
-                "Trạng thái": asset.status,
-                "Giờ ra": asset.check_out_time.strftime("%d/%m/%Y %H:%M") if asset.check_out_time else "",
-                "BV cho ra": out_by.full_name if out_by else "",
-                "Dự kiến về": asset.expected_return_date.strftime("%d/%m/%Y") if asset.expected_return_date else "",
-                "Giờ về": asset.check_in_back_time.strftime("%d/%m/%Y %H:%M") if asset.check_in_back_time else "",
-                "BV nhận về": in_by.full_name if in_by else "",
-                "QL Việt": asset.vietnamese_manager_name or "",
-                "QL Hàn": asset.korean_manager_name or ""
-            })
-
-        df = pd.DataFrame(data)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Assets')
-            workbook = writer.book
-            worksheet = writer.sheets['Assets']
-            
-            header_fmt = workbook.add_format({'bold': True, 'align': 'center', 'bg_color': '#D3D3D3', 'border': 1})
-            date_fmt = workbook.add_format({'num_format': 'dd/mm/yyyy hh:mm', 'align': 'left', 'border': 1})
-            text_fmt = workbook.add_format({'text_wrap': True, 'valign': 'top', 'border': 1})
-            
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_fmt)
-
-            for i, col in enumerate(df.columns):
-                width = 20
-                if col in ["Lý do/Mô tả", "Tài sản"]:
-                    width = 40
-                elif col == "STT":
-                    width = 5
-                
-                worksheet.set_column(i, i, width)
-
-        output.seek(0)
-        return output
+        rows = db.scalars(query.execution_options(yield_per=EXPORT_YIELD_PER))
+        filename = f"so_theo_doi_tai_san_{models.get_local_time().strftime('%Y%m%d_%H%M')}.xlsx"
+        return stream_xlsx(ASSET_EXPORT_SHEET, rows, filename)
               
 asset_service = AssetService()
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.core.database import Base
+
+class Blob(Base):
+    """
+    File ảnh lưu theo nội dung (SHA-256) trong uploads/blobs/.
+    Nhiều dòng ảnh (GuestImage, AssetImage, PurchasingImage) có thể trỏ cùng một blob qua image_path;
+    ref_count do trigger SQLite duy trì (app/modules/blob/refcount.py).
+    """
+    __tablename__ = "blobs"
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(255), unique=True, nullable=False)  # tương đối so với UPLOAD_DIR
+    size = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    # Ghi bởi SQLite (UTC): lúc tạo / lúc ref_count về 0 (NULL khi đang được dùng)
+    created_at = Column(DateTime, server_default=func.current_timestamp())
+    released_at = Column(DateTime, index=True, server_default=func.current_timestamp())
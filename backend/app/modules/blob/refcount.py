@@ -0,0 +1,74 @@
+"""
+Đếm tham chiếu cho blob store (bảng blobs).
+
+Trigger SQLite trên các bảng ảnh tăng/giảm blobs.ref_count theo image_path, nên
+mọi thao tác ghi (kể cả query.delete() hàng loạt, cascade khi xóa khách) đều cập
+nhật trong cùng transaction. Khi ref_count về 0, released_at được gán để job GC
+xóa file sau thời gian chờ. Ảnh cũ (đường dẫn ngoài blobs/) không khớp dòng nào
+nên trigger không ảnh hưởng.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TABLES = ("guest_images", "asset_images", "purchasing_images")
+
+
+def _acquire(ref: str) -> str:
+    return f"""
+        UPDATE blobs SET ref_count = ref_count + 1, released_at = NULL
+        WHERE path = {ref}.image_path;"""
+
+
+def _release(ref: str) -> str:
+    return f"""
+        UPDATE blobs SET ref_count = max(ref_count - 1, 0),
+            released_at = CASE WHEN ref_count <= 1 THEN CURRENT_TIMESTAMP ELSE released_at END
+        WHERE path = {ref}.image_path;"""
+
+
+def _triggers() -> dict:
+    triggers = {}
+    for table in IMAGE_TABLES:
+        triggers[f"trg_blob_ref_{table}_ai"] = f"""
+            CREATE TRIGGER trg_blob_ref_{table}_ai AFTER INSERT ON {table} BEGIN
+                {_acquire("NEW")}
+            END"""
+        triggers[f"trg_blob_ref_{table}_ad"] = f"""
+            CREATE TRIGGER trg_blob_ref_{table}_ad AFTER DELETE ON {table} BEGIN
+                {_release("OLD")}
+            END"""
+        triggers[f"trg_blob_ref_{table}_au"] = f"""
+            CREATE TRIGGER trg_blob_ref_{table}_au AFTER UPDATE OF image_path ON {table}
+            WHEN OLD.image_path IS NOT NEW.image_path BEGIN
+                {_release("OLD")}
+                {_acquire("NEW")}
+            END"""
+    return triggers
+
+
+def recount_blob_refs(conn) -> None:
+    """Tính lại ref_count từ các bảng ảnh (tự sửa lệch nếu có)."""
+    refs = " UNION ALL ".join(f"SELECT image_path FROM {t}" for t in IMAGE_TABLES)
+    conn.execute(text(f"""
+        UPDATE blobs SET ref_count = (SELECT count(*) FROM ({refs}) r WHERE r.image_path = blobs.path)
+    """))
+    conn.execute(text("""
+        UPDATE blobs SET released_at = CASE
+            WHEN ref_count > 0 THEN NULL
+            ELSE coalesce(released_at, CURRENT_TIMESTAMP) END
+    """))
+
+
+def ensure_blob_refcounts(engine: Engine) -> None:
+    """Tạo trigger (idempotent) và đối soát ref_count lúc khởi động."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name, ddl in _triggers().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+        recount_blob_refs(conn)
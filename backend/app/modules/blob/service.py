@@ -0,0 +1,110 @@
+"""
+Blob store: lưu ảnh upload theo nội dung (SHA-256) trong UPLOAD_DIR/blobs/ab/cd/<sha256><ext>.
+
+Cùng một ảnh (ví dụ ảnh CCCD của khách đến nhiều lần) chỉ lưu một file; các dòng
+ảnh trỏ tới cùng image_path và được đếm tham chiếu bằng trigger (refcount.py).
+Xóa ảnh chỉ giảm ref_count; job GC xóa file khi blob không còn ai dùng quá
+BLOB_GC_GRACE_DAYS ngày (thay cho việc chuyển file vào archived_*).
+"""
+import logging
+import os
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+BLOB_GC_GRACE_DAYS = 30
+
+
+def is_blob_path(image_path: str | None) -> bool:
+    return bool(image_path) and image_path.replace("\\", "/").startswith(f"{BLOB_DIR}/")
+
+
+class BlobService:
+    @staticmethod
+    def put_staged(db: Session, upload) -> str:
+        """
+        Lưu file đã nhận qua upload_service.receive_upload() (đã có SHA-256, đã kiểm tra
+        loại): chỉ đổi tên file tạm vào blob store, không đọc lại nội dung.
+        """
+        return BlobService._adopt(db, upload.path, upload.sha256, upload.size, upload.extension)
+
+    @staticmethod
+    def _adopt(db: Session, tmp_path: str, sha: str, size: int, ext: str) -> str:
+        """Upsert dòng blobs rồi chuyển `tmp_path` vào chỗ (nếu blob chưa có file)."""
+        candidate = f"{BLOB_DIR}/{sha[:2]}/{sha[2:4]}/{sha}{ext}"
+        # Upsert trước khi kiểm tra file: giữ khóa ghi SQLite đến khi caller commit,
+        # nên job GC không thể xóa blob này giữa chừng.
+        path = db.execute(text("""
+            INSERT INTO blobs (sha256, path, size, ref_count)
+            VALUES (:sha, :path, :size, 0)
+            ON CONFLICT(sha256) DO UPDATE SET released_at = blobs.released_at
+            RETURNING path
+        """), {"sha": sha, "path": candidate, "size": size}).scalar_one()
+
+        dest = os.path.join(config.settings.UPLOAD_DIR, path)
+        if os.path.exists(dest):
+            logger.info(f"[blob] Reused existing blob {path}")
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)
+        return path
+
+    @staticmethod
+    def remove_legacy_file(image_path: str) -> None:
+        """Xóa file ảnh kiểu cũ (ngoài blob store). File trong blobs/ do GC xử lý."""
+        if not image_path or is_blob_path(image_path):
+            return
+        try:
+            full_path = os.path.join(config.settings.UPLOAD_DIR, image_path)
+            if os.path.exists(full_path):
+                os.remove(full_path)
+        except OSError as e:
+            logger.error(f"[blob] Could not delete file {image_path}: {e}")
+
+    @staticmethod
+    def collect_garbage(db: Session, grace_days: int = BLOB_GC_GRACE_DAYS) -> int:
+        """
+        Xóa blob có ref_count = 0 quá `grace_days` ngày (file gốc + ảnh phái sinh).
+        Mỗi blob xóa trong một transaction riêng: DELETE giữ khóa ghi nên upload trùng
+        nội dung đang chạy song song sẽ chờ, sau đó thấy file đã mất và ghi lại.
+        """
+        from app.services.image_derivatives import DERIVATIVES, derivative_path
+
+        candidates = db.execute(text("""
+            SELECT sha256 FROM blobs
+            WHERE ref_count = 0 AND released_at <= datetime('now', :age)
+        """), {"age": f"-{int(grace_days)} days"}).scalars().all()
+        db.rollback()
+
+        removed = 0
+        upload_dir = config.settings.UPLOAD_DIR
+        for sha in candidates:
+            try:
+                path = db.execute(text("""
+                    DELETE FROM blobs
+                    WHERE sha256 = :sha AND ref_count = 0 AND released_at <= datetime('now', :age)
+                    RETURNING path
+                """), {"sha": sha, "age": f"-{int(grace_days)} days"}).scalar()
+                if path:
+                    for rel_path in [path] + [derivative_path(path, kind) for kind in DERIVATIVES]:
+                        try:
+                            os.remove(os.path.join(upload_dir, rel_path))
+                        except FileNotFoundError:
+                            pass
+                    removed += 1
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"[blob] GC failed for {sha}: {e}", exc_info=True)
+
+        if removed:
+            logger.info(f"[blob] GC removed {removed} unreferenced blob(s)")
+        return removed
+
+
+blob_service = BlobService()
@@ -1,7 +1,9 @@
 import logging
 import requests
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.services.upload_service import receive_upload, StagedUpload, UploadRejected
 
 logger = logging.getLogger(__name__)
 
@@ -15,27 +17,15 @@ class CCCDService:
             logger.error("URL của ID Card Extractor Service chưa được cấu hình trong file .env hoặc config.py")
             raise ValueError("Extractor service is not configured.")
 
-        if not file.content_type.startswith("image/"):
-             raise ValueError(f"Tệp {file.filename} không phải là ảnh.")
-        
         try:
-            # Read file content
-            file_content = await file.read()
-            
-            # Prepare multipart payload
-            files_payload = {'file': (file.filename, file_content, file.content_type)}
-
-            logger.info(f"Chuyển tiếp yêu cầu quét CCCD cho file '{file.filename}' đến service: {settings.ID_CARD_EXTRACTOR_URL}")
-
-            # Send POST request
-            response = requests.post(settings.ID_CARD_EXTRACTOR_URL, files=files_payload, timeout=30)
-            
-            # Raise for status
-            response.raise_for_status()
-
-            # Return JSON
-            return response.json()
-
+            # Nhận file theo từng khối (giới hạn dung lượng / loại ảnh), rồi gửi đi
+            # trong threadpool để không chặn event loop khi chờ service quét
+            async with receive_upload(file) as upload:
+                logger.info(f"Chuyển tiếp yêu cầu quét CCCD cho file '{file.filename}' đến service: {settings.ID_CARD_EXTRACTOR_URL}")
+                return await run_in_threadpool(CCCDService._forward, upload)
+
+        except UploadRejected:
+            raise
         except requests.exceptions.ConnectionError as e:
             logger.error(f"Lỗi kết nối đến ID card extractor service: {e}")
             raise ConnectionError("Không thể kết nối đến dịch vụ quét CCCD. Vui lòng kiểm tra xem service đã được khởi chạy chưa.")
@@ -53,4 +43,12 @@ class CCCDService:
             logger.error(f"Đã có lỗi không xác định xảy ra trong proxy: {e}", exc_info=True)
             raise e
 
+    @staticmethod
+    def _forward(upload: StagedUpload) -> dict:
+        with upload.open() as f:
+            files_payload = {'file': (upload.filename, f, upload.content_type)}
+            response = requests.post(settings.ID_CARD_EXTRACTOR_URL, files=files_payload, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
 cccd_service = CCCDService()
@@ -0,0 +1,47 @@
+"""
+Nạp cột guests.estimated_at_utc cho dữ liệu cũ.
+
+Bản ghi mới được Guest._sync_estimated_at_utc gán khi ghi. Với bản ghi có từ
+trước khi thêm cột, estimated_datetime (naive) được coi là giờ địa phương
+(settings.TZ) — đúng giả định mà job no-show cũ dùng khi so sánh.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.utils.time_utils import to_utc_naive
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill_estimated_utc(engine: Engine) -> int:
+    """Gán estimated_at_utc còn thiếu theo từng lô id. Trả về số dòng đã cập nhật."""
+    from app.models import Guest
+
+    total = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, estimated_datetime FROM guests "
+                    "WHERE id > :last_id AND estimated_at_utc IS NULL AND estimated_datetime IS NOT NULL "
+                    "ORDER BY id LIMIT :limit"
+                ).columns(Guest.__table__.c.id, Guest.__table__.c.estimated_datetime),
+                {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE},
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                text("UPDATE guests SET estimated_at_utc = :utc WHERE id = :id"),
+                [{"id": r.id, "utc": to_utc_naive(r.estimated_datetime)} for r in rows],
+            )
+        total += len(rows)
+        last_id = rows[-1].id
+
+    if total:
+        logger.info(f"[guests] Backfilled estimated_at_utc for {total} guest(s)")
+    return total
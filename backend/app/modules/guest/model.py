@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Date, Index, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
 from app.core.database import Base
 from app.core.config import settings
-from app.utils.time_utils import get_local_time
+from app.utils.time_utils import get_local_time, to_utc_naive
 import pytz
 from datetime import datetime
 
@@ -18,20 +18,50 @@ class Guest(Base):
     status = Column(String(16), index=True, default="pending")
     
     estimated_datetime = Column(DateTime, nullable=True)
+    # estimated_datetime quy về UTC (naive). Cột gốc lẫn giờ địa phương / UTC tùy nguồn ghi,
+    # cột này là mốc chuẩn để so sánh (job no-show). Gán tự động qua validator bên dưới.
+    estimated_at_utc = Column(DateTime, nullable=True)
     
     check_in_time = Column(DateTime, nullable=True)
     check_out_time = Column(DateTime, nullable=True)
     registered_by_user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=get_local_time)
+    # Phiên bản thay đổi, do trigger của app/modules/sync gán (dùng cho /sync/changes)
+    row_version = Column(Integer, index=True)
+    # Khách sinh từ đăng ký dài hạn: (long_term_guest_id, visit_date) là khóa duy nhất,
+    # mỗi đăng ký dài hạn chỉ có một dòng cho mỗi ngày. Khách thường để NULL.
+    long_term_guest_id = Column(Integer, ForeignKey("long_term_guests.id"), nullable=True)
+    visit_date = Column(Date, nullable=True)
 
     registered_by = relationship("User", back_populates="guests", foreign_keys=[registered_by_user_id])
     images = relationship("GuestImage", back_populates="guest", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Index phục vụ phân trang keyset theo (created_at, id) cho GET /guests
+        Index("ix_guests_created_at_id", "created_at", "id"),
+        # Báo cáo lọc theo nhà cung cấp trong một khoảng created_at
+        Index("ix_guests_supplier_created_at", "supplier_name", "created_at"),
+        # Job no-show: WHERE status = 'pending' AND estimated_at_utc < :cutoff
+        Index("ix_guests_status_estimated_at_utc", "status", "estimated_at_utc"),
+        # Index (không phải UniqueConstraint) để ensure_indexes() tạo được trên CSDL cũ
+        Index("uq_guests_long_term_visit", "long_term_guest_id", "visit_date", unique=True),
+    )
+
+    @validates("estimated_datetime")
+    def _sync_estimated_at_utc(self, key, value):
+        # Lưu ý: insert(Guest) hàng loạt không qua validator, phải tự truyền estimated_at_utc
+        self.estimated_at_utc = to_utc_naive(value)
+        return value
+
 class GuestImage(Base):
     __tablename__ = "guest_images"
     id = Column(Integer, primary_key=True, index=True)
     guest_id = Column(Integer, ForeignKey("guests.id"), nullable=False)
     image_path = Column(String(255), nullable=False)
+    # Ảnh phái sinh WebP (app/services/image_derivatives.py), NULL khi chưa tạo xong
+    thumb_path = Column(String(255), nullable=True)
+    preview_path = Column(String(255), nullable=True)
+    row_version = Column(Integer, index=True)
     
     guest = relationship("Guest", back_populates="images")
 
@@ -54,3 +84,23 @@ class LongTermGuest(Base):
     created_at = Column(DateTime, default=get_local_time)
 
     registered_by = relationship("User", foreign_keys=[registered_by_user_id])
+
+class GuestSuggestion(Base):
+    """
+    Gợi ý biển số / nhà cung cấp cho form đăng ký.
+    Mỗi (field, value) một dòng, frequency = số khách đang dùng giá trị đó.
+    Bảng được trigger SQLite cập nhật (app/modules/guest/suggestion_index.py).
+    """
+    __tablename__ = "guest_suggestions"
+    id = Column(Integer, primary_key=True, index=True)
+    field = Column(String(32), nullable=False)
+    value = Column(String(255), nullable=False)
+    # Khóa tìm kiếm: bỏ dấu, chữ thường (biển số bỏ thêm '-', '.', khoảng trắng)
+    folded = Column(String(255), nullable=False)
+    frequency = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("field", "value", name="uq_guest_suggestions_field_value"),
+        Index("ix_guest_suggestions_field_folded", "field", "folded"),
+        Index("ix_guest_suggestions_field_frequency", "field", "frequency"),
+    )
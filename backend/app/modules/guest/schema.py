@@ -1,10 +1,12 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Literal
 from datetime import datetime, date
 
 class GuestImageRead(BaseModel):
     id: int
     image_path: str
+    thumb_path: Optional[str] = None
+    preview_path: Optional[str] = None
     model_config = ConfigDict(from_attributes=True)
 
 class GuestBase(BaseModel):
@@ -44,11 +46,40 @@ class GuestReadWithUser(GuestRead):
     registered_by_name: Optional[str] = None
     images: List[GuestImageRead] = []
 
+class GuestPage(BaseModel):
+    items: List[GuestReadWithUser]
+    next_cursor: Optional[str] = None
+
 class GuestSuggestions(BaseModel):
     companies: List[str]
     license_plates: List[str]
     supplier_names: List[str]
 
+class SuggestionItem(BaseModel):
+    value: str
+    count: int
+
+class GuestSuggestionList(BaseModel):
+    field: str
+    items: List[SuggestionItem]
+
+class GateBatchConfirm(BaseModel):
+    """Xác nhận cả đoàn ở cổng: action 'in' = khách vào / tài sản về, 'out' = khách ra / tài sản ra."""
+    action: Literal["in", "out"]
+    guest_ids: List[int] = Field(default_factory=list, max_length=500)
+    asset_ids: List[int] = Field(default_factory=list, max_length=500)
+
+class GateBatchSkipped(BaseModel):
+    id: int
+    reason: str
+
+class GateBatchConfirmResult(BaseModel):
+    action: str
+    guests: List[GuestRead] = []
+    asset_ids: List[int] = []
+    skipped_guests: List[GateBatchSkipped] = []
+    skipped_assets: List[GateBatchSkipped] = []
+
 class GuestIndividualCreate(BaseModel):
     full_name: str
     id_card_number: Optional[str] = ""
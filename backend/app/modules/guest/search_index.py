@@ -0,0 +1,134 @@
+"""
+Chỉ mục tìm kiếm khách (guest_search).
+
+Mỗi khách có một dòng (rowid = guests.id) chứa văn bản đã chuẩn hóa như
+search_fold(): họ tên, CCCD, công ty, lý do, biển số, nhà cung cấp, trạng thái
+và tên người đăng ký. Trigger SQLite giữ chỉ mục đồng bộ với mọi thao tác
+ghi (kể cả query.update()/delete() hàng loạt), nên khi tìm kiếm không còn
+phải gọi ngược hàm Python unaccent() cho từng dòng.
+
+Trigger chỉ dùng SQL thuần: văn bản được ghi vào bảng đệm guest_search_stage bằng
+lower(), hoàn tất bỏ dấu qua các câu UPDATE của search_fold_steps(), rồi mới chép sang
+chỉ mục. Nhờ vậy công cụ ngoài ứng dụng (sqlite3 CLI, script) vẫn ghi được guests.
+
+Ưu tiên FTS5 với tokenizer trigram (LIKE '%q%' dùng được chỉ mục khi q >= 3 ký tự);
+nếu bản SQLite không hỗ trợ thì dùng bảng thường chứa văn bản đã chuẩn hóa.
+"""
+import logging
+
+from sqlalchemy import column, select, table, text
+from sqlalchemy.engine import Engine
+
+from app.core.database import search_fold, search_fold_outdated, search_fold_steps
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "guest_search"
+STAGE_TABLE = "guest_search_stage"
+
+guest_search = table(SEARCH_TABLE, column("rowid"), column("body"))
+
+# Các cột của guests được đưa vào chỉ mục
+_GUEST_COLUMNS = (
+    "full_name", "id_card_number", "company", "reason",
+    "license_plate", "supplier_name", "status",
+)
+
+_BODY_SQL = "lower(" + " || ' ' || ".join(
+    [f"coalesce(g.{c}, '')" for c in _GUEST_COLUMNS] + ["coalesce(u.full_name, '')"]
+) + ")"
+
+_SELECT_ROWS_SQL = (
+    f"SELECT g.id, {_BODY_SQL} FROM guests g "
+    "LEFT JOIN users u ON u.id = g.registered_by_user_id"
+)
+
+
+def _index_statements(where: str) -> list:
+    """Đưa các khách thỏa `where` vào chỉ mục qua bảng đệm (bảng đệm luôn rỗng sau đó)."""
+    return [
+        f"INSERT INTO {STAGE_TABLE}(rowid, body) {_SELECT_ROWS_SQL} WHERE {where};",
+        *search_fold_steps(STAGE_TABLE, "body", "1"),
+        f"INSERT INTO {SEARCH_TABLE}(rowid, body) SELECT rowid, body FROM {STAGE_TABLE};",
+        f"DELETE FROM {STAGE_TABLE};",
+    ]
+
+
+def _index_sql(where: str) -> str:
+    return "\n            ".join(_index_statements(where))
+
+
+_TRIGGERS = {
+    "trg_guest_search_ai": f"""
+        CREATE TRIGGER trg_guest_search_ai AFTER INSERT ON guests BEGIN
+            {_index_sql("g.id = NEW.id")}
+        END""",
+    "trg_guest_search_au": f"""
+        CREATE TRIGGER trg_guest_search_au
+        AFTER UPDATE OF {", ".join(_GUEST_COLUMNS)}, registered_by_user_id ON guests BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+            {_index_sql("g.id = NEW.id")}
+        END""",
+    "trg_guest_search_ad": f"""
+        CREATE TRIGGER trg_guest_search_ad AFTER DELETE ON guests BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+        END""",
+    "trg_guest_search_user_au": f"""
+        CREATE TRIGGER trg_guest_search_user_au AFTER UPDATE OF full_name ON users BEGIN
+            DELETE FROM {SEARCH_TABLE}
+            WHERE rowid IN (SELECT id FROM guests WHERE registered_by_user_id = NEW.id);
+            {_index_sql("g.registered_by_user_id = NEW.id")}
+        END""",
+}
+
+
+def _create_search_table(conn) -> None:
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {STAGE_TABLE} (rowid INTEGER PRIMARY KEY, body TEXT)"))
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_TABLE}
+    ).first()
+    if exists:
+        return
+    try:
+        conn.execute(text(f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(body, tokenize='trigram')"))
+        logger.info("[guest_search] Created FTS5 trigram index")
+    except Exception as e:
+        logger.warning(f"[guest_search] FTS5 trigram not available ({e}), using plain table")
+        conn.execute(text(f"CREATE TABLE {SEARCH_TABLE} (rowid INTEGER PRIMARY KEY, body TEXT)"))
+
+
+def rebuild_search_index(conn) -> None:
+    """Xây lại toàn bộ chỉ mục từ bảng guests."""
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    for statement in _index_statements("1"):
+        conn.execute(text(statement))
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Tạo bảng chỉ mục + trigger (idempotent) và nạp lại dữ liệu nếu lệch số dòng.
+    Gọi sau Base.metadata.create_all() lúc khởi động.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        _create_search_table(conn)
+        # Tạo lại trigger mỗi lần khởi động để định nghĩa luôn khớp với code
+        for name, ddl in _TRIGGERS.items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+
+        indexed = conn.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+        total = conn.execute(text("SELECT count(*) FROM guests")).scalar()
+        if search_fold_outdated(conn, SEARCH_TABLE):
+            logger.info("[guest_search] Fold definition changed, rebuilding index")
+            rebuild_search_index(conn)
+        elif indexed != total:
+            logger.info(f"[guest_search] Rebuilding index ({indexed} indexed / {total} guests)")
+            rebuild_search_index(conn)
+
+
+def matching_guest_ids(q: str):
+    """Subquery id khách có văn bản chỉ mục chứa q (không phân biệt dấu/hoa thường)."""
+    like = f"%{search_fold(q)}%"
+    return select(guest_search.c.rowid).where(guest_search.c.body.like(like))
@@ -1,5 +1,6 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import or_, and_, func, insert, text, bindparam, Date, DateTime
 from sqlalchemy.orm import Session
 from datetime import datetime
 import pytz
@@ -7,7 +8,10 @@ import os
 import uuid
 import logging
 import io
+import base64
+import itertools
 import pandas as pd
+import openpyxl
 import uuid
 import logging
 from typing import List, Optional
@@ -17,12 +21,143 @@ from app.core import config
 from app.modules.guest import schema as schemas
 from app.utils.plate_formatter import format_license_plate
 from app.utils.name_formatter import format_full_name
-from app.utils.notifications import send_event_to_archive_background, run_pending_list_notification
+from app.utils.time_utils import to_utc_naive
+from app.utils.notifications import send_event_to_archive_background, run_pending_list_notification, send_batch_event_to_archive_background
 from app.services.gsheets_reader import _get_service, delete_row_by_guest_info
-from app.core.database import unaccent_string
+from app.services.image_derivatives import image_derivatives, remove_derivatives
+from app.modules.blob.service import blob_service, is_blob_path
+from app.services.upload_service import StagedUpload
+from app.services.event_broker import event_broker, publish_guest_event, publish_guests_created, publish_notifications, GATE_ROLES
+from app.modules.guest.search_index import matching_guest_ids
+from app.modules.guest.suggestion_index import fold_suggestion
+from app.utils.excel_export import EXPORT_YIELD_PER, ROW_NUMBER, ExcelColumn, ExcelSheetSpec, stream_xlsx
 
 logger = logging.getLogger(__name__)
 
+def _encode_guest_cursor(created_at: datetime, guest_id: int) -> str:
+    """Cursor dạng opaque: base64 của "created_at_iso|id"."""
+    raw = f"{created_at.isoformat() if created_at else ''}|{guest_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_guest_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at_str, guest_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at_str), int(guest_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# -----------------------------
+# Helpers cho import Excel
+# -----------------------------
+IMPORT_BATCH_SIZE = 2000
+IMPORT_MAX_ERRORS = 1000  # Giới hạn số dòng lỗi trả về trong báo cáo
+IMPORT_HEADER_SCAN_ROWS = 5  # File xuất (GUEST_EXPORT_SHEET) có dòng tiêu đề phía trên header
+
+
+def _cell_text(value) -> str:
+    """Giá trị ô Excel -> chuỗi (số nguyên kiểu float như CCCD không bị thêm '.0')."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _parse_datetime_column(values: list, formats: tuple) -> tuple[list, set]:
+    """
+    Parse một cột ngày giờ cho cả lô: ô đã là datetime giữ nguyên, ô chuỗi thử lần
+    lượt từng format bằng pd.to_datetime (vector hóa). Trả về (danh sách datetime|None,
+    tập vị trí có giá trị nhưng không parse được).
+    """
+    series = pd.Series(values, dtype="object")
+    result = [v if isinstance(v, datetime) else None for v in values]
+
+    pending = series[series.map(lambda v: v is not None and not isinstance(v, datetime))].map(_cell_text)
+    pending = pending[pending != ""]
+    for fmt in formats:
+        if pending.empty:
+            break
+        parsed = pd.to_datetime(pending, format=fmt, errors="coerce")
+        ok = parsed.notna()
+        for idx, ts in parsed[ok].items():
+            result[idx] = ts.to_pydatetime()
+        pending = pending[~ok]
+    return result, set(pending.index)
+
+
+class _ImageDirSnapshot:
+    """
+    Danh sách file trong uploads/guests và uploads/archived_guests, đọc một lần
+    cho cả lần import thay vì os.path.exists() cho từng đường dẫn ảnh.
+    """
+
+    def __init__(self, upload_dir: str):
+        self.upload_dir = upload_dir
+        self._live = None
+        self._archived = None
+
+    @staticmethod
+    def _list(path: str) -> set:
+        try:
+            return {entry.name for entry in os.scandir(path) if entry.is_file()}
+        except FileNotFoundError:
+            return set()
+
+    def restore(self, rel_path: str) -> bool:
+        """True nếu ảnh có mặt trong guests/ (khôi phục từ archived_guests nếu cần)."""
+        if self._live is None:
+            self._live = self._list(os.path.join(self.upload_dir, "guests"))
+            self._archived = self._list(os.path.join(self.upload_dir, "archived_guests"))
+
+        base_name = os.path.basename(rel_path)
+        if os.path.dirname(rel_path) != "guests":
+            return os.path.exists(os.path.join(self.upload_dir, rel_path))
+        if base_name in self._live:
+            return True
+        if base_name in self._archived:
+            archived_path = os.path.join(self.upload_dir, "archived_guests", base_name)
+            full_path = os.path.join(self.upload_dir, rel_path)
+            try:
+                os.rename(archived_path, full_path)
+                logger.info(f"Khôi phục ảnh lưu trữ từ {archived_path} về {full_path}")
+            except Exception as e:
+                logger.error(f"Không thể khôi phục ảnh {base_name}: {e}")
+                return False
+            self._archived.discard(base_name)
+            self._live.add(base_name)
+            return True
+        return False
+
+
+_COURIER = {"font_name": "Courier New", "font_size": 11, "align": "left", "valign": "vcenter"}
+
+# Cột file Excel "Sổ theo dõi khách"; mỗi dòng là (Guest, registered_by_name, registered_by_username)
+GUEST_EXPORT_SHEET = ExcelSheetSpec(
+    sheet_name="Guests",
+    title="SỔ THEO DÕI KHÁCH RA/VÀO",
+    title_format={**_COURIER, "font_size": 15, "bold": True, "align": "center"},
+    header_format={**_COURIER, "bold": True},
+    cell_format=_COURIER,
+    landscape=True,
+    paper=8,
+    columns=[
+        ROW_NUMBER,
+        ExcelColumn("Giờ vào", lambda r: r[0].check_in_time, kind="datetime"),
+        ExcelColumn("Giờ ra", lambda r: r[0].check_out_time, kind="datetime"),
+        ExcelColumn("Họ tên", lambda r: r[0].full_name),
+        ExcelColumn("CCCD", lambda r: r[0].id_card_number),
+        ExcelColumn("Nhà thầu", lambda r: r[0].supplier_name),
+        ExcelColumn("Biển số", lambda r: r[0].license_plate),
+        ExcelColumn("Người đăng ký", lambda r: r[1]),
+        ExcelColumn("Mã nv", lambda r: r[2]),
+        ExcelColumn("Lý do", lambda r: r[0].reason),
+    ],
+)
+
+
 class GuestService:
     @staticmethod
     def create_guest(
@@ -59,6 +194,7 @@ class GuestService:
         db.add(guest)
         db.commit()
         db.refresh(guest)
+        publish_guest_event("guest.created", guest)
 
         # Background tasks
         bg_tasks.add_task(send_event_to_archive_background, guest.id, "Đăng ký mới", user_id)
@@ -74,42 +210,50 @@ class GuestService:
         bg_tasks
     ) -> List[models.Guest]:
         """
-        Create multiple guest records (bulk).
+        Create multiple guest records (bulk) with one multi-row INSERT ... RETURNING,
+        then queue one digest archive message for the whole group.
         """
-        new_guests_db = []
         formatted_plate = format_license_plate(payload.license_plate) if payload.license_plate else ""
-
-        for individual in payload.guests:
-            if not individual.full_name:
-                continue
-
-            standardized_individual_name = format_full_name(individual.full_name)
-
-            guest = models.Guest(
-                full_name=standardized_individual_name,
-                id_card_number=individual.id_card_number or "",
-                company=payload.company or "",
-                reason=payload.reason or "",
-                license_plate=formatted_plate,
-                supplier_name=payload.supplier_name or "",
-                status="pending",
-                estimated_datetime=payload.estimated_datetime,
-                registered_by_user_id=user_id
-            )
-            db.add(guest)
-            new_guests_db.append(guest)
-
-        if not new_guests_db:
+        now = models.get_local_time()
+
+        rows = [
+            {
+                "full_name": format_full_name(individual.full_name),
+                "id_card_number": individual.id_card_number or "",
+                "company": payload.company or "",
+                "reason": payload.reason or "",
+                "license_plate": formatted_plate,
+                "supplier_name": payload.supplier_name or "",
+                "status": "pending",
+                "estimated_datetime": payload.estimated_datetime,
+                "estimated_at_utc": to_utc_naive(payload.estimated_datetime),
+                "registered_by_user_id": user_id,
+                "created_at": now,
+            }
+            for individual in payload.guests
+            if individual.full_name
+        ]
+
+        if not rows:
             raise ValueError("No valid guests to add.")
 
+        # ORM bulk INSERT ... RETURNING: một câu lệnh cho cả đoàn, trả về đối tượng Guest đã có id
+        # (SQLite không bảo đảm thứ tự RETURNING; id tự tăng theo thứ tự chèn nên sắp lại theo id)
+        new_guests_db = sorted(
+            db.scalars(insert(models.Guest).returning(models.Guest), rows).all(),
+            key=lambda g: g.id
+        )
+        # RETURNING đã nạp đủ cột: tách khỏi session để commit không expire
+        # (tránh mỗi khách một câu SELECT refresh khi serialize)
+        for guest in new_guests_db:
+            db.expunge(guest)
         db.commit()
 
-        # Background tasks for each guest
-        for guest in new_guests_db:
-            db.refresh(guest)
-            bg_tasks.add_task(send_event_to_archive_background, guest.id, "Đăng ký mới (theo đoàn)", user_id)
-        
-        # Single notification update
+        guest_ids = [guest.id for guest in new_guests_db]
+        publish_guests_created(new_guests_db, "bulk")
+
+        # Một tin nhắn tổng hợp cho cả đoàn + một lần cập nhật danh sách chờ
+        bg_tasks.add_task(send_batch_event_to_archive_background, guest_ids, [], "Đăng ký mới (theo đoàn)", user_id)
         bg_tasks.add_task(run_pending_list_notification)
 
         return new_guests_db
@@ -119,17 +263,21 @@ class GuestService:
         db: Session,
         user: models.User,
         q: str | None = None,
-        include_all_my_history: bool = False
-    ) -> List[models.Guest]:
+        include_all_my_history: bool = False,
+        limit: int = 100,
+        cursor: str | None = None
+    ) -> tuple[list, Optional[str]]:
         """
-        List guests with filtering and search.
+        List guests with filtering and search, keyset-paginated on (created_at, id).
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        Raises ValueError if the cursor is malformed.
         """
         query = db.query(
             models.Guest,
             models.User.full_name.label("registered_by_name")
         ).join(
             models.User, models.Guest.registered_by_user_id == models.User.id
-        ).options(joinedload(models.Guest.images))
+        ).options(selectinload(models.Guest.images))
 
         if user.role == "staff":
             query = query.filter(models.Guest.registered_by_user_id == user.id)
@@ -137,22 +285,27 @@ class GuestService:
                 query = query.filter(models.Guest.status == "pending")
 
         if q:
-            unaccented_q = unaccent_string(q)
-            like = f"%{unaccented_q}%"
+            # Tìm qua chỉ mục guest_search (đã bỏ dấu sẵn), không gọi unaccent() từng dòng
+            query = query.filter(models.Guest.id.in_(matching_guest_ids(q)))
 
+        if cursor:
+            created_at, last_id = _decode_guest_cursor(cursor)
             query = query.filter(or_(
-                func.unaccent(models.Guest.full_name).ilike(like),
-                models.Guest.id_card_number.ilike(like),
-                func.unaccent(models.Guest.company).ilike(like),
-                func.unaccent(models.Guest.reason).ilike(like),
-                models.Guest.license_plate.ilike(like),
-                func.unaccent(models.Guest.supplier_name).ilike(like),
-                func.unaccent(models.User.full_name).ilike(like),
-                models.Guest.status.ilike(f"%{q}%")
+                models.Guest.created_at < created_at,
+                and_(models.Guest.created_at == created_at, models.Guest.id < last_id)
             ))
 
-        results = query.order_by(models.Guest.created_at.desc()).all()
-        return results
+        # Lấy dư 1 dòng để biết còn trang sau hay không
+        results = query.order_by(
+            models.Guest.created_at.desc(), models.Guest.id.desc()
+        ).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last_guest = results[-1][0]
+            next_cursor = _encode_guest_cursor(last_guest.created_at, last_guest.id)
+        return results, next_cursor
 
     @staticmethod
     def update_guest(
@@ -190,6 +343,8 @@ class GuestService:
 
     @staticmethod
     def _archive_image(image_path: str):
+        if is_blob_path(image_path):
+            return  # Ảnh trong blob store: job GC xóa khi không còn tham chiếu
         try:
             archive_dir = os.path.join(config.settings.UPLOAD_DIR, "archived_guests")
             os.makedirs(archive_dir, exist_ok=True)
@@ -224,6 +379,7 @@ class GuestService:
 
         for image in guest.images:
             GuestService._archive_image(image.image_path)
+            remove_derivatives(image)
 
         guest_info_for_sheet = {
             "full_name": guest.full_name,
@@ -247,116 +403,105 @@ class GuestService:
         return True
 
     @staticmethod
-    def get_suggestions(db: Session) -> dict:
+    def get_suggestions(
+        db: Session,
+        field: str | None = None,
+        prefix: str = "",
+        limit: int = 10
+    ):
         """
-        Get suggestions for forms.
+        Get suggestions for forms from the guest_suggestions table.
+        With `field`: top `limit` values whose folded key starts with `prefix`, most used first.
+        Without `field`: legacy shape with every plate / supplier (ordered by frequency).
         """
-        license_plates = db.query(models.Guest.license_plate).filter(models.Guest.license_plate != "").distinct().all()
-        supplier_names = db.query(models.Guest.supplier_name).filter(models.Guest.supplier_name != "").distinct().all()
+        if field is None:
+            rows = db.query(models.GuestSuggestion.field, models.GuestSuggestion.value).order_by(
+                models.GuestSuggestion.frequency.desc(), models.GuestSuggestion.value
+            ).all()
+            return {
+                "companies": [],
+                "license_plates": [v for f, v in rows if f == "license_plate"],
+                "supplier_names": [v for f, v in rows if f == "supplier_name"]
+            }
+
+        query = db.query(models.GuestSuggestion).filter(models.GuestSuggestion.field == field)
+        key = fold_suggestion(field, prefix)
+        if key:
+            # Khoảng [key, key + U+FFFF) để dùng được index (field, folded)
+            query = query.filter(
+                models.GuestSuggestion.folded >= key,
+                models.GuestSuggestion.folded < key + "\uffff"
+            )
+        items = query.order_by(
+            models.GuestSuggestion.frequency.desc(), models.GuestSuggestion.value
+        ).limit(limit).all()
         return {
-            "companies": [],
-            "license_plates": [lp[0] for lp in license_plates if lp[0]],
-            "supplier_names": [sn[0] for sn in supplier_names if sn[0]]
+            "field": field,
+            "items": [{"value": s.value, "count": s.frequency} for s in items]
         }
     
     @staticmethod
     def process_no_show_guests(db: Session) -> int:
         """
         Mark old pending guests as 'no_show' and notify users.
-        Condition: status='pending' AND estimated_datetime < today_start.
-        """
-        from app.modules.notification.model import Notification # Import here to avoid circular
-        import itertools
+        Condition: status='pending' AND estimated_at_utc < today_start (giờ địa phương, quy về UTC).
 
+        Chạy hoàn toàn bằng SQL (index ix_guests_status_estimated_at_utc) nên bộ nhớ
+        không phụ thuộc số khách quá hạn:
+          1. INSERT ... SELECT ... GROUP BY người đăng ký: mỗi người một thông báo,
+             danh sách khách ghép bằng group_concat, RETURNING user_id để đẩy SSE.
+          2. UPDATE ... SET status = 'no_show' cho cùng điều kiện.
+        """
         tz = pytz.timezone(config.settings.TZ)
-        now_aware = datetime.now(tz)
-        today_start_aware = now_aware.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Determine strict today_start for comparison
-        # Note: If DB stores naive (implicit local), we might need naive.
-        # But assuming SQLAlchemy + current setup handles aware datetimes or strips them consistently.
-        # We will try with aware first, if error, we fallback or just use what works for this stack.
-        # Ideally, we rely on the fact that created_at is aware-like (from get_local_time).
-        
-        # However, to be absolutely safe against "TypeError: can't compare offset-naive and offset-aware":
-        # We'll fetch candidates first, then filter in Python if we suspect DB issues, 
-        # OR just ensure we pass a compatible type to the query.
-        
-        # Robust strategy: 
-        # 1. Fetch all pending guests with estimated_datetime IS NOT NULL
-        # 2. Filter in memory (it's a background job, performance hit acceptable for << 10k items)
-        #    to avoid SQL dialect timezone hell.
-        
-        potential_guests = db.query(models.Guest).filter(
+        now_local = datetime.now(tz)
+        today_start = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff_utc = to_utc_naive(today_start)
+        # Dịch UTC -> giờ địa phương khi hiển thị trong thông báo (modifier của strftime SQLite)
+        local_shift = f"{int(now_local.utcoffset().total_seconds() // 60):+d} minutes"
+
+        params = {
+            "cutoff": cutoff_utc,
+            "shift": local_shift,
+            "title": "⚠️ Cảnh báo: Khách đăng ký nhưng không tới",
+            "header": "⚠️ Bạn có khách đăng ký nhưng không đến (quá hạn):",
+            "footer": "Admin phải check và xóa những khách không vào hàng ngày, vui lòng cân nhắc đăng ký khách thực sự vào :( ",
+            "now": models.get_local_time(),
+        }
+
+        notified_user_ids = db.execute(text("""
+            INSERT INTO notifications (user_id, title, message, is_read, created_at)
+            SELECT registered_by_user_id,
+                   :title,
+                   :header || char(10) || group_concat(line, char(10)) || char(10) || char(10) || :footer,
+                   0,
+                   :now
+            FROM (
+                SELECT registered_by_user_id,
+                       '- ' || full_name || ' (Dự kiến: ' ||
+                       strftime('%d/%m/%Y %H:%M', estimated_at_utc, :shift) || ')' AS line
+                FROM guests
+                WHERE status = 'pending' AND estimated_at_utc < :cutoff
+                  AND registered_by_user_id IS NOT NULL
+                ORDER BY registered_by_user_id, estimated_at_utc, id
+            )
+            GROUP BY registered_by_user_id
+            RETURNING user_id
+        """).bindparams(bindparam("cutoff", type_=DateTime), bindparam("now", type_=DateTime)), params).scalars().all()
+
+        count = db.query(models.Guest).filter(
             models.Guest.status == "pending",
-            models.Guest.estimated_datetime != None
-        ).all()
-        
-        old_guests = []
-        for g in potential_guests:
-            g_time = g.estimated_datetime
-            if not g_time: 
-                continue
-                
-            # Normalize g_time to aware if it is naive (assume local TZ)
-            if g_time.tzinfo is None:
-                g_time = tz.localize(g_time)
-            
-            # Compare
-            if g_time < today_start_aware:
-                old_guests.append(g)
+            models.Guest.estimated_at_utc < cutoff_utc,
+        ).update({models.Guest.status: "no_show"}, synchronize_session=False)
 
-        if not old_guests:
+        if not count:
+            db.rollback()
             return 0
-        
-        count = len(old_guests)
-        logger.info(f"[no_show] Found {count} guests to mark as no-show.")
 
-        # 2. Update status to 'no_show'
-        for guest in old_guests:
-            guest.status = "no_show"
-        
-        # 3. Group by user to send ONE notification per user
-        # Sort first for itertools.groupby
-        old_guests.sort(key=lambda g: g.registered_by_user_id if g.registered_by_user_id else 0)
-        
-        notifications_to_add = []
-        # Filter out None user_ids
-        valid_guests = [g for g in old_guests if g.registered_by_user_id]
-        
-        for user_id, user_guests in itertools.groupby(valid_guests, key=lambda g: g.registered_by_user_id):
-            guests_list = list(user_guests)
-            
-            # Construct message
-            msg_lines = ["⚠️ Bạn có khách đăng ký nhưng không đến (quá hạn):"]
-            for g in guests_list:
-                # Format time for display
-                est_str = "???"
-                if g.estimated_datetime:
-                     # render naive or aware correctly
-                     dt_val = g.estimated_datetime
-                     if dt_val.tzinfo is None:
-                         # assume it was local
-                         est_str = dt_val.strftime("%d/%m/%Y %H:%M")
-                     else:
-                         est_str = dt_val.astimezone(tz).strftime("%d/%m/%Y %H:%M")
-
-                msg_lines.append(f"- {g.full_name} (Dự kiến: {est_str})")
-            
-            msg_lines.append("")
-            msg_lines.append("Admin phải check và xóa những khách không vào hàng ngày, vui lòng cân nhắc đăng ký khách thực sự vào :( ")
-            
-            notif = Notification(
-                user_id=user_id,
-                title="⚠️ Cảnh báo: Khách đăng ký nhưng không tới",
-                message="\n".join(msg_lines),
-                is_read=False, 
-                created_at=models.get_local_time()
-            )
-            notifications_to_add.append(notif)
-            
-        db.add_all(notifications_to_add)
         db.commit()
+        logger.info(f"[no_show] Marked {count} guests as no-show, notified {len(notified_user_ids)} user(s).")
+
+        event_broker.publish("guest.no_show", {"count": count}, roles=GATE_ROLES)
+        publish_notifications(notified_user_ids)
         
         return count
 
@@ -386,6 +531,7 @@ class GuestService:
             logger.info(f"Guest ID {guest_id} ({guest.full_name}) already checked in. No status change.")
 
         if guest_updated:
+            publish_guest_event("guest.checked_in", guest)
             bg_tasks.add_task(send_event_to_archive_background, guest.id, "Xác nhận vào cổng", user.id)
             bg_tasks.add_task(run_pending_list_notification)
 
@@ -415,6 +561,7 @@ class GuestService:
         db.refresh(guest)
         
         logger.info(f"User {user.username} confirmed check-out for guest ID {guest_id} ({guest.full_name}).")
+        publish_guest_event("guest.checked_out", guest)
 
         bg_tasks.add_task(send_event_to_archive_background, guest.id, "Xác nhận ra cổng", user.id)
         bg_tasks.add_task(run_pending_list_notification)
@@ -422,49 +569,107 @@ class GuestService:
         return guest
 
     @staticmethod
-    def upload_guest_image(db: Session, guest_id: int, file, save_path_prefix: str) -> models.GuestImage:
-        guest = db.query(models.Guest).get(guest_id)
-        if not guest:
-            return None
+    def confirm_batch(
+        db: Session,
+        payload: schemas.GateBatchConfirm,
+        user: models.User,
+        bg_tasks
+    ) -> dict:
+        """
+        Confirm a whole group at the gate in ONE transaction:
+        action 'in'  -> guests checked_in,  assets returned (checked_out -> returned)
+        action 'out' -> guests checked_out, assets checked out (pending_out -> ...)
+        Queues one aggregated archive message and one pending-list refresh.
+        Raises PermissionError if assets are included and user is not admin/guard.
+        """
+        from app.modules.asset.service import AssetService  # Import here to avoid circular
+
+        if payload.asset_ids and user.role not in ["admin", "guard"]:
+            raise PermissionError("Access denied")
+
+        guest_ids = list(dict.fromkeys(payload.guest_ids))
+        asset_ids = list(dict.fromkeys(payload.asset_ids))
+        now = models.get_local_time()
+        target_status = "checked_in" if payload.action == "in" else "checked_out"
+
+        guests = db.query(models.Guest).filter(models.Guest.id.in_(guest_ids)).all() if guest_ids else []
+        found = {g.id: g for g in guests}
+        changed_guests, skipped_guests = [], []
+        for guest_id in guest_ids:
+            guest = found.get(guest_id)
+            if guest is None:
+                skipped_guests.append({"id": guest_id, "reason": "not_found"})
+            elif guest.status == target_status:
+                skipped_guests.append({"id": guest_id, "reason": f"already_{target_status}"})
+            else:
+                guest.status = target_status
+                if payload.action == "in":
+                    guest.check_in_time = now
+                else:
+                    guest.check_out_time = now
+                changed_guests.append(guest)
+
+        assets = db.query(models.AssetLog).filter(models.AssetLog.id.in_(asset_ids)).all() if asset_ids else []
+        found_assets = {a.id: a for a in assets}
+        changed_assets, skipped_assets = [], []
+        for asset_id in asset_ids:
+            asset = found_assets.get(asset_id)
+            if asset is None:
+                skipped_assets.append({"id": asset_id, "reason": "not_found"})
+                continue
+            try:
+                if payload.action == "in":
+                    AssetService._apply_return(asset, user)
+                else:
+                    AssetService._apply_checkout(asset, user)
+                changed_assets.append(asset)
+            except ValueError as e:
+                skipped_assets.append({"id": asset_id, "reason": str(e)})
+
+        if changed_guests or changed_assets:
+            db.commit()
+            logger.info(
+                f"User {user.username} batch-confirmed '{payload.action}' for "
+                f"{len(changed_guests)} guest(s), {len(changed_assets)} asset(s)."
+            )
+
+            event_type = "Xác nhận vào cổng" if payload.action == "in" else "Xác nhận ra cổng"
+            bg_tasks.add_task(
+                send_batch_event_to_archive_background,
+                [g.id for g in changed_guests], [a.id for a in changed_assets], event_type, user.id
+            )
+            if changed_guests:
+                bg_tasks.add_task(run_pending_list_notification)
+            event_broker.publish(
+                "guest.batch_confirmed",
+                {"action": payload.action, "guest_ids": [g.id for g in changed_guests], "asset_ids": [a.id for a in changed_assets]},
+                roles=GATE_ROLES,
+                user_ids={g.registered_by_user_id for g in changed_guests} | {a.registered_by_user_id for a in changed_assets},
+            )
+
+        return {
+            "action": payload.action,
+            "guests": changed_guests,
+            "asset_ids": [a.id for a in changed_assets],
+            "skipped_guests": skipped_guests,
+            "skipped_assets": skipped_assets,
+        }
 
-        ext = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{ext}"
-        
-        # Determine full save path
-        full_save_path = os.path.join(config.settings.UPLOAD_DIR, "guests", unique_filename)
-        os.makedirs(os.path.dirname(full_save_path), exist_ok=True)
-        
-        # Save file (caller handles async read if needed, but here we assume file-like or bytes)
-        # Note: passed 'file' here is UploadFile from FastAPI. logic needs async. 
-        # But we are in sync method? Service methods can be async.
-        # Let's make this async or handle it in router. 
-        # Better: caller reads content and passes bytes.
-        raise NotImplementedError("Handle in router due to async read")
-
-    # Actually, for file upload, it's often easier to keep in router or make service async.
-    # I will modify this to take 'file_content' (bytes).
     @staticmethod
-    def upload_guest_image_bytes(db: Session, guest_id: int, file_filename: str, file_content: bytes) -> models.GuestImage:
+    def upload_guest_image(db: Session, guest_id: int, upload: StagedUpload) -> models.GuestImage:
+        """Lưu ảnh đã nhận qua receive_upload() (router gọi trong threadpool)."""
         guest = db.query(models.Guest).get(guest_id)
         if not guest:
             return None
 
-        ext = os.path.splitext(file_filename)[1]
-        unique_filename = f"{uuid.uuid4()}{ext}"
-
-        save_path = os.path.join(config.settings.UPLOAD_DIR, "guests", unique_filename)
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-        with open(save_path, "wb") as buffer:
-            buffer.write(file_content)
-
         db_image = models.GuestImage(
             guest_id=guest_id,
-            image_path=f"guests/{unique_filename}"
+            image_path=blob_service.put_staged(db, upload)
         )
         db.add(db_image)
         db.commit()
         db.refresh(db_image)
+        image_derivatives.submit(models.GuestImage, db_image.id, db_image.image_path)
         return db_image
 
     @staticmethod
@@ -484,116 +689,150 @@ class GuestService:
             raise PermissionError("Not allowed")
 
         GuestService._archive_image(db_image.image_path)
+        remove_derivatives(db_image)
         db.delete(db_image)
         db.commit()
         return True
 
     @staticmethod
-    def import_guests(db: Session, file_content: bytes, user: models.User) -> dict:
-        try:
-            df = pd.read_excel(io.BytesIO(file_content), keep_default_na=False)
-            df.dropna(how='all', inplace=True)
-
-            users_cache = {u.username: u for u in db.query(models.User).all()}
-            imported_count = 0
-
-            for index, row in df.iterrows():
-                if not row.get("Họ tên"):
-                    logger.warning(f"Bỏ qua dòng {index + 2}: Thiếu họ tên.")
-                    continue
-
-                status_str = str(row.get("Trạng thái", "")).strip()
-                status = "checked_in" if status_str == "ĐÃ VÀO" else "pending"
-
-                check_in_time = None
-                if status == "checked_in" and row.get("Giờ vào"):
-                    try:
-                        time_val = row.get("Giờ vào")
-                        if isinstance(time_val, datetime):
-                            check_in_time = time_val
-                        else:
-                            for fmt in ("%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M"):
-                                 try:
-                                     check_in_time = datetime.strptime(str(time_val), fmt)
-                                     break
-                                 except ValueError:
-                                     continue
-                            if not check_in_time:
-                                 logger.warning(f"Không thể phân tích 'Giờ vào' '{time_val}' cho '{row.get('Họ tên')}' ở dòng {index+2}. Dùng giờ hiện tại.")
-                    except Exception as e:
-                        logger.warning(f"Lỗi khi xử lý 'Giờ vào' '{row.get('Giờ vào')}' cho '{row.get('Họ tên')}' ở dòng {index+2}. Lỗi: {e}")
-
-                registered_by_user_id = user.id
-                registered_by_username = str(row.get("Mã NV đăng ký", "")).strip()
-                if registered_by_username in users_cache:
-                    registered_by_user_id = users_cache[registered_by_username].id
-                else:
-                     logger.warning(f"Không tìm thấy username '{registered_by_username}' ở dòng {index+2}. Gán khách '{row.get('Họ tên')}' cho người import '{user.username}'.")
-
-                license_plate_raw = row.get("Biển số", "")
-                
-                estimated_datetime_val = row.get("Ngày giờ dự kiến")
-                estimated_datetime_obj = None
-
-                if pd.notna(estimated_datetime_val):
-                    try:
-                        if isinstance(estimated_datetime_val, datetime):
-                            estimated_datetime_obj = estimated_datetime_val
-                        else:
-                            for fmt_dt in ("%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M"):
-                                try:
-                                    estimated_datetime_obj = datetime.strptime(str(estimated_datetime_val), fmt_dt)
-                                    break
-                                except ValueError:
-                                    continue
-                    except Exception:
-                         logger.warning(f"Không thể phân tích 'Ngày giờ dự kiến' '{estimated_datetime_val}' ở dòng {index+2}. Bỏ qua.")
-
-                guest = models.Guest(
-                    full_name=row.get("Họ tên", ""),
-                    id_card_number=str(row.get("CCCD", "")),
-                    supplier_name=row.get("Nhà cung cấp", row.get("Công ty", "")),
-                    company=row.get("Công ty", ""),
-                    reason=row.get("Lý do", ""),
-                    license_plate=format_license_plate(license_plate_raw) if license_plate_raw else "",
-                    status=status,
-                    check_in_time=check_in_time,
-                    estimated_datetime=estimated_datetime_obj,
-                    registered_by_user_id=registered_by_user_id
-                )
+    def import_guests(db: Session, file_obj, user: models.User) -> dict:
+        """
+        Import khách từ file Excel theo kiểu streaming.
 
-                image_paths_str = row.get("Hình ảnh", "")
-                if image_paths_str and isinstance(image_paths_str, str):
-                    image_paths = [path.strip() for path in image_paths_str.split(',') if path.strip()]
-                    for path in image_paths:
-                        if not path.startswith("guests/"): continue
+        Đọc workbook bằng openpyxl read-only (không nạp cả sheet vào bộ nhớ), gom
+        IMPORT_BATCH_SIZE dòng một lần, parse ngày giờ theo cột bằng pandas và
+        INSERT cả lô bằng một câu lệnh. Dòng lỗi được bỏ qua và ghi vào báo cáo
+        `errors` ([{row, error}]) thay vì làm hỏng cả file.
+        """
+        if isinstance(file_obj, (bytes, bytearray)):
+            file_obj = io.BytesIO(file_obj)
 
-                        full_path = os.path.join(config.settings.UPLOAD_DIR, path)
-                        base_name = os.path.basename(path)
-                        archived_path = os.path.join(config.settings.UPLOAD_DIR, "archived_guests", base_name)
+        try:
+            wb = openpyxl.load_workbook(file_obj, read_only=True, data_only=True)
+        except Exception as e:
+            raise ValueError(f"Xử lý file thất bại: không đọc được file Excel ({e})")
 
-                        if not os.path.exists(full_path) and os.path.exists(archived_path):
-                            try:
-                                os.rename(archived_path, full_path)
-                                logger.info(f"Khôi phục ảnh lưu trữ từ {archived_path} về {full_path}")
-                            except Exception as e:
-                                logger.error(f"Không thể khôi phục ảnh {base_name}: {e}")
+        report = {"imported": 0, "skipped": 0, "errors": [], "error_count": 0}
 
-                        if os.path.exists(full_path):
-                            image_record = models.GuestImage(image_path=path)
-                            guest.images.append(image_record)
-                        else:
-                            logger.warning(f"Đường dẫn ảnh '{path}' được liệt kê trong file import nhưng không tìm thấy file.")
+        def add_error(row_no: int, message: str):
+            report["error_count"] += 1
+            if len(report["errors"]) < IMPORT_MAX_ERRORS:
+                report["errors"].append({"row": row_no, "error": message})
 
-                db.add(guest)
-                imported_count += 1
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            columns, header_row = {}, 0
+            for header_row, header in enumerate(itertools.islice(rows, IMPORT_HEADER_SCAN_ROWS), start=1):
+                columns = {_cell_text(name): idx for idx, name in enumerate(header or ()) if _cell_text(name)}
+                if "Họ tên" in columns:
+                    break
+            if "Họ tên" not in columns:
+                raise ValueError("Xử lý file thất bại: thiếu cột 'Họ tên'.")
+
+            users_by_username = dict(db.query(models.User.username, models.User.id).all())
+            image_dirs = _ImageDirSnapshot(config.settings.UPLOAD_DIR)
+
+            batch = []
+            for row_no, values in enumerate(rows, start=header_row + 1):
+                if not any(v is not None and _cell_text(v) for v in values):
+                    continue  # dòng trống
+                batch.append((row_no, values))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    GuestService._import_batch(db, batch, columns, users_by_username, image_dirs, user, add_error, report)
+                    batch = []
+            if batch:
+                GuestService._import_batch(db, batch, columns, users_by_username, image_dirs, user, add_error, report)
 
             db.commit()
-            return {"ok": True, "message": f"Import thành công {imported_count} bản ghi."}
+        except ValueError:
+            db.rollback()
+            raise
         except Exception as e:
             db.rollback()
             logger.error(f"Xử lý file thất bại: {e}", exc_info=True)
             raise ValueError(f"Xử lý file thất bại: {e}")
+        finally:
+            wb.close()
+
+        message = f"Import thành công {report['imported']} bản ghi."
+        if report["skipped"]:
+            message += f" Bỏ qua {report['skipped']} dòng lỗi."
+        return {"ok": True, "message": message, **report}
+
+    @staticmethod
+    def _import_batch(db: Session, batch: list, columns: dict, users_by_username: dict,
+                      image_dirs: "_ImageDirSnapshot", user: models.User, add_error, report: dict) -> None:
+        def col(values, name):
+            idx = columns.get(name)
+            return values[idx] if idx is not None and idx < len(values) else None
+
+        supplier_col = "Nhà cung cấp" if "Nhà cung cấp" in columns else "Công ty"
+
+        check_in_times, bad_check_in = _parse_datetime_column(
+            [col(v, "Giờ vào") for _, v in batch],
+            ("%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M"),
+        )
+        estimated_times, bad_estimated = _parse_datetime_column(
+            [col(v, "Ngày giờ dự kiến") for _, v in batch],
+            ("%Y-%m-%d %H:%M:%S", "%d/%m/%Y %H:%M"),
+        )
+
+        guest_rows, image_lists = [], []
+        for i, (row_no, values) in enumerate(batch):
+            full_name = _cell_text(col(values, "Họ tên"))
+            if not full_name:
+                report["skipped"] += 1
+                add_error(row_no, "Thiếu họ tên.")
+                continue
+
+            status = "checked_in" if _cell_text(col(values, "Trạng thái")) == "ĐÃ VÀO" else "pending"
+            check_in_time = check_in_times[i] if status == "checked_in" else None
+            if status == "checked_in" and i in bad_check_in:
+                add_error(row_no, f"Không phân tích được 'Giờ vào' '{_cell_text(col(values, 'Giờ vào'))}', để trống.")
+            if i in bad_estimated:
+                add_error(row_no, f"Không phân tích được 'Ngày giờ dự kiến' '{_cell_text(col(values, 'Ngày giờ dự kiến'))}', để trống.")
+
+            registered_by_user_id = users_by_username.get(_cell_text(col(values, "Mã NV đăng ký")), user.id)
+            license_plate_raw = _cell_text(col(values, "Biển số"))
+
+            guest_rows.append({
+                "full_name": full_name,
+                "id_card_number": _cell_text(col(values, "CCCD")),
+                "supplier_name": _cell_text(col(values, supplier_col)),
+                "company": _cell_text(col(values, "Công ty")),
+                "reason": _cell_text(col(values, "Lý do")),
+                "license_plate": format_license_plate(license_plate_raw) if license_plate_raw else "",
+                "status": status,
+                "check_in_time": check_in_time,
+                "estimated_datetime": estimated_times[i],
+                "estimated_at_utc": to_utc_naive(estimated_times[i]),
+                "registered_by_user_id": registered_by_user_id,
+            })
+
+            images = []
+            for path in _cell_text(col(values, "Hình ảnh")).split(","):
+                path = path.strip()
+                if not (path.startswith("guests/") or is_blob_path(path)):
+                    continue
+                if image_dirs.restore(path):
+                    images.append(path)
+                else:
+                    add_error(row_no, f"Không tìm thấy file ảnh '{path}', bỏ qua ảnh.")
+            image_lists.append(images)
+
+        if not guest_rows:
+            return
+
+        # Một INSERT nhiều VALUES; rowid cấp tăng dần theo thứ tự dòng nên sort id là khớp với guest_rows
+        new_ids = sorted(db.scalars(insert(models.Guest).returning(models.Guest.id), guest_rows).all())
+        image_rows = [
+            {"guest_id": guest_id, "image_path": path}
+            for guest_id, paths in zip(new_ids, image_lists)
+            for path in paths
+        ]
+        if image_rows:
+            db.execute(insert(models.GuestImage), image_rows)
+        report["imported"] += len(new_ids)
 
     @staticmethod
     def export_guests(
@@ -611,7 +850,7 @@ class GuestService:
             models.User.username.label("registered_by_username")
         ).join(
             models.User, models.Guest.registered_by_user_id == models.User.id
-        ).options(joinedload(models.Guest.images))
+        )
 
         if user.role == "staff":
             query = query.filter(models.Guest.registered_by_user_id == user.id)
@@ -639,82 +878,9 @@ class GuestService:
         if status:
             query = query.filter(models.Guest.status == status)
 
-        results = query.order_by(models.Guest.created_at.desc()).all()
-
-        data_to_export = []
-        for idx, (guest, registered_by_name, registered_by_username) in enumerate(results, start=1):
-            check_in_str = ""
-            if guest.check_in_time:
-                check_in_str = guest.check_in_time.strftime("%d/%m/%Y %H:%M")
-            
-            check_out_str = ""
-            if guest.check_out_time:
-                check_out_str = guest.check_out_time.strftime("%d/%m/%Y %H:%M")
-            
-            data_to_export.append({
-                "STT": idx,
-                "Giờ vào": check_in_str,
-                "Giờ ra": check_out_str,
-                "Họ tên": guest.full_name,
-                "CCCD": guest.id_card_number,
-                "Nhà thầu": guest.supplier_name,
-                "Biển số": guest.license_plate,
-                "Người đăng ký": registered_by_name,
-                "Mã nv": registered_by_username,
-                "Lý do": guest.reason
-            })
-
-        df = pd.DataFrame(data_to_export)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Guests', startrow=1, header=True)
-            
-            workbook = writer.book
-            worksheet = writer.sheets['Guests']
-            
-            worksheet.set_paper(8)
-            worksheet.set_landscape()
-            
-            title_format = workbook.add_format({
-                'font_name': 'Courier New',
-                'font_size': 15,
-                'bold': True,
-                'align': 'center',
-                'valign': 'vcenter'
-            })
-            
-            header_format = workbook.add_format({
-                'font_name': 'Courier New',
-                'font_size': 11,
-                'bold': True,
-                'align': 'left',
-                'valign': 'vcenter'
-            })
-            
-            data_format = workbook.add_format({
-                'font_name': 'Courier New',
-                'font_size': 11,
-                'align': 'left',
-                'valign': 'vcenter'
-            })
-            
-            num_columns = len(df.columns)
-            worksheet.merge_range(0, 0, 0, num_columns - 1, 'SỔ THEO DÕI KHÁCH RA/VÀO', title_format)
-            
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(1, col_num, value, header_format)
-            
-            for row_num in range(len(df)):
-                for col_num in range(len(df.columns)):
-                    worksheet.write(row_num + 2, col_num, df.iloc[row_num, col_num], data_format)
-            
-            for col_num, column in enumerate(df.columns):
-                column_width = max(df[column].astype(str).map(len).max(), len(column))
-                worksheet.set_column(col_num, col_num, column_width + 2)
-
-        output.seek(0)
-        return output
+        rows = query.order_by(models.Guest.created_at.desc()).yield_per(EXPORT_YIELD_PER)
+        filename = f"so_theo_doi_khach_{models.get_local_time().strftime('%Y%m%d_%H%M')}.xlsx"
+        return stream_xlsx(GUEST_EXPORT_SHEET, rows, filename)
 
     @staticmethod
     def clear_all_guests(db: Session, user: models.User) -> bool:
@@ -724,6 +890,7 @@ class GuestService:
         all_images = db.query(models.GuestImage).all()
         for image in all_images:
             GuestService._archive_image(image.image_path)
+            remove_derivatives(image)
 
         db.query(models.GuestImage).delete()
         db.query(models.Guest).delete()
@@ -731,6 +898,127 @@ class GuestService:
         return True
 
 class LongTermGuestService:
+    # Các cột Guest lấy từ đăng ký dài hạn; khi đăng ký thay đổi, dòng 'pending' của hôm nay
+    # được ghi đè các cột này (ON CONFLICT DO UPDATE)
+    _VISIT_COLUMNS = (
+        "full_name", "id_card_number", "company", "reason", "license_plate",
+        "supplier_name", "estimated_datetime", "estimated_at_utc", "registered_by_user_id",
+    )
+
+    @staticmethod
+    def _visit_row(lt_guest: models.LongTermGuest, visit_date, tz) -> dict:
+        """Dòng Guest cho một ngày của đăng ký dài hạn (giờ dự kiến = giờ gốc trên ngày đó)."""
+        estimated_dt = None
+        if lt_guest.estimated_datetime:
+            estimated_dt = tz.localize(datetime.combine(visit_date, lt_guest.estimated_datetime.time()))
+        return {
+            "long_term_guest_id": lt_guest.id,
+            "visit_date": visit_date,
+            "full_name": lt_guest.full_name,
+            "id_card_number": lt_guest.id_card_number or "",
+            "company": lt_guest.company or lt_guest.supplier_name or "",
+            "reason": lt_guest.reason or "Khách đăng ký dài hạn",
+            "license_plate": lt_guest.license_plate or "",
+            "supplier_name": lt_guest.supplier_name or "",
+            "estimated_datetime": estimated_dt,
+            "estimated_at_utc": to_utc_naive(estimated_dt),
+            "status": "pending",
+            "registered_by_user_id": lt_guest.registered_by_user_id,
+            "created_at": models.get_local_time(),
+        }
+
+    @staticmethod
+    def materialize_visits(db: Session, lt_guests: list, visit_date, refresh: bool = False) -> list:
+        """
+        Upsert dòng Guest của `visit_date` cho các đăng ký dài hạn, khóa (long_term_guest_id, visit_date).
+        - refresh=False: ON CONFLICT DO NOTHING (job đầu ngày, chạy lại bao nhiêu lần cũng không sinh trùng)
+        - refresh=True : cập nhật lại dòng còn 'pending' theo thông tin đăng ký mới
+        Trả về các dòng (id, registered_by_user_id) được chèn/cập nhật. Không commit.
+        """
+        if not lt_guests:
+            return []
+        tz = pytz.timezone(config.settings.TZ)
+        rows = [LongTermGuestService._visit_row(lt, visit_date, tz) for lt in lt_guests]
+
+        stmt = sqlite_insert(models.Guest).values(rows)
+        if refresh:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["long_term_guest_id", "visit_date"],
+                set_={c: stmt.excluded[c] for c in LongTermGuestService._VISIT_COLUMNS},
+                where=models.Guest.status == "pending",
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["long_term_guest_id", "visit_date"])
+        stmt = stmt.returning(models.Guest.id, models.Guest.registered_by_user_id)
+        return db.execute(stmt).all()
+
+    @staticmethod
+    def _sync_today(db: Session, lt_guest: models.LongTermGuest) -> list:
+        """Cập nhật tăng dần khách hôm nay sau khi đăng ký dài hạn được tạo/sửa. Không commit."""
+        today = models.get_local_time().date()
+        if lt_guest.is_active and lt_guest.start_date <= today <= lt_guest.end_date:
+            return LongTermGuestService.materialize_visits(db, [lt_guest], today, refresh=True)
+
+        # Đăng ký không còn hiệu lực hôm nay: bỏ dòng hôm nay nếu khách chưa vào
+        stale = db.query(models.Guest).filter(
+            models.Guest.long_term_guest_id == lt_guest.id,
+            models.Guest.visit_date == today,
+            models.Guest.status == "pending",
+        ).first()
+        if stale:
+            db.delete(stale)
+        return []
+
+    @staticmethod
+    def _unlink_visits(db: Session, lt_guest_ids: list) -> None:
+        """
+        Trước khi xóa đăng ký dài hạn: xóa dòng hôm nay còn 'pending', các dòng khác giữ lại
+        làm lịch sử nhưng bỏ liên kết (tránh trùng khóa nếu SQLite cấp lại id cũ).
+        """
+        if not lt_guest_ids:
+            return
+        today = models.get_local_time().date()
+        for guest in db.query(models.Guest).filter(
+            models.Guest.long_term_guest_id.in_(lt_guest_ids),
+            models.Guest.visit_date == today,
+            models.Guest.status == "pending",
+        ):
+            db.delete(guest)
+        db.query(models.Guest).filter(
+            models.Guest.long_term_guest_id.in_(lt_guest_ids)
+        ).update({models.Guest.long_term_guest_id: None}, synchronize_session=False)
+
+    @staticmethod
+    def _adopt_existing_visits(db: Session, visit_date) -> None:
+        """
+        Khách đã đăng ký trong ngày (thủ công, hoặc sinh bởi phiên bản cũ chưa có khóa) trùng CCCD
+        với một đăng ký dài hạn đang hiệu lực được gắn làm dòng của ngày đó, để job không tạo thêm
+        bản trùng. UPDATE OR IGNORE bỏ qua các dòng sẽ vi phạm khóa duy nhất.
+        """
+        start_of_day = datetime.combine(visit_date, datetime.min.time())
+        db.execute(text("""
+            UPDATE OR IGNORE guests
+            SET long_term_guest_id = (
+                    SELECT min(lt.id) FROM long_term_guests lt
+                    WHERE lt.is_active = 1 AND lt.start_date <= :day AND lt.end_date >= :day
+                      AND lt.id_card_number = guests.id_card_number
+                ),
+                visit_date = :day
+            WHERE long_term_guest_id IS NULL
+              AND created_at >= :start_of_day
+              AND id_card_number != ''
+              AND id_card_number IN (
+                    SELECT id_card_number FROM long_term_guests
+                    WHERE is_active = 1 AND start_date <= :day AND end_date >= :day
+                )
+        """).bindparams(bindparam("day", type_=Date), bindparam("start_of_day", type_=DateTime)),
+            {"day": visit_date, "start_of_day": start_of_day})
+
+    @staticmethod
+    def _publish_visits(rows: list) -> None:
+        if rows:
+            publish_guests_created(rows, source="long_term")
+
     @staticmethod
     def create_long_term_guest(
         db: Session, 
@@ -746,33 +1034,12 @@ class LongTermGuestService:
             registered_by_user_id=user.id
         )
         db.add(db_long_term_guest)
-        db.commit()
+        db.flush()
 
-        # Sync logic: Create Guest for today if applicable
-        today = models.get_local_time().date()
-        if db_long_term_guest.start_date <= today <= db_long_term_guest.end_date:
-            existing_guest = db.query(models.Guest).filter(
-                models.Guest.full_name == payload.full_name,
-                models.Guest.id_card_number == (payload.id_card_number or ""),
-                func.date(models.Guest.created_at) == today,
-                models.Guest.registered_by_user_id == user.id
-            ).first()
-
-            if not existing_guest:
-                guest_for_today = models.Guest(
-                    full_name=payload.full_name,
-                    id_card_number=payload.id_card_number or "",
-                    company=payload.company or "",
-                    reason=payload.reason or "",
-                    license_plate=payload.license_plate or "",
-                    supplier_name=payload.supplier_name or "",
-                    status="pending",
-                    estimated_datetime=payload.estimated_datetime,
-                    registered_by_user_id=user.id,
-                    created_at=models.get_local_time()
-                )
-                db.add(guest_for_today)
-                db.commit()
+        # Sync logic: Create Guest for today if applicable (cùng transaction)
+        visits = LongTermGuestService._sync_today(db, db_long_term_guest)
+        db.commit()
+        LongTermGuestService._publish_visits(visits)
 
         db.refresh(db_long_term_guest)
         return db_long_term_guest
@@ -813,8 +1080,10 @@ class LongTermGuestService:
         for key, value in update_data.items():
             if key != 'estimated_time':
                 setattr(db_guest, key, value)
-        
+
+        visits = LongTermGuestService._sync_today(db, db_guest)
         db.commit()
+        LongTermGuestService._publish_visits(visits)
         db.refresh(db_guest)
         return db_guest
 
@@ -827,6 +1096,7 @@ class LongTermGuestService:
         old_guests = db.query(models.LongTermGuest).filter(models.LongTermGuest.end_date < today).all()
         
         deleted_count = len(old_guests)
+        LongTermGuestService._unlink_visits(db, [g.id for g in old_guests])
         for guest in old_guests:
             db.delete(guest)
         
@@ -842,6 +1112,7 @@ class LongTermGuestService:
         if user.role not in ('admin', 'manager') and db_guest.registered_by_user_id != user.id:
              raise PermissionError("Not authorized")
         
+        LongTermGuestService._unlink_visits(db, [db_guest.id])
         db.delete(db_guest)
         db.commit()
         return True
@@ -850,78 +1121,22 @@ class LongTermGuestService:
     def process_daily_entries(db: Session, tz_name: str) -> int:
         """
         Create daily guest entries from active long-term guests.
+        Chạy lúc 00:00 (giờ địa phương) và khi khởi động. Một câu INSERT ... ON CONFLICT DO NOTHING
+        theo khóa (long_term_guest_id, visit_date) nên chạy lại/chạy chồng không tạo trùng.
         """
-        from datetime import time, datetime
-        from app.models import LongTermGuest, Guest, get_local_time
-        import pytz
-        from sqlalchemy import select
-
         today = datetime.now(pytz.timezone(tz_name)).date()
-        
-        active_long_term_guests = db.scalars(
-            select(LongTermGuest).where(
-                LongTermGuest.is_active == True,
-                LongTermGuest.start_date <= today,
-                LongTermGuest.end_date >= today
-            )
-        ).all()
-
-        start_of_day = datetime.combine(today, time.min, tzinfo=pytz.timezone(tz_name))
-        end_of_day = datetime.combine(today, time.max, tzinfo=pytz.timezone(tz_name))
 
-        # Check for ANY guest with same ID card created today (to avoid duplicates)
-        existing_guests_today = db.scalars(
-            select(Guest.id_card_number).where(
-                Guest.created_at >= start_of_day,
-                Guest.created_at <= end_of_day,
-                Guest.id_card_number != ""
-            )
+        active_long_term_guests = db.query(models.LongTermGuest).filter(
+            models.LongTermGuest.is_active == True,
+            models.LongTermGuest.start_date <= today,
+            models.LongTermGuest.end_date >= today
         ).all()
-        existing_guest_set = set(existing_guests_today)
-
-        count = 0
-        for lt_guest in active_long_term_guests:
-            if lt_guest.id_card_number and lt_guest.id_card_number not in existing_guest_set:
-                # Use the original registrant's ID
-                registrant_id = lt_guest.registered_by_user_id
-                
-                # Calculate new estimated_datetime for today
-                estimated_dt = None
-                if lt_guest.estimated_datetime:
-                     try:
-                         # Combine today's date with the time from the original estimated_datetime
-                         # We need to handle timezone awareness carefully.
-                         # lt_guest.estimated_datetime might be naive or aware.
-                         
-                         original_time = lt_guest.estimated_datetime.time()
-                         # Combine with 'today' which is naive date, then localize
-                         dt_naive = datetime.combine(today, original_time)
-                         estimated_dt = pytz.timezone(tz_name).localize(dt_naive)
-                     except Exception as e:
-                         # Fallback if something goes wrong (e.g., timezone issues)
-                         # Just use the original (will be past) or None? 
-                         # Better to force it to be "today" even if time is 00:00
-                         estimated_dt = datetime.combine(today, time(8, 0), tzinfo=pytz.timezone(tz_name))
-
-                new_guest = Guest(
-                    full_name=lt_guest.full_name,
-                    id_card_number=lt_guest.id_card_number,
-                    company=lt_guest.company or lt_guest.supplier_name,
-                    reason=lt_guest.reason or "Khách đăng ký dài hạn",
-                    license_plate=lt_guest.license_plate,
-                    supplier_name=lt_guest.supplier_name,
-                    estimated_datetime=estimated_dt,
-                    status="pending",
-                    registered_by_user_id=registrant_id,
-                    created_at=get_local_time()
-                )
-                db.add(new_guest)
-                existing_guest_set.add(lt_guest.id_card_number)
-                count += 1
-        
-        if count > 0:
-            db.commit()
-        return count
+
+        LongTermGuestService._adopt_existing_visits(db, today)
+        created = LongTermGuestService.materialize_visits(db, active_long_term_guests, today)
+        db.commit()
+        LongTermGuestService._publish_visits(created)
+        return len(created)
 
 guest_service = GuestService()
 long_term_guest_service = LongTermGuestService()
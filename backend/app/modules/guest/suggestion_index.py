@@ -0,0 +1,108 @@
+"""
+Bảng gợi ý biển số / nhà cung cấp (guest_suggestions).
+
+Trigger SQLite trên bảng guests tăng/giảm frequency của (field, value) khi
+thêm/sửa/xóa khách, nên GET /guests/suggestions chỉ đọc bảng nhỏ này theo
+tiền tố (index (field, folded)) thay vì SELECT DISTINCT trên toàn bộ guests.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.database import search_fold, search_fold_outdated, search_fold_steps
+
+logger = logging.getLogger(__name__)
+
+SUGGESTION_FIELDS = ("license_plate", "supplier_name")
+
+# Khóa tìm kiếm ghi bằng SQL thuần (trigger không gọi hàm Python nên công cụ ngoài vẫn
+# ghi được guests): biểu thức dưới đây rồi các câu UPDATE của search_fold_steps().
+# Kết quả phải khớp với fold_suggestion() bên dưới.
+_FOLD_SQL = {
+    "license_plate": "replace(replace(replace(lower({v}), '-', ''), '.', ''), ' ', '')",
+    "supplier_name": "lower({v})",
+}
+
+
+def _fold_steps(field: str, where: str) -> str:
+    return "\n        ".join(search_fold_steps("guest_suggestions", "folded", f"field = '{field}' AND {where}"))
+
+
+def fold_suggestion(field: str, value: str) -> str:
+    folded = search_fold(value or "")
+    if field == "license_plate":
+        folded = folded.replace("-", "").replace(".", "").replace(" ", "")
+    return folded
+
+
+def _increment(field: str, ref: str) -> str:
+    return f"""
+        INSERT INTO guest_suggestions(field, value, folded, frequency)
+        SELECT '{field}', {ref}.{field}, {_FOLD_SQL[field].format(v=f"{ref}.{field}")}, 1
+        WHERE coalesce({ref}.{field}, '') != ''
+        ON CONFLICT(field, value) DO UPDATE SET frequency = frequency + 1;
+        {_fold_steps(field, f"value = {ref}.{field}")}"""
+
+
+def _decrement(field: str, ref: str) -> str:
+    return f"""
+        UPDATE guest_suggestions SET frequency = frequency - 1
+        WHERE field = '{field}' AND value = {ref}.{field};
+        DELETE FROM guest_suggestions
+        WHERE field = '{field}' AND value = {ref}.{field} AND frequency <= 0;"""
+
+
+def _triggers() -> dict:
+    triggers = {
+        "trg_guest_suggestions_ai": f"""
+            CREATE TRIGGER trg_guest_suggestions_ai AFTER INSERT ON guests BEGIN
+                {"".join(_increment(f, "NEW") for f in SUGGESTION_FIELDS)}
+            END""",
+        "trg_guest_suggestions_ad": f"""
+            CREATE TRIGGER trg_guest_suggestions_ad AFTER DELETE ON guests BEGIN
+                {"".join(_decrement(f, "OLD") for f in SUGGESTION_FIELDS)}
+            END""",
+    }
+    for field in SUGGESTION_FIELDS:
+        triggers[f"trg_guest_suggestions_{field}_au"] = f"""
+            CREATE TRIGGER trg_guest_suggestions_{field}_au AFTER UPDATE OF {field} ON guests
+            WHEN OLD.{field} IS NOT NEW.{field} BEGIN
+                {_decrement(field, "OLD")}
+                {_increment(field, "NEW")}
+            END"""
+    return triggers
+
+
+def rebuild_suggestions(conn) -> None:
+    """Tính lại toàn bộ bảng gợi ý từ guests."""
+    conn.execute(text("DELETE FROM guest_suggestions"))
+    for field in SUGGESTION_FIELDS:
+        conn.execute(text(f"""
+            INSERT INTO guest_suggestions(field, value, folded, frequency)
+            SELECT '{field}', {field}, {_FOLD_SQL[field].format(v=field)}, count(*)
+            FROM guests WHERE coalesce({field}, '') != ''
+            GROUP BY {field}
+        """))
+        for statement in search_fold_steps("guest_suggestions", "folded", f"field = '{field}'"):
+            conn.execute(text(statement))
+
+
+def ensure_suggestion_index(engine: Engine) -> None:
+    """Tạo trigger (idempotent); nạp dữ liệu lần đầu nếu bảng gợi ý đang trống."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name, ddl in _triggers().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+
+        empty = conn.execute(text("SELECT 1 FROM guest_suggestions LIMIT 1")).first() is None
+        has_values = conn.execute(text(
+            "SELECT 1 FROM guests WHERE coalesce(license_plate, '') != '' "
+            "OR coalesce(supplier_name, '') != '' LIMIT 1"
+        )).first() is not None
+        outdated = search_fold_outdated(conn, "guest_suggestions")
+        if has_values and (empty or outdated):
+            logger.info("[guest_suggestions] Building suggestion table from guests")
+            rebuild_suggestions(conn)
@@ -51,5 +51,8 @@ class PurchasingImage(Base):
     purchasing_id = Column(Integer, ForeignKey("purchasing_logs.id"), nullable=False)
     image_path = Column(String(255), nullable=False)
     image_type = Column(String(32), default="request") # request, delivery
+    # Ảnh phái sinh WebP (app/services/image_derivatives.py), NULL khi chưa tạo xong
+    thumb_path = Column(String(255), nullable=True)
+    preview_path = Column(String(255), nullable=True)
     
     purchasing = relationship("PurchasingLog", back_populates="images")
@@ -26,6 +26,8 @@ class PurchasingImageRead(BaseModel):
     purchasing_id: int
     image_path: str
     image_type: str = "request"
+    thumb_path: Optional[str] = None
+    preview_path: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -5,15 +5,51 @@ from typing import List, Optional
 import os
 import uuid
 import logging
-import io
-import pandas as pd
 
 from app import models
 from app.core import config
 from app.modules.purchasing import schema as schemas
+from app.services.image_derivatives import image_derivatives, remove_derivatives
+from app.modules.blob.service import blob_service
+from app.services.upload_service import StagedUpload
+from app.utils.excel_export import EXPORT_YIELD_PER, ROW_NUMBER, ExcelColumn, ExcelSheetSpec, stream_xlsx
 
 logger = logging.getLogger(__name__)
 
+PURCHASING_STATUS_LABELS = {
+    "new": "Mới",
+    "pending": "Chờ duyệt",
+    "approved": "Đã duyệt",
+    "rejected": "Từ chối",
+    "completed": "Hoàn thành",
+}
+
+_TIMES = {"font_name": "Times New Roman", "font_size": 11, "valign": "vcenter"}
+
+# Cột file Excel "Báo cáo mua sắm"; mỗi dòng là một PurchasingLog
+PURCHASING_EXPORT_SHEET = ExcelSheetSpec(
+    sheet_name="Purchasing",
+    title="BÁO CÁO MUA SẮM VẬT TƯ / THIẾT BỊ",
+    title_format={**_TIMES, "font_size": 14, "bold": True, "align": "center"},
+    header_format={**_TIMES, "bold": True, "align": "center", "border": 1},
+    cell_format={**_TIMES, "align": "left", "border": 1},
+    columns=[
+        ROW_NUMBER,
+        ExcelColumn("Ngày tạo", lambda p: p.created_at, kind="datetime", width=15),
+        ExcelColumn("Người tạo", lambda p: p.creator_name),
+        ExcelColumn("Bộ phận đề xuất", lambda p: p.department),
+        ExcelColumn("Bộ phận sử dụng", lambda p: p.using_department, width=20),
+        ExcelColumn("Loại", lambda p: "Vật tư" if p.category == "supplies" else "Thiết bị", width=20),
+        ExcelColumn("Tên hàng", lambda p: p.item_name, width=30),
+        ExcelColumn("Nhà cung cấp", lambda p: p.supplier_name),
+        ExcelColumn("Giá duyệt", lambda p: p.approved_price, kind="number"),
+        ExcelColumn("Trạng thái", lambda p: PURCHASING_STATUS_LABELS.get(p.status, p.status)),
+        ExcelColumn("Ngày nhận", lambda p: p.received_at, kind="datetime"),
+        ExcelColumn("Ghi chú nhận", lambda p: p.received_note),
+    ],
+)
+
+
 class PurchasingService:
     @staticmethod
     def get_purchasing_list(
@@ -93,13 +129,8 @@ class PurchasingService:
             return False
         
         for image in db_purchasing.images:
-            try:
-                file_path = os.path.join(config.settings.UPLOAD_DIR, image.image_path)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Deleted file: {file_path}")
-            except Exception as e:
-                logger.error(f"Could not delete file {image.image_path}: {e}")
+            blob_service.remove_legacy_file(image.image_path)
+            remove_derivatives(image)
         
         db.delete(db_purchasing)
         db.commit()
@@ -110,31 +141,21 @@ class PurchasingService:
         db: Session,
         purchasing_id: int,
         type: str,
-        file_filename: str,
-        file_content: bytes
+        upload: StagedUpload
     ) -> models.PurchasingImage:
         db_purchasing = db.get(models.PurchasingLog, purchasing_id)
         if not db_purchasing:
             return None
         
-        ext = os.path.splitext(file_filename)[1]
-        unique_filename = f"{uuid.uuid4()}{ext}"
-        
-        save_dir = os.path.join(config.settings.UPLOAD_DIR, "purchasing")
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, unique_filename)
-        
-        with open(save_path, "wb") as buffer:
-            buffer.write(file_content)
-        
         db_image = models.PurchasingImage(
             purchasing_id=purchasing_id,
-            image_path=f"purchasing/{unique_filename}",
+            image_path=blob_service.put_staged(db, upload),
             image_type=type
         )
         db.add(db_image)
         db.commit()
         db.refresh(db_image)
+        image_derivatives.submit(models.PurchasingImage, db_image.id, db_image.image_path)
         return db_image
 
     @staticmethod
@@ -143,13 +164,8 @@ class PurchasingService:
         if not db_image:
             return False
         
-        try:
-            file_path = os.path.join(config.settings.UPLOAD_DIR, db_image.image_path)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Deleted file: {file_path}")
-        except Exception as e:
-            logger.error(f"Could not delete file {db_image.image_path}: {e}")
+        blob_service.remove_legacy_file(db_image.image_path)
+        remove_derivatives(db_image)
         
         db.delete(db_image)
         db.commit()
@@ -205,71 +221,8 @@ class PurchasingService:
         if status:
             query = query.filter(models.PurchasingLog.status == status)
 
-        results = query.order_by(models.PurchasingLog.created_at.desc()).all()
-
-        # === EXCEL FORMAT ===
-        data_to_export = []
-        for idx, log in enumerate(results, start=1):
-            created_at_str = log.created_at.strftime("%d/%m/%Y %H:%M") if log.created_at else ""
-            received_at_str = log.received_at.strftime("%d/%m/%Y %H:%M") if log.received_at else ""
-            
-            status_map = {
-                "new": "Mới",
-                "pending": "Chờ duyệt",
-                "approved": "Đã duyệt",
-                "rejected": "Từ chối",
-                "completed": "Hoàn thành"
-            }
-            status_display = status_map.get(log.status, log.status)
-
-            data_to_export.append({
-                "STT": idx,
-                "Ngày tạo": created_at_str,
-                "Người tạo": log.creator_name,
-                "Bộ phận đề xuất": log.department,
-                "Bộ phận sử dụng": log.using_department,
-                "Loại": "Vật tư" if log.category == "supplies" else "Thiết bị",
-                "Tên hàng": log.item_name,
-                "Nhà cung cấp": log.supplier_name,
-                "Giá duyệt": log.approved_price,
-                "Trạng thái": status_display,
-                "Ngày nhận": received_at_str,
-                "Ghi chú nhận": log.received_note or ""
-            })
-
-        df = pd.DataFrame(data_to_export)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Purchasing', startrow=1, header=True)
-            
-            workbook = writer.book
-            worksheet = writer.sheets['Purchasing']
-            
-            # Formats
-            title_format = workbook.add_format({'font_name': 'Times New Roman', 'font_size': 14, 'bold': True, 'align': 'center', 'valign': 'vcenter'})
-            header_format = workbook.add_format({'font_name': 'Times New Roman', 'font_size': 11, 'bold': True, 'align': 'center', 'valign': 'vcenter', 'border': 1})
-            data_format = workbook.add_format({'font_name': 'Times New Roman', 'font_size': 11, 'align': 'left', 'valign': 'vcenter', 'border': 1})
-            
-            # Title
-            worksheet.merge_range(0, 0, 0, len(df.columns) - 1, 'BÁO CÁO MUA SẮM VẬT TƯ / THIẾT BỊ', title_format)
-            
-            # Header
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(1, col_num, value, header_format)
-            
-            # Data
-            for row_num in range(len(df)):
-                for col_num in range(len(df.columns)):
-                    worksheet.write(row_num + 2, col_num, df.iloc[row_num, col_num], data_format)
-            
-            # Widths
-            worksheet.set_column(0, 0, 5)   # STT
-            worksheet.set_column(1, 1, 15)  # Date
-            worksheet.set_column(4, 5, 20)  # Departments
-            worksheet.set_column(6, 6, 30)  # Item Name
-
-        output.seek(0)
-        return output
+        rows = query.order_by(models.PurchasingLog.created_at.desc()).yield_per(EXPORT_YIELD_PER)
+        filename = f"bao_cao_mua_sam_{models.get_local_time().strftime('%Y%m%d_%H%M')}.xlsx"
+        return stream_xlsx(PURCHASING_EXPORT_SHEET, rows, filename)
 
 purchasing_service = PurchasingService()
@@ -0,0 +1,160 @@
+"""
+Cache kết quả báo cáo trong bộ nhớ tiến trình.
+
+Dashboard gọi song song nhiều endpoint /reports/* mỗi lần mở trang; kết quả được giữ
+theo (tên báo cáo, tham số đã chuẩn hóa, ngày hiện tại) trong REPORT_CACHE_TTL_SECONDS.
+
+Độ mới: trigger SQLite tăng bộ đếm sync_state('reports') khi guests, asset_log,
+purchasing_logs hoặc users thay đổi (kể cả job nền, UPDATE hàng loạt). Mỗi lần đọc cache
+so version đã lưu với giá trị hiện tại (một truy vấn theo khóa chính); khác thì tính lại.
+TTL chỉ còn để làm mới các số phụ thuộc thời gian (số ngày quá hạn, "hôm nay"...).
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Optional
+
+import pytz
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = "reports"
+REPORT_CACHE_TTL_SECONDS = 300
+REPORT_CACHE_SIZE = 256
+
+# Bảng nguồn của báo cáo; bảng có row_version (delta-sync) bỏ qua UPDATE nội bộ của trigger sync
+_SOURCE_TABLES = {
+    "guests": True,
+    "asset_log": True,
+    "purchasing_logs": False,
+    "users": False,
+}
+
+_BUMP = f"UPDATE sync_state SET version = version + 1 WHERE name = '{REPORT_VERSION}';"
+
+
+def _triggers() -> dict:
+    triggers = {}
+    for table, has_row_version in _SOURCE_TABLES.items():
+        for suffix, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            when = " WHEN NEW.row_version IS OLD.row_version" if event == "UPDATE" and has_row_version else ""
+            triggers[f"trg_report_version_{table}_{suffix}"] = f"""
+                CREATE TRIGGER trg_report_version_{table}_{suffix} AFTER {event} ON {table}{when} BEGIN
+                    {_BUMP}
+                END"""
+    return triggers
+
+
+def ensure_report_version(engine: Engine) -> None:
+    """Tạo dòng bộ đếm + trigger (idempotent). Gọi sau ensure_change_tracking()."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO sync_state(name, version) VALUES (:name, 0)"),
+            {"name": REPORT_VERSION},
+        )
+        for name, ddl in _triggers().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+
+
+def current_version(db: Session) -> int:
+    # Trong snapshot đọc của dashboard, version đã được đọc một lần và không đổi
+    if REPORT_VERSION in db.info:
+        return db.info[REPORT_VERSION]
+    return db.execute(
+        text("SELECT version FROM sync_state WHERE name = :name"), {"name": REPORT_VERSION}
+    ).scalar() or 0
+
+
+def _normalize(value: Any) -> Any:
+    """Tham số -> giá trị hashable, ổn định (datetime có múi giờ đổi về UTC)."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class _Uncached:
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def uncached(value: Any) -> Any:
+    """Bọc kết quả dự phòng (lỗi khi tính báo cáo): trả về cho request này nhưng không lưu cache."""
+    return _Uncached(value)
+
+
+class ReportCache:
+    def __init__(self, maxsize: int = REPORT_CACHE_SIZE, ttl: float = REPORT_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, db: Session, report: str, params: dict, compute: Callable[[], Any], ttl: Optional[float] = None):
+        today = datetime.now(pytz.timezone(config.settings.TZ)).date()
+        key = (report, today, tuple(sorted((k, _normalize(v)) for k, v in params.items())))
+        version = current_version(db)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                cached_version, expires_at, result = entry
+                if cached_version == version and expires_at > now:
+                    self._entries.move_to_end(key)
+                    return result
+                del self._entries[key]
+
+        result = compute()
+        if isinstance(result, _Uncached):
+            return result.value
+
+        with self._lock:
+            self._entries[key] = (version, now + (ttl or self.ttl), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+report_cache = ReportCache()
+
+
+def cached_report(report: str, ttl: Optional[float] = None):
+    """
+    Decorator cho phương thức ReportService(self, db, ...): cache kết quả theo các tham số
+    còn lại. Kết quả trả về dùng chung giữa các request nên không được sửa tại chỗ.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, db: Session, *args, **kwargs):
+            bound = signature.bind(self, db, *args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k not in ("self", "db")}
+            return report_cache.get_or_compute(db, report, params, lambda: func(self, db, *args, **kwargs), ttl)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, Integer, String, Date
+from app.core.database import Base
+
+# Bảng tổng hợp (rollup) theo ngày cho dashboard báo cáo.
+# Do trigger SQLite duy trì trong cùng transaction với thay đổi trên guests / asset_log
+# (app/modules/report/rollups.py); không ghi trực tiếp từ ORM.
+# Khóa không nhận NULL: supplier/biển số/trạng thái rỗng lưu '' và người đăng ký rỗng lưu 0.
+
+class GuestDailyRollup(Base):
+    """Số khách theo ngày tạo (created_at)."""
+    __tablename__ = "report_guest_daily"
+    day = Column(Date, primary_key=True)
+    supplier_name = Column(String(128), primary_key=True, default="")
+    registered_by_user_id = Column(Integer, primary_key=True, default=0)
+    status = Column(String(16), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+class GuestCheckinRollup(Base):
+    """Số khách theo ngày vào cổng (check_in_time)."""
+    __tablename__ = "report_guest_checkin_daily"
+    day = Column(Date, primary_key=True)
+    supplier_name = Column(String(128), primary_key=True, default="")
+    registered_by_user_id = Column(Integer, primary_key=True, default=0)
+    status = Column(String(16), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+class GuestPlateRollup(Base):
+    """Số lượt xe (biển số) theo ngày vào cổng."""
+    __tablename__ = "report_guest_plate_daily"
+    day = Column(Date, primary_key=True)
+    license_plate = Column(String(32), primary_key=True)
+    status = Column(String(16), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+class AssetDailyRollup(Base):
+    """Số phiếu tài sản theo ngày tạo (created_at)."""
+    __tablename__ = "report_asset_daily"
+    day = Column(Date, primary_key=True)
+    registered_by_user_id = Column(Integer, primary_key=True, default=0)
+    status = Column(String(16), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+class AssetReturnRollup(Base):
+    """Số tài sản theo ngày mang vào lại (check_in_back_time)."""
+    __tablename__ = "report_asset_return_daily"
+    day = Column(Date, primary_key=True)
+    status = Column(String(16), primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
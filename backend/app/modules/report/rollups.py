@@ -0,0 +1,195 @@
+"""
+Bảng tổng hợp theo ngày (report_*_daily) cho dashboard báo cáo.
+
+Trigger SQLite trên guests / asset_log trừ 1 ở nhóm khóa cũ và cộng 1 ở nhóm khóa mới
+mỗi khi dòng được thêm / xóa / đổi cột liên quan (tạo khách, check-in, check-out, job
+no-show đổi trạng thái hàng loạt...), trong cùng transaction với thay đổi đó.
+Báo cáo chỉ quét một khoảng ngày nhỏ trên các bảng này thay vì GROUP BY toàn bảng.
+
+Dựng lại toàn bộ (ví dụ sau khi sửa CSDL bằng công cụ ngoài):
+    python -m app.modules.report.rollups
+Lúc khởi động, ensure_report_rollups() tạo trigger và tự dựng lại bảng nào lệch tổng.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    table: str
+    source: str
+    # cột khóa -> biểu thức SQL trên dòng nguồn ("{r}" là NEW / OLD / bí danh bảng)
+    keys: Dict[str, str]
+    # điều kiện để dòng nguồn được đếm
+    where: str
+    # cột nguồn mà UPDATE cần theo dõi
+    columns: Tuple[str, ...]
+
+    def exprs(self, ref: str) -> Dict[str, str]:
+        return {col: expr.format(r=ref) for col, expr in self.keys.items()}
+
+
+ROLLUPS = (
+    RollupSpec(
+        table="report_guest_daily",
+        source="guests",
+        keys={
+            "day": "date({r}.created_at)",
+            "supplier_name": "coalesce({r}.supplier_name, '')",
+            "registered_by_user_id": "coalesce({r}.registered_by_user_id, 0)",
+            "status": "coalesce({r}.status, '')",
+        },
+        where="{r}.created_at IS NOT NULL",
+        columns=("created_at", "supplier_name", "registered_by_user_id", "status"),
+    ),
+    RollupSpec(
+        table="report_guest_checkin_daily",
+        source="guests",
+        keys={
+            "day": "date({r}.check_in_time)",
+            "supplier_name": "coalesce({r}.supplier_name, '')",
+            "registered_by_user_id": "coalesce({r}.registered_by_user_id, 0)",
+            "status": "coalesce({r}.status, '')",
+        },
+        where="{r}.check_in_time IS NOT NULL",
+        columns=("check_in_time", "supplier_name", "registered_by_user_id", "status"),
+    ),
+    RollupSpec(
+        table="report_guest_plate_daily",
+        source="guests",
+        keys={
+            "day": "date({r}.check_in_time)",
+            "license_plate": "{r}.license_plate",
+            "status": "coalesce({r}.status, '')",
+        },
+        where="{r}.check_in_time IS NOT NULL AND coalesce({r}.license_plate, '') != ''",
+        columns=("check_in_time", "license_plate", "status"),
+    ),
+    RollupSpec(
+        table="report_asset_daily",
+        source="asset_log",
+        keys={
+            "day": "date({r}.created_at)",
+            "registered_by_user_id": "coalesce({r}.registered_by_user_id, 0)",
+            "status": "coalesce({r}.status, '')",
+        },
+        where="{r}.created_at IS NOT NULL",
+        columns=("created_at", "registered_by_user_id", "status"),
+    ),
+    RollupSpec(
+        table="report_asset_return_daily",
+        source="asset_log",
+        keys={
+            "day": "date({r}.check_in_back_time)",
+            "status": "coalesce({r}.status, '')",
+        },
+        where="{r}.check_in_back_time IS NOT NULL",
+        columns=("check_in_back_time", "status"),
+    ),
+)
+
+
+def _increment(spec: RollupSpec, ref: str) -> str:
+    exprs = spec.exprs(ref)
+    cols = ", ".join(exprs)
+    return f"""
+        INSERT INTO {spec.table} ({cols}, count)
+        SELECT {", ".join(exprs.values())}, 1 WHERE {spec.where.format(r=ref)}
+        ON CONFLICT({cols}) DO UPDATE SET count = count + 1;"""
+
+
+def _decrement(spec: RollupSpec, ref: str) -> str:
+    match = " AND ".join(f"{col} = {expr}" for col, expr in spec.exprs(ref).items())
+    return f"""
+        UPDATE {spec.table} SET count = count - 1 WHERE {match} AND {spec.where.format(r=ref)};
+        DELETE FROM {spec.table} WHERE {match} AND count <= 0;"""
+
+
+def _triggers() -> dict:
+    triggers = {}
+    for spec in ROLLUPS:
+        name = f"trg_rollup_{spec.table}"
+        triggers[f"{name}_ai"] = f"""
+            CREATE TRIGGER {name}_ai AFTER INSERT ON {spec.source} BEGIN
+                {_increment(spec, "NEW")}
+            END"""
+        triggers[f"{name}_ad"] = f"""
+            CREATE TRIGGER {name}_ad AFTER DELETE ON {spec.source} BEGIN
+                {_decrement(spec, "OLD")}
+            END"""
+        # UPDATE OF: bỏ qua các UPDATE không đụng cột khóa (vd. row_version của delta-sync)
+        changed = " OR ".join(
+            f"({old}) IS NOT ({new})"
+            for old, new in zip(spec.exprs("OLD").values(), spec.exprs("NEW").values())
+        )
+        changed += f" OR ({spec.where.format(r='OLD')}) IS NOT ({spec.where.format(r='NEW')})"
+        triggers[f"{name}_au"] = f"""
+            CREATE TRIGGER {name}_au AFTER UPDATE OF {", ".join(spec.columns)} ON {spec.source}
+            WHEN {changed} BEGIN
+                {_decrement(spec, "OLD")}
+                {_increment(spec, "NEW")}
+            END"""
+    return triggers
+
+
+def rebuild_rollup(conn, spec: RollupSpec) -> None:
+    exprs = spec.exprs("r")
+    conn.execute(text(f"DELETE FROM {spec.table}"))
+    conn.execute(text(f"""
+        INSERT INTO {spec.table} ({", ".join(exprs)}, count)
+        SELECT {", ".join(exprs.values())}, count(*)
+        FROM {spec.source} AS r
+        WHERE {spec.where.format(r="r")}
+        GROUP BY {", ".join(exprs.values())}
+    """))
+
+
+def rebuild_rollups(conn) -> None:
+    """Dựng lại toàn bộ bảng tổng hợp từ guests / asset_log."""
+    for spec in ROLLUPS:
+        rebuild_rollup(conn, spec)
+
+
+def _is_consistent(conn, spec: RollupSpec) -> bool:
+    expected = conn.execute(text(
+        f"SELECT count(*) FROM {spec.source} AS r WHERE {spec.where.format(r='r')}"
+    )).scalar()
+    actual = conn.execute(text(f"SELECT coalesce(sum(count), 0) FROM {spec.table}")).scalar()
+    return expected == actual
+
+
+def ensure_report_rollups(engine: Engine) -> None:
+    """
+    Tạo trigger (idempotent) và dựng lại bảng tổng hợp nào lệch tổng số dòng với bảng
+    nguồn (lần đầu triển khai, hoặc CSDL bị sửa khi chưa có trigger).
+    Gọi sau Base.metadata.create_all() lúc khởi động.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name, ddl in _triggers().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+        for spec in ROLLUPS:
+            if not _is_consistent(conn, spec):
+                logger.info(f"[report] Rebuilding rollup table {spec.table}")
+                rebuild_rollup(conn, spec)
+
+
+if __name__ == "__main__":
+    from app.core.database import engine as app_engine
+    from app import models  # noqa: F401  (đăng ký bảng cho create_all)
+    from app.core.database import Base
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=app_engine)
+    ensure_report_rollups(app_engine)
+    with app_engine.begin() as connection:
+        rebuild_rollups(connection)
+    logger.info("[report] Rollup tables rebuilt.")
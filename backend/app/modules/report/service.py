@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import Integer, and_, case, cast, func, desc
+from contextlib import contextmanager
 from datetime import datetime, timedelta, date as date_type
 from typing import List, Optional, Dict, Any
 import logging
@@ -7,72 +8,137 @@ import pytz
 
 from app import models, schemas
 from app.core import config
+from app.modules.report.cache import REPORT_VERSION, cached_report, current_version, uncached
 
 logger = logging.getLogger(__name__)
 
 # Constants
 SECURITY_EVENT_STATUS = "security_event"
 
+
+def _add_months(month_start: date_type, months: int) -> date_type:
+    """Cộng/trừ số tháng cho một ngày đầu tháng (ngày 1)."""
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return date_type(index // 12, index % 12 + 1, 1)
+
+
+def _local_day(value) -> date_type:
+    """datetime có múi giờ (vd. ISO UTC từ frontend) -> ngày theo TZ địa phương."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.timezone(config.settings.TZ))
+        return value.date()
+    return value
+
+
+def check_day_bounds(start: datetime | None, end: datetime | None) -> None:
+    """
+    Báo cáo trên bảng tổng hợp theo ngày chỉ lọc được trọn ngày: start phải là 00:00 và
+    end là 23:59:59 (giây lẻ tùy ý) theo giờ địa phương (settings.TZ; datetime không
+    có múi giờ coi là giờ địa phương). Mốc lệch giờ bị từ chối (ValueError) thay vì âm
+    thầm làm tròn thành cả ngày.
+    """
+    tz = pytz.timezone(config.settings.TZ)
+
+    def local_time(value: datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(tz)
+        return value.time()
+
+    if start is not None and local_time(start) != datetime.min.time():
+        raise ValueError(f"start phải là đầu ngày (00:00:00, giờ {config.settings.TZ}); báo cáo chỉ lọc theo trọn ngày.")
+    if end is not None and local_time(end).replace(microsecond=0) != datetime.max.time().replace(microsecond=0):
+        raise ValueError(f"end phải là cuối ngày (23:59:59, giờ {config.settings.TZ}); báo cáo chỉ lọc theo trọn ngày.")
+
+
+@contextmanager
+def _read_snapshot(db: Session):
+    """
+    Mở một transaction đọc (SQLite: BEGIN) để mọi widget của dashboard cùng thấy một
+    trạng thái CSDL, kể cả version dùng để kiểm tra cache. Kết thúc bằng rollback.
+    """
+    conn = db.connection()
+    started = False
+    if conn.dialect.name == "sqlite" and not conn.connection.dbapi_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+        started = True
+    db.info[REPORT_VERSION] = current_version(db)
+    try:
+        yield
+    finally:
+        db.info.pop(REPORT_VERSION, None)
+        if started:
+            db.rollback()
+
+
 class ReportService:
     @staticmethod
-    def apply_time_filters(query, model, start: datetime | None, end: datetime | None):
+    def apply_day_filters(query, day_column, start: datetime | None, end: datetime | None):
         """
-        Áp dụng bộ lọc thời gian cho một câu truy vấn SQLAlchemy.
-        Sử dụng cột 'check_in_time' cho Guest model.
+        Lọc bảng tổng hợp theo ngày (cột `day`). start/end được đổi sang ngày địa phương;
+        router đã bảo đảm chúng là trọn ngày (check_day_bounds) nên kết quả khớp lọc theo giờ.
         """
-        time_column = model.check_in_time
         if start:
-            query = query.filter(time_column >= start)
+            query = query.filter(day_column >= _local_day(start))
         if end:
-            query = query.filter(time_column <= end)
+            query = query.filter(day_column <= _local_day(end))
         return query
 
+    @cached_report("guests_daily")
     def guests_daily(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, List]:
         try:
-            query = db.query(func.date(models.Guest.check_in_time), func.count(models.Guest.id))\
-                      .filter(models.Guest.status == "checked_in")
+            rollup = models.GuestCheckinRollup
+            query = db.query(rollup.day, func.sum(rollup.count))\
+                      .filter(rollup.status == "checked_in")
             
-            query = self.apply_time_filters(query, models.Guest, start, end)
-            data = query.group_by(func.date(models.Guest.check_in_time)).order_by(func.date(models.Guest.check_in_time)).all()
+            query = self.apply_day_filters(query, rollup.day, start, end)
+            data = query.group_by(rollup.day).order_by(rollup.day).all()
             return {"labels": [str(d or "") for d, _ in data], "series": [c for _, c in data]}
         except Exception as e:
             logger.error(f"Error in guests_daily: {e}", exc_info=True)
-            return {"labels": [], "series": []}
+            return uncached({"labels": [], "series": []})
 
+    @cached_report("guests_by_user")
     def guests_by_user(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, List]:
         try:
-            query = db.query(models.User.full_name, func.count(models.Guest.id))\
-                      .join(models.User, models.Guest.registered_by_user_id == models.User.id)\
-                      .filter(models.Guest.status == "checked_in")
+            rollup = models.GuestCheckinRollup
+            query = db.query(models.User.full_name, func.sum(rollup.count))\
+                      .join(models.User, rollup.registered_by_user_id == models.User.id)\
+                      .filter(rollup.status == "checked_in")
 
-            query = self.apply_time_filters(query, models.Guest, start, end)
+            query = self.apply_day_filters(query, rollup.day, start, end)
             data = query.group_by(models.User.full_name).all()
             return {"labels": [str(d or "") for d, _ in data], "series": [c for _, c in data]}
         except Exception as e:
             logger.error(f"Error in guests_by_user: {e}", exc_info=True)
-            return {"labels": [], "series": []}
+            return uncached({"labels": [], "series": []})
 
+    @cached_report("guests_by_supplier")
     def guests_by_supplier(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, List]:
         try:
-            query = db.query(models.Guest.supplier_name, func.count(models.Guest.id))\
-                      .filter(models.Guest.status == "checked_in", models.Guest.supplier_name != "")
+            rollup = models.GuestCheckinRollup
+            query = db.query(rollup.supplier_name, func.sum(rollup.count))\
+                      .filter(rollup.status == "checked_in", rollup.supplier_name != "")
             
-            query = self.apply_time_filters(query, models.Guest, start, end)
-            data = query.group_by(models.Guest.supplier_name).all()
+            query = self.apply_day_filters(query, rollup.day, start, end)
+            data = query.group_by(rollup.supplier_name).all()
             return {"labels": [str(d or "") for d, _ in data], "series": [c for _, c in data]}
         except Exception as e:
             logger.error(f"Error in guests_by_supplier: {e}", exc_info=True)
-            return {"labels": [], "series": []}
+            return uncached({"labels": [], "series": []})
 
+    @cached_report("guests_by_plate")
     def guests_by_plate(self, db: Session, start: datetime | None = None, end: datetime | None = None, limit: int = 10) -> Dict[str, List]:
         try:
-            query = db.query(models.Guest.license_plate, func.count(models.Guest.id))\
-                      .filter(models.Guest.status == "checked_in", models.Guest.license_plate != "", models.Guest.license_plate != None)
+            rollup = models.GuestPlateRollup
+            total = func.sum(rollup.count)
+            query = db.query(rollup.license_plate, total)\
+                      .filter(rollup.status == "checked_in")
             
-            query = self.apply_time_filters(query, models.Guest, start, end)
+            query = self.apply_day_filters(query, rollup.day, start, end)
             
-            data = query.group_by(models.Guest.license_plate)\
-                       .order_by(desc(func.count(models.Guest.id)))\
+            data = query.group_by(rollup.license_plate)\
+                       .order_by(desc(total))\
                        .limit(limit)\
                        .all()
             
@@ -82,24 +148,22 @@ class ReportService:
             return {"labels": [str(d or "") for d, _ in data], "series": [c for _, c in data]}
         except Exception as e:
             logger.error(f"Error in guests_by_plate: {e}", exc_info=True)
-            return {"labels": [], "series": []}
+            return uncached({"labels": [], "series": []})
 
+    @cached_report("assets_by_status")
     def assets_by_status(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, List]:
         try:
+            rollup = models.AssetDailyRollup
             query = db.query(
-                models.AssetLog.status,
-                func.count(models.AssetLog.id).label('count')
+                rollup.status,
+                func.sum(rollup.count).label('count')
             ).filter(
-                models.AssetLog.status != SECURITY_EVENT_STATUS
+                rollup.status != SECURITY_EVENT_STATUS
             )
             
-            if start:
-                query = query.filter(models.AssetLog.created_at >= start)
-            
-            if end:
-                query = query.filter(models.AssetLog.created_at <= end)
+            query = self.apply_day_filters(query, rollup.day, start, end)
             
-            results = query.group_by(models.AssetLog.status).all()
+            results = query.group_by(rollup.status).all()
             
             status_labels = {
                 'pending_out': 'Chờ ra cổng',
@@ -121,16 +185,18 @@ class ReportService:
             }
         except Exception as e:
             logger.error(f"Error in assets_by_status: {e}", exc_info=True)
-            return {"labels": [], "series": []}
+            return uncached({"labels": [], "series": []})
 
+    @cached_report("assets_daily")
     def assets_daily(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> Dict[str, List]:
         try:
+            out_rollup = models.AssetDailyRollup
+            in_rollup = models.AssetReturnRollup
             if start and end:
-                start_date = start.date() if hasattr(start, 'date') else start
-                end_date = end.date() if hasattr(end, 'date') else end
+                start_date = _local_day(start)
+                end_date = _local_day(end)
             else:
-                earliest = db.query(func.min(models.AssetLog.created_at)).scalar()
-                latest = db.query(func.max(models.AssetLog.created_at)).scalar()
+                earliest, latest = db.query(func.min(out_rollup.day), func.max(out_rollup.day)).one()
                 if not earliest or not latest:
                     return {
                         "labels": [],
@@ -138,39 +204,26 @@ class ReportService:
                         "in_series": [],
                         "cumulative_series": []
                     }
-                start_date = earliest.date()
-                end_date = latest.date()
+                start_date = earliest
+                end_date = latest
             
             query_out = db.query(
-                func.date(models.AssetLog.created_at).label('date'),
-                func.count(models.AssetLog.id).label('count')
+                out_rollup.day,
+                func.sum(out_rollup.count)
             ).filter(
-                models.AssetLog.status.in_(['pending_out', 'checked_out'])
+                out_rollup.status.in_(['pending_out', 'checked_out'])
             )
-            
-            if start:
-                query_out = query_out.filter(models.AssetLog.created_at >= start)
-            if end:
-                query_out = query_out.filter(models.AssetLog.created_at <= end)
-            
-            out_data = query_out.group_by(func.date(models.AssetLog.created_at)).all()
-            out_dict = {str(date): count for date, count in out_data}
+            query_out = self.apply_day_filters(query_out, out_rollup.day, start, end)
+            out_dict = {str(day): count for day, count in query_out.group_by(out_rollup.day).all()}
             
             query_in = db.query(
-                func.date(models.AssetLog.check_in_back_time).label('date'),
-                func.count(models.AssetLog.id).label('count')
+                in_rollup.day,
+                func.sum(in_rollup.count)
             ).filter(
-                models.AssetLog.status == 'returned',
-                models.AssetLog.check_in_back_time != None
+                in_rollup.status == 'returned'
             )
-            
-            if start:
-                query_in = query_in.filter(models.AssetLog.check_in_back_time >= start)
-            if end:
-                query_in = query_in.filter(models.AssetLog.check_in_back_time <= end)
-            
-            in_data = query_in.group_by(func.date(models.AssetLog.check_in_back_time)).all()
-            in_dict = {str(date): count for date, count in in_data}
+            query_in = self.apply_day_filters(query_in, in_rollup.day, start, end)
+            in_dict = {str(day): count for day, count in query_in.group_by(in_rollup.day).all()}
             
             labels = []
             out_series = []
@@ -198,103 +251,83 @@ class ReportService:
             }
         except Exception as e:
             logger.error(f"Error in assets_daily: {e}", exc_info=True)
-            return {
+            return uncached({
                 "labels": [],
                 "out_series": [],
                 "in_series": [],
                 "cumulative_series": []
-            }
+            })
 
+    @cached_report("visitor_security_index")
     def visitor_security_index(self, db: Session, start_date: datetime | None = None, end_date: datetime | None = None, supplier_name: str | None = None) -> schemas.VisitorStatsResponse:
+        """
+        3 truy vấn gộp trên bảng tổng hợp report_guest_daily thay cho ~45 câu COUNT:
+          1) số khách theo ngày trong 12 tháng lịch gần nhất -> cộng dồn thành theo
+             tháng, 30 ngày gần nhất, tháng này / tháng trước;
+          2) trạng thái khách trong tháng này; 3) top 5 nhà cung cấp.
+        Mốc tháng theo lịch (ngày 1), không còn `now - 30*i ngày`.
+        """
         try:
             tz = pytz.timezone(config.settings.TZ)
-            now = datetime.now(tz)
-            
-            current_month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            last_month_end = current_month_start - timedelta(days=1)
-            last_month_start = last_month_end.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            
-            query_current = db.query(func.count(models.Guest.id)).filter(
-                models.Guest.created_at >= current_month_start
-            )
-            if supplier_name:
-                query_current = query_current.filter(models.Guest.supplier_name == supplier_name)
-            total_current = query_current.scalar() or 0
-            
-            query_last = db.query(func.count(models.Guest.id)).filter(
-                models.Guest.created_at >= last_month_start,
-                models.Guest.created_at < current_month_start
-            )
+            today = datetime.now(tz).date()
+
+            current_month_start = today.replace(day=1)
+            last_month_start = _add_months(current_month_start, -1)
+            months = [_add_months(current_month_start, -i) for i in range(11, -1, -1)]
+            days = [today - timedelta(days=i) for i in range(29, -1, -1)]
+            window_start = min(months[0], days[0])
+
+            rollup = models.GuestDailyRollup
+            daily_query = db.query(rollup.day, func.sum(rollup.count)).filter(rollup.day >= window_start)
             if supplier_name:
-                query_last = query_last.filter(models.Guest.supplier_name == supplier_name)
-            total_last = query_last.scalar() or 0
-            
+                daily_query = daily_query.filter(rollup.supplier_name == supplier_name)
+            per_day = {day: count for day, count in daily_query.group_by(rollup.day).all()}
+
+            month_key = lambda d: d.strftime("%Y-%m")
+            per_month: Dict[str, int] = {}
+            for day, count in per_day.items():
+                per_month[month_key(day)] = per_month.get(month_key(day), 0) + count
+
+            total_current = per_month.get(month_key(current_month_start), 0)
+            total_last = per_month.get(month_key(last_month_start), 0)
             growth_pct = ((total_current - total_last) / total_last * 100) if total_last > 0 else 0.0
-            
-            monthly_data = []
-            for i in range(11, -1, -1):
-                month_date = now - timedelta(days=30*i)
-                month_str = month_date.strftime("%Y-%m")
-                month_start = month_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                if i == 0:
-                    month_end = now
-                else:
-                    next_month = month_start + timedelta(days=32)
-                    month_end = next_month.replace(day=1) - timedelta(seconds=1)
-                
-                count_query = db.query(func.count(models.Guest.id)).filter(
-                    models.Guest.created_at >= month_start,
-                    models.Guest.created_at <= month_end
-                )    
-                if supplier_name:
-                    count_query = count_query.filter(models.Guest.supplier_name == supplier_name)
-                count = count_query.scalar() or 0
-                monthly_data.append(schemas.MonthlyDataPoint(month=month_str, count=count))
-            
-            daily_trend = []
-            for i in range(29, -1, -1):
-                day = now - timedelta(days=i)
-                day_str = day.strftime("%Y-%m-%d")
-                day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
-                day_end = day.replace(hour=23, minute=59, second=59, microsecond=999999)
-                
-                count_query = db.query(func.count(models.Guest.id)).filter(
-                    models.Guest.created_at >= day_start,
-                    models.Guest.created_at <= day_end
-                )
-                if supplier_name:
-                    count_query = count_query.filter(models.Guest.supplier_name == supplier_name)
-                count = count_query.scalar() or 0
-                daily_trend.append(schemas.DailyTrendPoint(date=day_str, count=count))
-            
+
+            monthly_data = [
+                schemas.MonthlyDataPoint(month=month_key(m), count=per_month.get(month_key(m), 0))
+                for m in months
+            ]
+            daily_trend = [
+                schemas.DailyTrendPoint(date=d.isoformat(), count=per_day.get(d, 0))
+                for d in days
+            ]
+
+            supplier_total = func.sum(rollup.count)
             top_suppliers_query = db.query(
-                models.Guest.supplier_name,
-                func.count(models.Guest.id).label('count')
+                rollup.supplier_name,
+                supplier_total.label('count')
             ).filter(
-                models.Guest.supplier_name != '',
-                models.Guest.supplier_name != None
-            ).group_by(models.Guest.supplier_name).order_by(desc(func.count(models.Guest.id))).limit(5)
-            
+                rollup.supplier_name != ''
+            ).group_by(rollup.supplier_name).order_by(desc(supplier_total)).limit(5)
+
             top_suppliers = [
                 schemas.SupplierStat(supplier_name=name, count=count)
                 for name, count in top_suppliers_query.all()
             ]
-            
+
             status_counts = db.query(
-                models.Guest.status,
-                func.count(models.Guest.id)
+                rollup.status,
+                func.sum(rollup.count)
             ).filter(
-                models.Guest.created_at >= current_month_start
-            ).group_by(models.Guest.status).all()
-            
+                rollup.day >= current_month_start
+            ).group_by(rollup.status).all()
+
             status_dict = {status: count for status, count in status_counts}
             status_breakdown = schemas.StatusBreakdown(
                 pending=status_dict.get('pending', 0),
                 checked_in=status_dict.get('checked_in', 0),
                 checked_out=status_dict.get('checked_out', 0)
             )
-            
+
             return schemas.VisitorStatsResponse(
                 total_guests_current_month=total_current,
                 total_guests_last_month=total_last,
@@ -308,112 +341,116 @@ class ReportService:
             logger.error(f"Error in visitor_security_index: {e}", exc_info=True)
             raise e
 
+    @cached_report("asset_control")
     def asset_control(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> schemas.AssetControlResponse:
         try:
             tz = pytz.timezone(config.settings.TZ)
             today = datetime.now(tz).date()
             
-            base_query = db.query(models.AssetLog).filter(
-                models.AssetLog.status != SECURITY_EVENT_STATUS
+            asset = models.AssetLog
+            # Số ngày quá hạn và mức rủi ro tính trong SQL (julianday), không lặp từng dòng
+            days_overdue = cast(func.julianday(today.isoformat()) - func.julianday(asset.expected_return_date), Integer)
+            risk_level = case((days_overdue > 7, "HIGH"), (days_overdue >= 3, "MEDIUM"), else_="LOW")
+            is_overdue = and_(
+                asset.expected_return_date != None,
+                asset.expected_return_date < today,
+                asset.status != 'returned',
+                models.User.id != None,
             )
-            if start:
-                base_query = base_query.filter(models.AssetLog.created_at >= start)
-            if end:
-                base_query = base_query.filter(models.AssetLog.created_at <= end)
-            
-            total_out = base_query.filter(
-                models.AssetLog.status.in_(['pending_out', 'checked_out']),
-                models.AssetLog.estimated_datetime != None 
-            ).count() or 0
-            
-            total_returned = base_query.filter(
-                models.AssetLog.status == 'returned'
-            ).count() or 0
-            
+            is_out = and_(asset.status.in_(['pending_out', 'checked_out']), asset.estimated_datetime != None)
+
+            def count_if(condition):
+                return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+            def apply_filters(query):
+                query = query.filter(asset.status != SECURITY_EVENT_STATUS)
+                if start:
+                    query = query.filter(asset.created_at >= start)
+                if end:
+                    query = query.filter(asset.created_at <= end)
+                return query
+
+            # 1) Toàn bộ số đếm (ra / đã trả / quá hạn / rủi ro cao) trong một câu truy vấn
+            totals_query = db.query(
+                count_if(is_out),
+                count_if(asset.status == 'returned'),
+                count_if(is_overdue),
+                count_if(and_(is_overdue, days_overdue > 7)),
+            ).select_from(asset).outerjoin(models.User, asset.registered_by_user_id == models.User.id)
+            total_out, total_returned, overdue_count, high_risk_count = apply_filters(totals_query).one()
+
             total_all = total_out + total_returned
             return_rate = (total_returned / total_all * 100) if total_all > 0 else 0.0
-            
-            overdue_query = base_query.join(
-                models.User, models.AssetLog.registered_by_user_id == models.User.id
-            ).filter(
-                models.AssetLog.expected_return_date != None,
-                models.AssetLog.expected_return_date < today,
-                models.AssetLog.status != 'returned'
-            ).order_by(models.AssetLog.expected_return_date.asc())
-            
-            overdue_assets = []
-            high_risk_count = 0
-            
-            for asset in overdue_query.all():
-                try:
-                    days_overdue = (today - asset.expected_return_date).days
-                    
-                    if days_overdue > 7:
-                        risk_level = "HIGH"
-                        high_risk_count += 1
-                    elif days_overdue >= 3:
-                        risk_level = "MEDIUM"
-                    else:
-                        risk_level = "LOW"
-                    
-                    overdue_assets.append(schemas.OverdueAssetDetail(
-                        id=asset.id,
-                        asset_description=asset.asset_description or "N/A",
-                        employee_name=asset.registered_by.full_name if asset.registered_by else "Unknown",
-                        employee_code=asset.registered_by.username if asset.registered_by else "N/A",
-                        expected_return_date=asset.expected_return_date,
-                        days_overdue=days_overdue,
-                        risk_level=risk_level
-                    ))
-                except Exception as e:
-                    logger.error(f"Error processing asset {asset.id}: {e}")
-                    continue
-            
+
+            # 2) Danh sách quá hạn kèm tên / mã người đăng ký (JOIN, không lazy-load từng dòng)
+            overdue_query = db.query(
+                asset.id,
+                asset.asset_description,
+                models.User.full_name,
+                models.User.username,
+                asset.expected_return_date,
+                days_overdue,
+                risk_level,
+            ).join(
+                models.User, asset.registered_by_user_id == models.User.id
+            ).filter(is_overdue).order_by(asset.expected_return_date.asc())
+
+            overdue_assets = [
+                schemas.OverdueAssetDetail(
+                    id=asset_id,
+                    asset_description=description or "N/A",
+                    employee_name=full_name or "Unknown",
+                    employee_code=username or "N/A",
+                    expected_return_date=expected_return_date,
+                    days_overdue=days,
+                    risk_level=risk,
+                )
+                for asset_id, description, full_name, username, expected_return_date, days, risk
+                in apply_filters(overdue_query).all()
+            ]
+
             return schemas.AssetControlResponse(
                 total_assets_out=total_out,
                 total_assets_returned=total_returned,
                 return_rate_percentage=round(return_rate, 2),
                 overdue_assets=overdue_assets,
-                overdue_count=len(overdue_assets),
+                overdue_count=overdue_count,
                 high_risk_count=high_risk_count
             )
         except Exception as e:
             logger.error(f"Error in asset_control: {e}", exc_info=True)
             raise e
 
+    @cached_report("system_overview")
     def system_overview(self, db: Session, start: datetime | None = None, end: datetime | None = None) -> schemas.SystemOverviewResponse:
         try:
             tz = pytz.timezone(config.settings.TZ)
-            now = datetime.now(tz)
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            today = datetime.now(tz).date()
+            guest_rollup = models.GuestDailyRollup
+            checkin_rollup = models.GuestCheckinRollup
+            asset_rollup = models.AssetDailyRollup
             
             total_users = db.query(func.count(models.User.id)).scalar() or 0
             
-            guest_query = db.query(func.count(models.Guest.id))
-            if start:
-                guest_query = guest_query.filter(models.Guest.created_at >= start)
-            if end:
-                guest_query = guest_query.filter(models.Guest.created_at <= end)
+            guest_query = db.query(func.sum(guest_rollup.count))
+            guest_query = self.apply_day_filters(guest_query, guest_rollup.day, start, end)
             total_guests = guest_query.scalar() or 0
             
-            asset_query = db.query(func.count(models.AssetLog.id)).filter(
-                models.AssetLog.status != SECURITY_EVENT_STATUS
+            asset_query = db.query(func.sum(asset_rollup.count)).filter(
+                asset_rollup.status != SECURITY_EVENT_STATUS
             )
-            if start:
-                asset_query = asset_query.filter(models.AssetLog.created_at >= start)
-            if end:
-                asset_query = asset_query.filter(models.AssetLog.created_at <= end)
+            asset_query = self.apply_day_filters(asset_query, asset_rollup.day, start, end)
             total_assets = asset_query.scalar() or 0
             
-            active_guests_today = db.query(func.count(models.Guest.id)).filter(
-                models.Guest.check_in_time >= today_start,
-                models.Guest.status == 'checked_in'
+            active_guests_today = db.query(func.sum(checkin_rollup.count)).filter(
+                checkin_rollup.day >= today,
+                checkin_rollup.status == 'checked_in'
             ).scalar() or 0
             
-            active_assets_today = db.query(func.count(models.AssetLog.id)).filter(
-                models.AssetLog.created_at >= today_start,
-                models.AssetLog.status != 'returned',
-                models.AssetLog.status != SECURITY_EVENT_STATUS
+            active_assets_today = db.query(func.sum(asset_rollup.count)).filter(
+                asset_rollup.day >= today,
+                asset_rollup.status != 'returned',
+                asset_rollup.status != SECURITY_EVENT_STATUS
             ).scalar() or 0
             
             return schemas.SystemOverviewResponse(
@@ -428,37 +465,47 @@ class ReportService:
             logger.error(f"Error in system_overview: {e}", exc_info=True)
             raise e
 
+    @cached_report("user_activity")
     def user_activity(self, db: Session, start_date: datetime | None = None, end_date: datetime | None = None) -> schemas.UserActivityResponse:
         try:
-            users = db.query(models.User).all()
-            
+            # Đếm theo người đăng ký bằng 2 subquery GROUP BY (trên bảng tổng hợp) rồi
+            # LEFT JOIN vào users: một câu truy vấn cho toàn bộ người dùng
+            guest_rollup = models.GuestDailyRollup
+            guests_query = db.query(
+                guest_rollup.registered_by_user_id.label("user_id"),
+                func.sum(guest_rollup.count).label("count")
+            )
+            guests_query = self.apply_day_filters(guests_query, guest_rollup.day, start_date, end_date)
+            guests_sub = guests_query.group_by(guest_rollup.registered_by_user_id).subquery()
+
+            asset_rollup = models.AssetDailyRollup
+            assets_query = db.query(
+                asset_rollup.registered_by_user_id.label("user_id"),
+                func.sum(asset_rollup.count).label("count")
+            ).filter(asset_rollup.status != SECURITY_EVENT_STATUS)
+            assets_query = self.apply_day_filters(assets_query, asset_rollup.day, start_date, end_date)
+            assets_sub = assets_query.group_by(asset_rollup.registered_by_user_id).subquery()
+
+            rows = db.query(
+                models.User.id,
+                models.User.full_name,
+                models.User.role,
+                func.coalesce(guests_sub.c.count, 0),
+                func.coalesce(assets_sub.c.count, 0),
+            ).outerjoin(
+                guests_sub, guests_sub.c.user_id == models.User.id
+            ).outerjoin(
+                assets_sub, assets_sub.c.user_id == models.User.id
+            ).order_by(models.User.id).all()
+
             user_stats = []
-            for user in users:
-                guests_query = db.query(func.count(models.Guest.id)).filter(
-                    models.Guest.registered_by_user_id == user.id
-                )
-                if start_date:
-                    guests_query = guests_query.filter(models.Guest.created_at >= start_date)
-                if end_date:
-                    guests_query = guests_query.filter(models.Guest.created_at <= end_date)
-                guests_count = guests_query.scalar() or 0
-                
-                assets_query = db.query(func.count(models.AssetLog.id)).filter(
-                    models.AssetLog.registered_by_user_id == user.id,
-                    models.AssetLog.status != SECURITY_EVENT_STATUS
-                )
-                if start_date:
-                    assets_query = assets_query.filter(models.AssetLog.created_at >= start_date)
-                if end_date:
-                    assets_query = assets_query.filter(models.AssetLog.created_at <= end_date)
-                assets_count = assets_query.scalar() or 0
-                
+            for user_id, full_name, role, guests_count, assets_count in rows:
                 performance_score = (guests_count * 1.0) + (assets_count * 1.5)
                 
                 user_stats.append(schemas.UserActivityStat(
-                    user_id=user.id,
-                    full_name=user.full_name,
-                    department=user.role, 
+                    user_id=user_id,
+                    full_name=full_name,
+                    department=role, 
                     guests_registered=guests_count,
                     assets_registered=assets_count,
                     performance_score=round(performance_score, 2)
@@ -471,4 +518,67 @@ class ReportService:
             logger.error(f"Error in user_activity: {e}", exc_info=True)
             raise e
 
+    @cached_report("supplier_activity")
+    def supplier_activity(self, db: Session, start: datetime | None = None, end: datetime | None = None, limit: int = 10) -> Dict[str, Any]:
+        """Top nhà cung cấp theo số khách đăng ký (ngày tạo)."""
+        rollup = models.GuestDailyRollup
+        total = func.sum(rollup.count)
+        query = db.query(rollup.supplier_name, total).filter(rollup.supplier_name != "")
+        query = self.apply_day_filters(query, rollup.day, start, end)
+        results = query.group_by(rollup.supplier_name).order_by(desc(total)).limit(limit).all()
+        return {
+            "labels": [name for name, _ in results],
+            "series": [count for _, count in results],
+            "total_suppliers": len(results),
+        }
+
+    @cached_report("supplier_no_show")
+    def supplier_no_show(self, db: Session, start: datetime | None = None, end: datetime | None = None, limit: int = 10) -> Dict[str, Any]:
+        """Top nhà cung cấp có khách no-show (đăng ký nhưng không tới)."""
+        rollup = models.GuestDailyRollup
+        total = func.sum(rollup.count)
+        query = db.query(rollup.supplier_name, total)\
+                  .filter(rollup.supplier_name != "", rollup.status == "no_show")
+        query = self.apply_day_filters(query, rollup.day, start, end)
+        results = query.group_by(rollup.supplier_name).order_by(desc(total)).limit(limit).all()
+        data = [{"supplier_name": name, "no_show_count": count} for name, count in results]
+        return {"data": data, "total": len(data)}
+
+    def dashboard(self, db: Session, widgets: List[str], start: datetime | None = None, end: datetime | None = None) -> Dict[str, Any]:
+        """
+        Tính nhiều widget dashboard trong một request, cùng khoảng thời gian và cùng một
+        snapshot CSDL. Widget lỗi được trả trong "errors" thay vì làm hỏng cả response.
+        """
+        unknown = [w for w in widgets if w not in DASHBOARD_WIDGETS]
+        if unknown:
+            raise ValueError(f"Widget không hợp lệ: {', '.join(unknown)}")
+
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        with _read_snapshot(db):
+            for widget in dict.fromkeys(widgets):
+                try:
+                    results[widget] = DASHBOARD_WIDGETS[widget](self, db, start, end)
+                except Exception as e:
+                    logger.error(f"Error in dashboard widget {widget}: {e}", exc_info=True)
+                    errors[widget] = str(e)
+        return {"widgets": results, "errors": errors}
+
+
+# Widget id (dùng trong /reports/dashboard) -> báo cáo tương ứng
+DASHBOARD_WIDGETS = {
+    "guests_daily": lambda svc, db, start, end: svc.guests_daily(db, start, end),
+    "guests_by_user": lambda svc, db, start, end: svc.guests_by_user(db, start, end),
+    "guests_by_supplier": lambda svc, db, start, end: svc.guests_by_supplier(db, start, end),
+    "guests_by_plate": lambda svc, db, start, end: svc.guests_by_plate(db, start, end),
+    "assets_by_status": lambda svc, db, start, end: svc.assets_by_status(db, start, end),
+    "assets_daily": lambda svc, db, start, end: svc.assets_daily(db, start, end),
+    "system_overview": lambda svc, db, start, end: svc.system_overview(db, start, end),
+    "asset_control": lambda svc, db, start, end: svc.asset_control(db, start, end),
+    "visitor_security_index": lambda svc, db, start, end: svc.visitor_security_index(db),
+    "user_activity": lambda svc, db, start, end: svc.user_activity(db, start, end),
+    "supplier_activity": lambda svc, db, start, end: svc.supplier_activity(db, start, end),
+    "supplier_no_show": lambda svc, db, start, end: svc.supplier_no_show(db, start, end),
+}
+
 report_service = ReportService()
@@ -11,6 +11,9 @@ from typing import List, Tuple
 from app import models
 from app.core import config
 from app.modules.security_event import schema as schemas
+from app.services.image_derivatives import image_derivatives, remove_derivatives
+from app.modules.blob.service import blob_service
+from app.services.upload_service import StagedUpload
 
 logger = logging.getLogger(__name__)
 
@@ -160,17 +163,14 @@ class SecurityEventService:
             return False
         
         for image in event.images:
-            try:
-                if os.path.exists(image.image_path):
-                    os.remove(image.image_path)
-            except:
-                pass
+            blob_service.remove_legacy_file(image.image_path)
+            remove_derivatives(image)
         
         db.delete(event)
         db.commit()
         return True
 
-    def upload_image(self, db: Session, event_id: int, file_filename: str, file_file) -> dict:
+    def upload_image(self, db: Session, event_id: int, upload: StagedUpload) -> dict:
         event = db.query(models.AssetLog)\
             .filter(
                 models.AssetLog.id == event_id,
@@ -185,22 +185,11 @@ class SecurityEventService:
         if current_count >= MAX_IMAGES:
             raise ValueError(f"Limit reached: {MAX_IMAGES} images")
         
-        upload_dir = os.path.join(config.settings.UPLOAD_DIR, "security_events", str(event_id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = uuid.uuid4().hex[:6]
-        ext = os.path.splitext(file_filename)[1] if file_filename else '.jpg'
-        filename = f"event_{event_id}_{timestamp}_{unique_id}{ext}"
-        file_path = os.path.join(upload_dir, filename)
-        
         try:
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file_file, buffer)
-        except Exception as e:
+            relative_path = blob_service.put_staged(db, upload)
+        except OSError as e:
             raise RuntimeError(f"Error saving file: {str(e)}")
         
-        relative_path = os.path.join("security_events", str(event_id), filename).replace("\\", "/")
         new_image = models.AssetImage(
             asset_id=event_id,
             image_path=relative_path
@@ -208,6 +197,7 @@ class SecurityEventService:
         db.add(new_image)
         db.commit()
         db.refresh(new_image)
+        image_derivatives.submit(models.AssetImage, new_image.id, new_image.image_path)
         
         return {
             "id": new_image.id,
@@ -227,13 +217,8 @@ class SecurityEventService:
         if not image:
             return False
         
-        try:
-            full_path = os.path.join(config.settings.UPLOAD_DIR, image.image_path) 
-            if os.path.exists(full_path):
-                os.remove(full_path)
-            # Try removing from legacy path or just rely on image_path being relative to UPLOAD_DIR
-        except:
-            pass
+        blob_service.remove_legacy_file(image.image_path)
+        remove_derivatives(image)
         
         db.delete(image)
         db.commit()
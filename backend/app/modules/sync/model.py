@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+from app.core.database import Base
+
+class SyncState(Base):
+    """Bộ đếm phiên bản thay đổi (một dòng 'global'), tăng bởi trigger SQLite."""
+    __tablename__ = "sync_state"
+    name = Column(String(32), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class SyncTombstone(Base):
+    """Dấu vết bản ghi đã xóa để client delta-sync biết cần gỡ khỏi cache."""
+    __tablename__ = "sync_tombstones"
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String(32), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
+    # Ghi bởi trigger nên dùng giá trị mặc định phía SQLite (UTC)
+    deleted_at = Column(DateTime, server_default=func.current_timestamp())
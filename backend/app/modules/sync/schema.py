@@ -0,0 +1,26 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List
+from app.modules.guest.schema import GuestReadWithUser
+from app.modules.asset.schema import AssetLogDisplay
+
+class GuestImageSyncRead(BaseModel):
+    id: int
+    guest_id: int
+    image_path: str
+    thumb_path: str | None = None
+    preview_path: str | None = None
+    model_config = ConfigDict(from_attributes=True)
+
+class SyncDeleted(BaseModel):
+    guests: List[int] = []
+    guest_images: List[int] = []
+    asset_logs: List[int] = []
+
+class SyncChanges(BaseModel):
+    version: int
+    # True: client phải thay toàn bộ cache (since=0 hoặc tombstone đã bị dọn)
+    reset: bool = False
+    guests: List[GuestReadWithUser] = []
+    guest_images: List[GuestImageSyncRead] = []
+    asset_logs: List[AssetLogDisplay] = []
+    deleted: SyncDeleted = SyncDeleted()
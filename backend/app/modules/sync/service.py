@@ -0,0 +1,124 @@
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func
+from datetime import datetime, timedelta
+import logging
+
+from app import models
+from app.modules.sync.model import SyncState, SyncTombstone
+from app.modules.sync.tracking import GLOBAL, PRUNED
+from app.modules.sync import schema as schemas
+from app.modules.guest import schema as guest_schemas
+
+logger = logging.getLogger(__name__)
+
+ASSET_SYNC_ROLES = ("admin", "guard")
+
+class SyncService:
+    @staticmethod
+    def _get_version(db: Session, name: str) -> int:
+        state = db.query(SyncState).get(name)
+        return state.version if state else 0
+
+    @staticmethod
+    def get_changes(db: Session, user: models.User, since: int) -> schemas.SyncChanges:
+        """
+        Trả về các dòng guests / guest_images / asset_log thay đổi trong (since, version]
+        cùng tombstone của các dòng đã xóa. since=0 (hoặc cũ hơn mốc tombstone đã dọn)
+        trả về toàn bộ dữ liệu với reset=True.
+        """
+        version = SyncService._get_version(db, GLOBAL)
+        reset = since <= 0 or since < SyncService._get_version(db, PRUNED)
+        low = 0 if reset else since
+
+        # --- Guests (kèm tên người đăng ký + ảnh) ---
+        guest_query = db.query(
+            models.Guest,
+            models.User.full_name.label("registered_by_name")
+        ).join(
+            models.User, models.Guest.registered_by_user_id == models.User.id
+        ).options(selectinload(models.Guest.images)).filter(
+            models.Guest.row_version > low,
+            models.Guest.row_version <= version
+        )
+        if user.role == "staff":
+            guest_query = guest_query.filter(models.Guest.registered_by_user_id == user.id)
+        guests = [
+            guest_schemas.GuestReadWithUser.model_validate(guest).model_copy(
+                update={"registered_by_name": registered_by_name}
+            )
+            for guest, registered_by_name in guest_query.all()
+        ]
+
+        image_query = db.query(models.GuestImage).filter(
+            models.GuestImage.row_version > low,
+            models.GuestImage.row_version <= version
+        )
+        if user.role == "staff":
+            image_query = image_query.join(models.Guest).filter(
+                models.Guest.registered_by_user_id == user.id
+            )
+        guest_images = image_query.all()
+
+        # --- Assets (chỉ bảo vệ/admin, giống /assets/guard-gate) ---
+        asset_logs = []
+        if user.role in ASSET_SYNC_ROLES:
+            asset_query = db.query(models.AssetLog).options(
+                joinedload(models.AssetLog.registered_by),
+                joinedload(models.AssetLog.check_out_by),
+                joinedload(models.AssetLog.check_in_back_by),
+                selectinload(models.AssetLog.images),
+            ).filter(
+                models.AssetLog.row_version > low,
+                models.AssetLog.row_version <= version
+            )
+            if reset:
+                # Lần tải đầu chỉ cần tài sản còn hiển thị ở cổng
+                asset_query = asset_query.filter(models.AssetLog.status.in_([
+                    models.ASSET_STATUS_PENDING_OUT, models.ASSET_STATUS_CHECKED_OUT
+                ]))
+            asset_logs = asset_query.all()
+
+        deleted = schemas.SyncDeleted()
+        if not reset:
+            tombstones = db.query(SyncTombstone.table_name, SyncTombstone.row_id).filter(
+                SyncTombstone.version > since,
+                SyncTombstone.version <= version
+            ).all()
+            buckets = {"guests": deleted.guests, "guest_images": deleted.guest_images, "asset_log": deleted.asset_logs}
+            for table_name, row_id in tombstones:
+                if table_name in buckets:
+                    buckets[table_name].append(row_id)
+
+        return schemas.SyncChanges(
+            version=version,
+            reset=reset,
+            guests=guests,
+            guest_images=guest_images,
+            asset_logs=asset_logs,
+            deleted=deleted,
+        )
+
+    @staticmethod
+    def prune_tombstones(db: Session, keep_days: int = 30) -> int:
+        """
+        Xóa tombstone cũ hơn keep_days và nâng mốc PRUNED tương ứng.
+        Client có since nhỏ hơn mốc này sẽ nhận reset=True ở lần sync sau.
+        """
+        # deleted_at do SQLite ghi (CURRENT_TIMESTAMP, UTC)
+        cutoff = datetime.utcnow() - timedelta(days=keep_days)
+        old = db.query(SyncTombstone).filter(SyncTombstone.deleted_at < cutoff)
+        max_version = old.with_entities(func.max(SyncTombstone.version)).scalar()
+        if max_version is None:
+            return 0
+
+        count = old.delete(synchronize_session=False)
+        state = db.query(SyncState).get(PRUNED)
+        if state is None:
+            state = SyncState(name=PRUNED, version=0)
+            db.add(state)
+        state.version = max(state.version, max_version)
+        db.commit()
+        logger.info(f"[sync] Pruned {count} tombstones (up to version {max_version})")
+        return count
+
+sync_service = SyncService()
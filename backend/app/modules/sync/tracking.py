@@ -0,0 +1,97 @@
+"""
+Theo dõi thay đổi cho delta-sync (/sync/changes).
+
+Trigger SQLite tăng bộ đếm sync_state('global') mỗi khi guests, guest_images
+hoặc asset_log có dòng được thêm/sửa/xóa, gán giá trị mới vào cột row_version
+của dòng đó và ghi tombstone khi xóa. Thêm/xóa ảnh cũng tăng row_version của
+khách/tài sản cha vì client nhận ảnh lồng trong bản ghi cha.
+Dùng trigger (không dùng ORM event) để bắt cả query.update()/delete() hàng loạt.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = "global"
+# Mốc version mà tombstone cũ hơn đã bị dọn (client cũ hơn mốc này phải tải lại toàn bộ)
+PRUNED = "tombstones_pruned"
+
+TRACKED_TABLES = ("guests", "guest_images", "asset_log")
+
+_NEXT_VERSION = f"(SELECT version FROM sync_state WHERE name = '{GLOBAL}')"
+_BUMP = f"UPDATE sync_state SET version = version + 1 WHERE name = '{GLOBAL}';"
+
+# Bảng con -> (bảng cha, cột khóa ngoại)
+_PARENTS = {
+    "guest_images": ("guests", "guest_id"),
+    "asset_images": ("asset_log", "asset_id"),
+}
+
+
+def _touch(table: str, id_expr: str) -> str:
+    return f"UPDATE {table} SET row_version = {_NEXT_VERSION} WHERE id = {id_expr};"
+
+
+def _triggers() -> dict:
+    triggers = {}
+    for table in TRACKED_TABLES:
+        triggers[f"trg_sync_{table}_ai"] = f"""
+            CREATE TRIGGER trg_sync_{table}_ai AFTER INSERT ON {table} BEGIN
+                {_BUMP}
+                {_touch(table, "NEW.id")}
+            END"""
+        # WHEN: bỏ qua chính lệnh UPDATE row_version do trigger phát ra
+        triggers[f"trg_sync_{table}_au"] = f"""
+            CREATE TRIGGER trg_sync_{table}_au AFTER UPDATE ON {table}
+            WHEN NEW.row_version IS OLD.row_version BEGIN
+                {_BUMP}
+                {_touch(table, "NEW.id")}
+            END"""
+        triggers[f"trg_sync_{table}_ad"] = f"""
+            CREATE TRIGGER trg_sync_{table}_ad AFTER DELETE ON {table} BEGIN
+                {_BUMP}
+                INSERT INTO sync_tombstones(table_name, row_id, version)
+                VALUES ('{table}', OLD.id, {_NEXT_VERSION});
+            END"""
+
+    for child, (parent, fk) in _PARENTS.items():
+        for suffix, ref in (("ai", "NEW"), ("ad", "OLD")):
+            event = "INSERT" if suffix == "ai" else "DELETE"
+            triggers[f"trg_sync_{child}_parent_{suffix}"] = f"""
+                CREATE TRIGGER trg_sync_{child}_parent_{suffix} AFTER {event} ON {child} BEGIN
+                    {_BUMP}
+                    {_touch(parent, f"{ref}.{fk}")}
+                END"""
+    return triggers
+
+
+def ensure_change_tracking(engine: Engine) -> None:
+    """
+    Tạo dòng bộ đếm + trigger (idempotent) và gán version cho các dòng cũ chưa có.
+    Gọi sau Base.metadata.create_all()/ensure_columns() lúc khởi động.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for name in (GLOBAL, PRUNED):
+            conn.execute(
+                text("INSERT OR IGNORE INTO sync_state(name, version) VALUES (:name, 0)"),
+                {"name": name},
+            )
+        for name, ddl in _triggers().items():
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+            conn.execute(text(ddl))
+
+        # Dữ liệu có từ trước khi bật theo dõi: gán chung một version mới
+        for table in TRACKED_TABLES:
+            missing = conn.execute(
+                text(f"SELECT 1 FROM {table} WHERE row_version IS NULL LIMIT 1")
+            ).first()
+            if missing:
+                conn.execute(text(_BUMP))
+                conn.execute(text(
+                    f"UPDATE {table} SET row_version = {_NEXT_VERSION} WHERE row_version IS NULL"
+                ))
+                logger.info(f"[sync] Backfilled row_version for {table}")
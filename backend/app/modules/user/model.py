@@ -16,6 +16,8 @@ class User(Base):
     department = Column(String(64), default="", nullable=True)  # Bộ phận
     telegram_id = Column(String(32), unique=True, nullable=True, index=True) # ID Telegram
     created_at = Column(DateTime, default=get_local_time)
+    # Tăng khi đổi mật khẩu: token đã cấp (claim "tv") hết hiệu lực, cache xác thực bị bỏ qua
+    token_version = Column(Integer, nullable=True, default=0)
 
     # Relationships using String References to avoid Circular Imports
     guests = relationship("Guest", back_populates="registered_by", foreign_keys="[Guest.registered_by_user_id]")
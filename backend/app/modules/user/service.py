@@ -9,10 +9,25 @@ from app import models
 from app.modules.user import schema as schemas
 from app.core import config
 from app.core.auth import get_password_hash
+from app.core.principal_cache import principal_cache
 from app.core.database import unaccent_string
+from app.utils.excel_export import EXPORT_YIELD_PER, ExcelColumn, ExcelSheetSpec, stream_xlsx
 
 logger = logging.getLogger(__name__)
 
+USER_EXPORT_SHEET = ExcelSheetSpec(
+    sheet_name="Users",
+    header_format={"bold": True},
+    columns=[
+        ExcelColumn("username", lambda u: u.username),
+        ExcelColumn("full_name", lambda u: u.full_name),
+        ExcelColumn("role", lambda u: u.role),
+        ExcelColumn("password_hash", lambda u: u.password_hash),
+        ExcelColumn("password", lambda u: "", width=12),
+    ],
+)
+
+
 class UserService:
     @staticmethod
     def create_user(db: Session, payload: schemas.UserCreate) -> models.User:
@@ -60,8 +75,10 @@ class UserService:
             user.role = payload.role
         if payload.password is not None and payload.password.strip():
             user.password_hash = get_password_hash(payload.password)
+            user.token_version = (user.token_version or 0) + 1
 
         db.commit()
+        principal_cache.invalidate(user.id)
         db.refresh(user)
         return user
 
@@ -77,6 +94,7 @@ class UserService:
             
         db.delete(user)
         db.commit()
+        principal_cache.invalidate(user_id)
         return True
 
     @staticmethod
@@ -85,6 +103,7 @@ class UserService:
         try:
             num_deleted = db.query(models.User).filter(models.User.username != config.settings.ADMIN_USERNAME).delete()
             db.commit()
+            principal_cache.clear()
             return num_deleted
         except Exception as e:
             db.rollback()
@@ -92,26 +111,10 @@ class UserService:
 
     @staticmethod
     def export_users(db: Session):
-        users = db.query(models.User).all()
-        data_to_export = [
-            {
-                "username": user.username,
-                "full_name": user.full_name,
-                "role": user.role,
-                "password_hash": user.password_hash,
-                "password": "" 
-            }
-            for user in users
-        ]
-        
-        df = pd.DataFrame(data_to_export)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Users')
-        
-        output.seek(0)
-        return output
+        # Header giữ nguyên tên cột mà import_users đọc lại
+        rows = db.query(models.User).yield_per(EXPORT_YIELD_PER)
+        filename = f"users_export_{models.get_local_time().strftime('%Y%m%d')}.xlsx"
+        return stream_xlsx(USER_EXPORT_SHEET, rows, filename)
 
     @staticmethod
     def import_users(db: Session, file_content: bytes) -> int:
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, Date, Time, DateTime, Text, Index, UniqueConstraint
+from app.core.database import Base
+
+# Bản sao cục bộ nhật ký xe từ Google Sheets (sheet live + các tab lưu trữ ThangMM_YYYY).
+# Do job nền đồng bộ (app/services/vehicle_log_sync_service.py); /vehicle-log chỉ đọc bảng này.
+
+VEHICLE_LOG_LIVE_SOURCE = "live"
+
+class VehicleLogEntry(Base):
+    """Một dòng hợp lệ (số xe, ngày, giờ) của một sheet."""
+    __tablename__ = "vehicle_log_entries"
+    id = Column(Integer, primary_key=True, index=True)
+    # "live" hoặc tên tab lưu trữ (vd. Thang01_2025)
+    source = Column(String(64), nullable=False)
+    row_number = Column(Integer, nullable=False)  # số dòng trên sheet (1-based)
+    plate = Column(String(32), nullable=False)
+    plate_search = Column(String(32), nullable=False)  # normalize_text(plate) cho tìm kiếm
+    day = Column(Date, nullable=False)
+    time = Column(Time, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("source", "row_number", name="uq_vehicle_log_entries_source_row"),
+        Index("ix_vehicle_log_entries_source_day", "source", "day", "time"),
+        Index("ix_vehicle_log_entries_day_time", "day", "time"),
+    )
+
+class VehicleLogSheetState(Base):
+    """Mốc đồng bộ (high-water mark) của từng sheet nguồn."""
+    __tablename__ = "vehicle_log_sheets"
+    source = Column(String(64), primary_key=True)
+    sheet_id = Column(String(128), nullable=False)
+    sheet_name = Column(String(128), nullable=False)
+    # Số dòng cuối đã đọc (kể cả dòng tiêu đề); lần sau chỉ đọc từ dòng này trở đi
+    rows_synced = Column(Integer, nullable=False, default=0)
+    # Nội dung dòng cuối đã đọc: khác đi nghĩa là sheet bị xóa / ghi lại -> đọc lại toàn bộ
+    last_row = Column(Text, nullable=True)
+    synced_at = Column(DateTime(timezone=True), nullable=True)
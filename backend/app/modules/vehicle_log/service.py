@@ -1,12 +1,27 @@
 from typing import Optional, Tuple, Dict, Any, List
 from datetime import datetime, date, timedelta
-import io
-import pandas as pd
 import logging
-from app.services.gsheets_reader import filter_and_aggregate
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+from app import models
+from app.core.config import settings
+from app.modules.vehicle_log.model import VEHICLE_LOG_LIVE_SOURCE
+from app.services.gsheets_reader import aggregate_rows, archive_sheet_name, month_span, normalize_text
+from app.utils.excel_export import ExcelColumn, ExcelSheetSpec, stream_xlsx
 
 logger = logging.getLogger(__name__)
 
+VEHICLE_LOG_EXPORT_SHEET = ExcelSheetSpec(
+    sheet_name="NhatKyXe",
+    header_format={"bold": True},
+    columns=[
+        ExcelColumn("Số xe", lambda r: r.get("plate", "")),
+        ExcelColumn("Ngày", lambda r: r["date"].strftime("%Y-%m-%d") if r.get("date") else ""),
+        ExcelColumn("Giờ", lambda r: r["time"].strftime("%H:%M:%S") if r.get("time") else ""),
+    ],
+)
+
+
 class VehicleLogService:
     @staticmethod
     def parse_date(s: Optional[str]) -> Optional[date]:
@@ -41,8 +56,43 @@ class VehicleLogService:
             return (start, end)
         return (None, None)
 
+    @staticmethod
+    def query_mirror(db: Session, q: Optional[str], start: Optional[date], end: Optional[date]) -> List[Dict[str, Any]]:
+        """
+        Lọc bảng mirror: sheet live luôn được tính; tab lưu trữ của các tháng trong khoảng
+        chỉ khi có đủ start và end. Mới nhất trước (cùng thời điểm: live trước, theo dòng sheet).
+        """
+        entry = models.VehicleLogEntry
+        sources = [VEHICLE_LOG_LIVE_SOURCE]
+        if start and end:
+            sources += [
+                archive_sheet_name(y, m) for y, m in month_span(start, end)
+                if str(y) in settings.GSHEETS_ARCHIVE_SHEETS
+            ]
+
+        query = db.query(entry.plate, entry.day, entry.time).filter(entry.source.in_(sources))
+        if start:
+            query = query.filter(entry.day >= start)
+        if end:
+            query = query.filter(entry.day <= end)
+        qn = normalize_text(q) if q else ""
+        if qn:
+            query = query.filter(entry.plate_search.contains(qn, autoescape=True))
+
+        query = query.order_by(
+            entry.day.desc(), entry.time.desc(),
+            case((entry.source == VEHICLE_LOG_LIVE_SOURCE, 0), else_=1), entry.source, entry.row_number,
+        )
+        return [{"plate": plate, "date": day, "time": time} for plate, day, time in query.all()]
+
+    @staticmethod
+    def last_synced_at(db: Session) -> Optional[datetime]:
+        state = db.get(models.VehicleLogSheetState, VEHICLE_LOG_LIVE_SOURCE)
+        return state.synced_at if state else None
+
     def get_vehicle_logs(
         self, 
+        db: Session,
         quick: Optional[str] = None, 
         start: Optional[str] = None, 
         end: Optional[str] = None, 
@@ -60,43 +110,21 @@ class VehicleLogService:
         if start_date and end_date and start_date > end_date:
             raise ValueError("Ngày bắt đầu không thể lớn hơn ngày kết thúc.")
 
-        try:
-            logger.info(f"Fetching vehicle logs. Quick={quick}, Start={start_date}, End={end_date}, Q={q}")
-            rows, charts, kpi = filter_and_aggregate(q=q, start=start_date, end=end_date)
-            logger.info(f"Vehicle logs fetched. Rows={len(rows)}")
-            return rows, charts, kpi
-        except FileNotFoundError as e:
-            logger.critical(f"CRITICAL ERROR in GSheet service: {e}")
-            raise FileNotFoundError("Lỗi nghiêm trọng: Không tìm thấy file credentials.json của Google. Vui lòng kiểm tra lại cấu hình.")
-        except Exception as service_exc:
-            logger.error(f"Error calling GSheet service: {service_exc}", exc_info=True)
-            raise RuntimeError(f"Không thể kết nối hoặc đọc dữ liệu từ Google Sheets. Chi tiết: {service_exc}")
+        # Đọc từ bảng mirror cục bộ (job nền đồng bộ từ Google Sheets)
+        rows = self.query_mirror(db, q, start_date, end_date)
+        charts, kpi = aggregate_rows(rows)
+        return rows, charts, kpi
 
     def generate_excel_export(
         self,
+        db: Session,
         quick: Optional[str] = None,
         start: Optional[str] = None,
         end: Optional[str] = None,
         q: Optional[str] = None
-    ) -> Tuple[io.BytesIO, str]:
-        rows, _, _ = self.get_vehicle_logs(quick, start, end, q)
-        
-        export_data = [{
-            "Số xe": r.get("plate", ""),
-            "Ngày": r["date"].strftime("%Y-%m-%d") if r.get("date") else "",
-            "Giờ": r["time"].strftime("%H:%M:%S") if r.get("time") else ""
-        } for r in rows]
-        
-        df = pd.DataFrame(export_data)
-
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name="NhatKyXe")
-        output.seek(0)
-
-        today_str = date.today().strftime("%Y%m%d")
-        filename = f"NhatKyXe_Export_{today_str}.xlsx"
-        
-        return output, filename
+    ):
+        rows, _, _ = self.get_vehicle_logs(db, quick, start, end, q)
+        filename = f"NhatKyXe_Export_{date.today().strftime('%Y%m%d')}.xlsx"
+        return stream_xlsx(VEHICLE_LOG_EXPORT_SHEET, rows, filename)
 
 vehicle_log_service = VehicleLogService()
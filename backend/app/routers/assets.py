@@ -1,5 +1,6 @@
 # File: backend/app/routers/assets.py
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, UploadFile, File, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -11,6 +12,7 @@ from ..core.deps import get_db
 from ..core.auth import get_current_user, require_roles
 from ..models import get_local_time
 from ..core.config import settings
+from ..services.upload_service import receive_upload, UploadRejected
 
 router = APIRouter(
     prefix="/assets",
@@ -46,11 +48,15 @@ async def upload_asset_image(
 ):
     try:
         from ..modules.asset.service import asset_service
-        content = await file.read()
-        db_image = asset_service.upload_asset_image(db, asset_id, file.filename, content, current_user)
+        async with receive_upload(file) as upload:
+            db_image = await run_in_threadpool(asset_service.upload_asset_image, db, asset_id, upload, current_user)
         if not db_image:
              raise HTTPException(status_code=404, detail="Không tìm thấy tài sản")
         return db_image
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except PermissionError:
         raise HTTPException(status_code=403, detail="Không có quyền truy cập hoặc tài sản không thuộc về bạn")
     except Exception as e:
@@ -227,11 +233,9 @@ def export_assets(
 ):
     try:
         from ..modules.asset.service import asset_service
-        output = asset_service.export_assets(db, current_user, start_date, end_date, status, department)
-        headers = {
-            'Content-Disposition': f'attachment; filename="so_theo_doi_tai_san_{get_local_time().strftime("%Y%m%d_%H%M")}.xlsx"'
-        }
-        return Response(content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+        return asset_service.export_assets(db, current_user, start_date, end_date, status, department)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Không thể tạo file Excel: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Không thể tạo file Excel.")
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from .. import models
+from ..core.auth import get_current_user
+from ..services.event_broker import SSE_TICKET_TTL_SECONDS, event_broker, sse_tickets
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+KEEPALIVE_SECONDS = 15
+
+@router.post("/ticket")
+def issue_ticket(current_user: models.User = Depends(get_current_user)):
+    """Vé dùng một lần để mở /events/stream (thay cho việc đặt access token trên URL)."""
+    return {
+        "ticket": sse_tickets.issue(current_user.id, current_user.role),
+        "expires_in": SSE_TICKET_TTL_SECONDS,
+    }
+
+
+@router.get("/stream")
+async def event_stream(
+    request: Request,
+    ticket: str = Query(..., description="Vé từ POST /events/ticket (EventSource không gửi được header Authorization)")
+):
+    """
+    Server-Sent Events: đẩy sự kiện khách/tài sản/thông báo theo role và user.
+    Mỗi sự kiện: `event: <type>` + `data: {"id", "type", "data"}`.
+    """
+    # Không cần session CSDL: vé đã mang sẵn user/role lúc cấp
+    principal = sse_tickets.redeem(ticket)
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired event ticket")
+    user_id, role = principal
+
+    sub = event_broker.subscribe(user_id, role)
+    logger.info(f"[events] User {user_id} ({role}) subscribed")
+
+    async def generate():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = json.dumps(event, ensure_ascii=False, default=str)
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+        finally:
+            event_broker.unsubscribe(sub)
+            logger.info(f"[events] User {user_id} unsubscribed")
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -7,6 +7,7 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 
 from ..core.auth import get_current_user
+from ..services.upload_service import UploadRejected
 
 router = APIRouter(prefix="/gemini", tags=["gemini"])
 logger = logging.getLogger(__name__)
@@ -24,6 +25,8 @@ async def extract_cccd_info_proxy(
     try:
         return await cccd_service.extract_cccd_info(file, user)
 
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except ValueError as e:
         if "Extractor service is not configured" in str(e):
              raise HTTPException(status_code=500, detail=str(e))
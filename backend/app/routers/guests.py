@@ -1,6 +1,8 @@
 # File: backend/app/routers/guests.py
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from typing import Literal, Union
 import logging
 
 from .. import models, schemas
@@ -8,6 +10,7 @@ from ..core.deps import get_db
 from ..core.auth import get_current_user, require_roles
 from ..models import get_local_time
 from ..core.config import settings
+from ..services.upload_service import receive_upload, UploadRejected
 
 router = APIRouter(prefix="/guests", tags=["guests"])
 logger = logging.getLogger(__name__)
@@ -31,11 +34,15 @@ def create_guest(payload: schemas.GuestCreate, db: Session = Depends(get_db), us
 async def upload_guest_image(guest_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
     from ..modules.guest.service import guest_service
     try:
-        content = await file.read()
-        db_image = guest_service.upload_guest_image_bytes(db, guest_id, file.filename, content)
+        async with receive_upload(file) as upload:
+            db_image = await run_in_threadpool(guest_service.upload_guest_image, db, guest_id, upload)
         if not db_image:
              raise HTTPException(status_code=404, detail="Guest not found")
         return db_image
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Could not upload image for guest {guest_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Could not upload image")
@@ -53,30 +60,41 @@ def create_guests_bulk(payload: schemas.GuestBulkCreate, db: Session = Depends(g
         raise HTTPException(status_code=500, detail="Could not create guests")
 
 
-@router.get("/", response_model=list[schemas.GuestReadWithUser])
+@router.get("/", response_model=schemas.GuestPage)
 def list_guests(
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_user),
     q: str | None = Query(default=None, description="Tìm kiếm tương đối"),
-    include_all_my_history: bool = False
+    include_all_my_history: bool = False,
+    limit: int = Query(default=100, ge=1, le=500, description="Số dòng mỗi trang"),
+    cursor: str | None = Query(default=None, description="next_cursor của trang trước")
 ):
     from ..modules.guest.service import guest_service
-    results = guest_service.list_guests(db, user, q, include_all_my_history)
-
-    # Đảm bảo trả về cả thông tin ảnh
-    output = []
-    for guest, registered_by_name in results:
-        guest_data = schemas.GuestRead.model_validate(guest).model_dump()
-        guest_data["registered_by_name"] = registered_by_name
-        guest_data["images"] = [schemas.GuestImageRead.model_validate(img) for img in guest.images]
-        output.append(schemas.GuestReadWithUser.model_validate(guest_data))
-
-    return output
+    try:
+        results, next_cursor = guest_service.list_guests(
+            db, user, q, include_all_my_history, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/suggestions", response_model=schemas.GuestSuggestions)
-def get_suggestions(db: Session = Depends(get_db)):
+    # Dựng model một lần cho mỗi dòng (kèm ảnh đã selectinload)
+    items = [
+        schemas.GuestReadWithUser.model_validate(guest).model_copy(
+            update={"registered_by_name": registered_by_name}
+        )
+        for guest, registered_by_name in results
+    ]
+    return schemas.GuestPage(items=items, next_cursor=next_cursor)
+
+@router.get("/suggestions", response_model=Union[schemas.GuestSuggestionList, schemas.GuestSuggestions])
+def get_suggestions(
+    db: Session = Depends(get_db),
+    field: Literal["license_plate", "supplier_name"] | None = Query(default=None, description="Bỏ trống: trả về danh sách đầy đủ (kiểu cũ)"),
+    prefix: str = Query(default="", max_length=100, description="Tiền tố, không phân biệt dấu/hoa thường"),
+    limit: int = Query(default=10, ge=1, le=100)
+):
     from ..modules.guest.service import guest_service
-    return guest_service.get_suggestions(db)
+    return guest_service.get_suggestions(db, field, prefix, limit)
 
 @router.put("/{guest_id}", response_model=schemas.GuestRead)
 def update_guest(guest_id: int, payload: schemas.GuestUpdate, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
@@ -130,11 +148,11 @@ def delete_guest_image(image_id: int, db: Session = Depends(get_db), user: model
         raise HTTPException(status_code=500, detail="Could not delete image")
 
 @router.post("/import/xlsx", dependencies=[Depends(require_roles("admin", "manager"))])
-async def import_guests(file: UploadFile = File(...), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+def import_guests(file: UploadFile = File(...), db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
     from ..modules.guest.service import guest_service
     try:
-        content = await file.read()
-        return guest_service.import_guests(db, content, user)
+        # Đọc trực tiếp từ file tạm của upload (streaming), không nạp cả file vào bộ nhớ
+        return guest_service.import_guests(db, file.file, user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -153,11 +171,7 @@ def export_guests(
 ):
     from ..modules.guest.service import guest_service
     try:
-        output = guest_service.export_guests(db, user, start_date, end_date, registrant_id, supplier_name, status)
-        headers = {
-            'Content-Disposition': f'attachment; filename="so_theo_doi_khach_{get_local_time().strftime("%Y%m%d_%H%M")}.xlsx"'
-        }
-        return Response(content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+        return guest_service.export_guests(db, user, start_date, end_date, registrant_id, supplier_name, status)
     except Exception as e:
         logger.error(f"Không thể tạo file Excel: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Không thể tạo file Excel.")
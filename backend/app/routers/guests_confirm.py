@@ -10,6 +10,20 @@ from ..core.auth import require_roles, get_current_user
 router = APIRouter(prefix="/guests", tags=["guests-confirm"])
 logger = logging.getLogger(__name__)
 
+@router.post("/batch-confirm", response_model=schemas.GateBatchConfirmResult, dependencies=[Depends(require_roles("admin","manager","guard","staff"))])
+def batch_confirm(payload: schemas.GateBatchConfirm, bg: BackgroundTasks, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+    """
+    Xác nhận vào/ra cho cả đoàn khách (và tài sản đi kèm) trong một giao dịch.
+    Bản ghi không tồn tại hoặc đã ở trạng thái đích được trả về trong skipped_*.
+    """
+    if not payload.guest_ids and not payload.asset_ids:
+        raise HTTPException(status_code=400, detail="guest_ids hoặc asset_ids là bắt buộc")
+    from ..modules.guest.service import guest_service
+    try:
+        return guest_service.confirm_batch(db, payload, user, bg)
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Không có quyền xác nhận tài sản")
+
 @router.post("/{guest_id}/confirm-in", dependencies=[Depends(require_roles("admin","manager","guard","staff"))])
 def confirm_in(guest_id: int, bg: BackgroundTasks, db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
     from ..modules.guest.service import guest_service
@@ -1,5 +1,6 @@
 # File: backend/app/routers/purchasing.py
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response, Body
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
@@ -10,6 +11,7 @@ from ..core.deps import get_db
 from ..core.auth import get_current_user, require_roles
 from ..models import get_local_time
 from ..modules.purchasing import schema as schemas
+from ..services.upload_service import receive_upload, UploadRejected
 
 router = APIRouter(
     prefix="/purchasing",
@@ -91,11 +93,15 @@ async def upload_purchasing_image(
 ):
     try:
         from ..modules.purchasing.service import purchasing_service
-        content = await file.read()
-        image = purchasing_service.upload_purchasing_image(db, purchasing_id, type, file.filename, content)
+        async with receive_upload(file) as upload:
+            image = await run_in_threadpool(purchasing_service.upload_purchasing_image, db, purchasing_id, type, upload)
         if not image:
             raise HTTPException(status_code=404, detail="Purchasing request not found")
         return image
+    except HTTPException:
+        raise
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logger.error(f"Error uploading image: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Could not upload image")
@@ -145,12 +151,7 @@ def export_purchasing_logs(
 ):
     try:
         from ..modules.purchasing.service import purchasing_service
-        output = purchasing_service.export_purchasing_logs(db, start_date, end_date, department, status)
-        
-        filename = f"bao_cao_mua_sam_{get_local_time().strftime('%Y%m%d_%H%M')}.xlsx"
-        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
-        return Response(content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
-
+        return purchasing_service.export_purchasing_logs(db, start_date, end_date, department, status)
     except Exception as e:
         logger.error(f"Cannot export purchasing logs: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Cannot export Excel file.")
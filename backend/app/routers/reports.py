@@ -10,27 +10,62 @@ from ..core.auth import require_roles
 router = APIRouter(prefix="/reports", tags=["reports"], dependencies=[Depends(require_roles("admin", "manager"))])
 
 
+def _check_day_bounds(start: datetime | None, end: datetime | None) -> None:
+    """
+    Các báo cáo đọc bảng tổng hợp theo ngày: start/end phải là trọn ngày theo giờ địa
+    phương (start 00:00:00, end 23:59:59). Mốc khác trả 422 thay vì bị làm tròn.
+    """
+    from ..modules.report.service import check_day_bounds
+    try:
+        check_day_bounds(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@router.get("/dashboard")
+def dashboard(
+    widgets: str,
+    db: Session = Depends(get_db),
+    start: datetime | None = None,
+    end: datetime | None = None
+):
+    """
+    Nhiều widget dashboard trong một request. `widgets` là danh sách id cách nhau bởi dấu
+    phẩy (vd. guests_daily,assets_daily,system_overview); kết quả trả về theo id.
+    """
+    _check_day_bounds(start, end)
+    from ..modules.report.service import report_service
+    widget_ids = [w.strip() for w in widgets.split(",") if w.strip()]
+    try:
+        return report_service.dashboard(db, widget_ids, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/guests_daily")
 def guests_daily(db: Session = Depends(get_db), start: datetime | None = None, end: datetime | None = None):
     """Thống kê lượt khách vào theo từng ngày."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.guests_daily(db, start, end)
 
 @router.get("/guests_by_user")
 def guests_by_user(db: Session = Depends(get_db), start: datetime | None = None, end: datetime | None = None):
     """Thống kê lượt khách theo người đăng ký."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.guests_by_user(db, start, end)
 
 @router.get("/guests_by_supplier")
 def guests_by_supplier(db: Session = Depends(get_db), start: datetime | None = None, end: datetime | None = None):
     """Thống kê lượt khách theo nhà cung cấp."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.guests_by_supplier(db, start, end)
 
 @router.get("/guests_by_plate")
 def guests_by_plate(db: Session = Depends(get_db), start: datetime | None = None, end: datetime | None = None, limit: int = 10):
     """Thống kê top 10 xe vào nhiều nhất."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.guests_by_plate(db, start, end, limit)
 
@@ -41,6 +76,7 @@ def assets_by_status(
     end: datetime | None = None
 ):
     """Thống kê số lượng tài sản theo trạng thái."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.assets_by_status(db, start, end)
 
@@ -51,6 +87,7 @@ def assets_daily(
     end: datetime | None = None
 ):
     """Thống kê tài sản ra/vào theo ngày và tổng tích luỹ tài sản ra."""
+    _check_day_bounds(start, end)
     from ..modules.report.service import report_service
     return report_service.assets_daily(db, start, end)
 
@@ -89,6 +126,7 @@ def system_overview(
     end: datetime | None = None
 ):
     """Tổng quan hệ thống với các KPIs quan trọng."""
+    _check_day_bounds(start, end)
     try:
         from ..modules.report.service import report_service
         return report_service.system_overview(db, start, end)
@@ -102,6 +140,7 @@ def user_activity(
     end_date: datetime | None = None
 ):
     """Thống kê hoạt động của người dùng."""
+    _check_day_bounds(start_date, end_date)
     try:
         from ..modules.report.service import report_service
         return report_service.user_activity(db, start_date, end_date)
@@ -15,6 +15,7 @@ Mapping:
 """
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -22,6 +23,7 @@ from .. import models
 from ..core.deps import get_db
 from ..core.auth import require_roles
 from ..modules.security_event import schema as schemas
+from ..services.upload_service import receive_upload, UploadRejected
 
 router = APIRouter(
     prefix="/security-events",
@@ -84,7 +86,7 @@ def delete_security_event(
     return {"message": "Đã xóa sự kiện thành công"}
 
 @router.post("/{event_id}/upload-image")
-def upload_security_event_image(
+async def upload_security_event_image(
     event_id: int,
     file: UploadFile = File(...),
     current_user: models.User = Depends(require_roles("admin", "manager", "guard")),
@@ -92,12 +94,11 @@ def upload_security_event_image(
 ):
     from ..modules.security_event.service import security_event_service
     
-    allowed_types = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
-    if file.content_type not in allowed_types:
-        raise HTTPException(status_code=400, detail="Chỉ chấp nhận file ảnh (JPEG, PNG, GIF, WebP)")
-        
     try:
-        return security_event_service.upload_image(db, event_id, file.filename, file.file)
+        async with receive_upload(file) as upload:
+            return await run_in_threadpool(security_event_service.upload_image, db, event_id, upload)
+    except UploadRejected as e:
+         raise HTTPException(status_code=e.status_code, detail=str(e))
     except ValueError as e:
          raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
@@ -92,6 +92,25 @@ def clear_suppliers(db: Session = Depends(get_db)):
     return {"ok": True}
 
 # ---------- STATS ENDPOINT ----------
+def _parse_stats_date(value: str | None):
+    from datetime import datetime
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+def _stats_day_range(start_date: str | None, end_date: str | None):
+    """Thống kê đọc bảng tổng hợp theo ngày: start/end phải là trọn ngày (xem check_day_bounds)."""
+    from ..modules.report.service import check_day_bounds
+    start, end = _parse_stats_date(start_date), _parse_stats_date(end_date)
+    try:
+        check_day_bounds(start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return start, end
+
 @router.get("/stats/activity")
 def get_supplier_activity_stats(
     start_date: str = None,
@@ -99,50 +118,10 @@ def get_supplier_activity_stats(
     db: Session = Depends(get_db)
 ):
     """Lấy thống kê hoạt động nhà cung cấp (top suppliers theo số lượng khách)"""
-    from sqlalchemy import func
-    from datetime import datetime
-    
+    start, end = _stats_day_range(start_date, end_date)
     try:
-        # Build query
-        query = db.query(
-            models.Guest.supplier_name,
-            func.count(models.Guest.id).label('count')
-        ).filter(
-            models.Guest.supplier_name != "",
-            models.Guest.supplier_name.isnot(None)
-        )
-        
-        # Apply date filters
-        if start_date:
-            try:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(models.Guest.created_at >= start_dt)
-            except:
-                pass
-        
-        if end_date:
-            try:
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(models.Guest.created_at <= end_dt)
-            except:
-                pass
-        
-        # Group and order
-        results = query.group_by(models.Guest.supplier_name)\
-                      .order_by(func.count(models.Guest.id).desc())\
-                      .limit(10)\
-                      .all()
-        
-        # Format response
-        labels = [r[0] for r in results]
-        series = [r[1] for r in results]
-        
-        return {
-            "labels": labels,
-            "series": series,
-            "total_suppliers": len(results)
-        }
-        
+        from ..modules.report.service import report_service
+        return report_service.supplier_activity(db, start, end)
     except Exception as e:
         logger.error(f"Stats query failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get stats")
@@ -154,55 +133,10 @@ def get_supplier_noshow_stats(
     db: Session = Depends(get_db)
 ):
     """Lấy thống kê nhà cung cấp có khách no-show (khách đăng ký nhưng không tới)"""
-    from sqlalchemy import func
-    from datetime import datetime
-    
+    start, end = _stats_day_range(start_date, end_date)
     try:
-        # Build query for no-show guests
-        query = db.query(
-            models.Guest.supplier_name,
-            func.count(models.Guest.id).label('no_show_count')
-        ).filter(
-            models.Guest.supplier_name != "",
-            models.Guest.supplier_name.isnot(None),
-            models.Guest.status == "no_show"
-        )
-        
-        # Apply date filters
-        if start_date:
-            try:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(models.Guest.created_at >= start_dt)
-            except:
-                pass
-        
-        if end_date:
-            try:
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(models.Guest.created_at <= end_dt)
-            except:
-                pass
-        
-        # Group and order
-        results = query.group_by(models.Guest.supplier_name)\
-                      .order_by(func.count(models.Guest.id).desc())\
-                      .limit(10)\
-                      .all()
-        
-        # Format response
-        data = [
-            {
-                "supplier_name": r[0],
-                "no_show_count": r[1]
-            }
-            for r in results
-        ]
-        
-        return {
-            "data": data,
-            "total": len(data)
-        }
-        
+        from ..modules.report.service import report_service
+        return report_service.supplier_no_show(db, start, end)
     except Exception as e:
         logger.error(f"No-show stats query failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get no-show stats")
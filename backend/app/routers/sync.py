@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..core.deps import get_db
+from ..core.auth import get_current_user
+from .. import models
+from ..modules.sync import schema as schemas
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+@router.get("/changes", response_model=schemas.SyncChanges)
+def get_changes(
+    since: int = Query(default=0, ge=0, description="version nhận được ở lần sync trước (0 = tải toàn bộ)"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_user)
+):
+    """
+    Delta-sync cho PWA cổng bảo vệ: chỉ trả về khách/ảnh/tài sản thay đổi sau `since`
+    và danh sách id đã xóa. Client lưu lại `version` để dùng cho lần gọi kế tiếp.
+    """
+    from ..modules.sync.service import sync_service
+    return sync_service.get_changes(db, user, since)
@@ -49,13 +49,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 def export_users(db: Session = Depends(get_db)):
     try:
         from ..modules.user.service import user_service
-        output = user_service.export_users(db)
-        
-        headers = {
-            'Content-Disposition': f'attachment; filename="users_export_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-        }
-        return Response(content=output.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
-
+        return user_service.export_users(db)
     except Exception as e:
         logger.error(f"Could not generate users Excel file: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Could not generate Excel file.")
@@ -5,7 +5,10 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from typing import Optional
 import logging
 
+from sqlalchemy.orm import Session
+
 from ..core.auth import get_current_user
+from ..core.deps import get_db
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +27,12 @@ def list_vehicle_log(
     end: Optional[str] = Query(None, description="Ngày kết thúc (YYYY-MM-DD)"),
     q: Optional[str] = Query(None, description="Từ khóa tìm kiếm (biển số xe)"),
     page: int = Query(1, ge=1),
-    pageSize: int = Query(10, ge=1, le=200)
+    pageSize: int = Query(10, ge=1, le=200),
+    db: Session = Depends(get_db)
 ):
     from ..modules.vehicle_log.service import vehicle_log_service
     try:
-        rows, charts, kpi = vehicle_log_service.get_vehicle_logs(quick, start, end, q)
+        rows, charts, kpi = vehicle_log_service.get_vehicle_logs(db, quick, start, end, q)
 
         total_records = len(rows)
         start_index = (page - 1) * pageSize
@@ -47,15 +51,12 @@ def list_vehicle_log(
             "pageSize": pageSize,
             "items": items,
             "chart": charts,
-            "kpi": kpi
+            "kpi": kpi,
+            "syncedAt": vehicle_log_service.last_synced_at(db)
         }
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    except RuntimeError as e:
-        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Lỗi không xác định trong endpoint vehicle-log: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Lỗi máy chủ nội bộ không xác định: {e}")
@@ -66,26 +67,13 @@ def export_vehicle_log_to_excel(
     start: Optional[str] = Query(None),
     end: Optional[str] = Query(None),
     q: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
 ):
     from ..modules.vehicle_log.service import vehicle_log_service
     try:
-        output, filename = vehicle_log_service.generate_excel_export(quick, start, end, q)
-        
-        headers = {
-            "Content-Disposition": f'attachment; filename="{filename}"'
-        }
-
-        return StreamingResponse(
-            output, 
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers=headers
-        )
+        return vehicle_log_service.generate_excel_export(db, quick, start, end, q)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    except RuntimeError as e:
-        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Lỗi khi xuất file Excel: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Không thể tạo file Excel: {e}")
@@ -6,7 +6,8 @@ from app.modules.user.schema import (
 )
 from app.modules.guest.schema import (
     GuestImageRead, GuestBase, GuestCreate, GuestUpdate, GuestRead, 
-    GuestReadWithUser, GuestSuggestions, GuestIndividualCreate, GuestBulkCreate,
+    GuestReadWithUser, GuestPage, GuestSuggestions, SuggestionItem, GuestSuggestionList,
+    GateBatchConfirm, GateBatchSkipped, GateBatchConfirmResult, GuestIndividualCreate, GuestBulkCreate,
     LongTermGuestBase, LongTermGuestCreate, LongTermGuestUpdate, LongTermGuestRead,
     LongTermGuestReadWithUser
 )
@@ -0,0 +1,163 @@
+# File: backend/app/services/event_broker.py
+"""
+Kênh đẩy sự kiện thời gian thực (in-process pub/sub) cho SSE /events/stream.
+
+Các write path (GuestService, AssetService, job đồng bộ Google Form, job no-show)
+gọi publish() SAU KHI commit. publish() an toàn khi gọi từ bất kỳ luồng nào
+(threadpool của FastAPI, APScheduler): sự kiện được chuyển vào asyncio.Queue
+của từng subscriber qua loop.call_soon_threadsafe().
+
+Sự kiện chỉ gửi tới subscriber có role nằm trong `roles` hoặc user_id nằm trong
+`user_ids`. Client coi sự kiện là tín hiệu để delta-sync (/sync/changes) hoặc
+tải lại thông báo, nên payload chỉ chứa thông tin gọn (id, trạng thái...).
+
+Xác thực SSE: EventSource không gửi được header Authorization, nên client đổi access
+token lấy một vé (ticket) ngẫu nhiên, dùng một lần, hết hạn sau SSE_TICKET_TTL_SECONDS
+(POST /events/ticket) rồi chỉ đặt vé đó trên URL. JWT không bao giờ xuất hiện trong
+access log hay lịch sử proxy; vé lộ ra cũng đã bị dùng hoặc hết hạn.
+
+Lưu ý: broker và vé nằm trong bộ nhớ tiến trình, chỉ phù hợp khi chạy một worker uvicorn.
+"""
+import asyncio
+import itertools
+import logging
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Vai trò theo dõi cổng (khách + tài sản)
+GATE_ROLES = ("admin", "manager", "guard")
+ASSET_GATE_ROLES = ("admin", "guard")
+
+QUEUE_SIZE = 256
+SSE_TICKET_TTL_SECONDS = 30
+
+_event_ids = itertools.count(1)
+
+
+@dataclass(eq=False)
+class Subscription:
+    user_id: int
+    role: str
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=QUEUE_SIZE))
+
+    def deliver(self, event: dict) -> None:
+        """Chạy trên event loop của subscriber."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client xử lý chậm: bỏ các sự kiện đang chờ, yêu cầu đồng bộ lại toàn bộ
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": event["id"], "type": "resync", "data": {}})
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int, role: str) -> Subscription:
+        sub = Subscription(user_id=user_id, role=role, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(
+        self,
+        event_type: str,
+        data: Optional[dict] = None,
+        roles: Iterable[str] = (),
+        user_ids: Iterable[Optional[int]] = (),
+    ) -> None:
+        roles = set(roles)
+        user_ids = {uid for uid in user_ids if uid is not None}
+        event = {"id": next(_event_ids), "type": event_type, "data": data or {}}
+
+        with self._lock:
+            targets = [s for s in self._subscribers if s.role in roles or s.user_id in user_ids]
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, event)
+            except RuntimeError:
+                # Event loop đã đóng (client ngắt kết nối khi đang tắt server)
+                self.unsubscribe(sub)
+
+
+event_broker = EventBroker()
+
+
+class SseTicketStore:
+    """Vé mở kết nối SSE: ticket -> (user_id, role), dùng một lần."""
+
+    def __init__(self, ttl: float = SSE_TICKET_TTL_SECONDS):
+        self.ttl = ttl
+        self._tickets: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def issue(self, user_id: int, role: str) -> str:
+        ticket = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            # Dọn vé hết hạn chưa dùng (client mất kết nối giữa hai bước)
+            for key in [k for k, (expires_at, _, _) in self._tickets.items() if expires_at < now]:
+                del self._tickets[key]
+            self._tickets[ticket] = (now + self.ttl, user_id, role)
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[tuple]:
+        """(user_id, role) nếu vé hợp lệ; vé bị xóa ngay nên không dùng lại được."""
+        with self._lock:
+            entry = self._tickets.pop(ticket, None)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+
+sse_tickets = SseTicketStore()
+
+
+# -----------------------------
+# Helpers cho các write path
+# -----------------------------
+def publish_guest_event(event_type: str, guest) -> None:
+    event_broker.publish(
+        event_type,
+        {"id": guest.id, "status": guest.status, "full_name": guest.full_name},
+        roles=GATE_ROLES,
+        user_ids=[guest.registered_by_user_id],
+    )
+
+
+def publish_guests_created(guests: list, source: str) -> None:
+    """Một sự kiện gộp cho đăng ký theo đoàn / đồng bộ Google Form."""
+    if not guests:
+        return
+    event_broker.publish(
+        "guest.bulk_created",
+        {"ids": [g.id for g in guests], "count": len(guests), "source": source},
+        roles=GATE_ROLES,
+        user_ids={g.registered_by_user_id for g in guests},
+    )
+
+
+def publish_asset_event(event_type: str, asset) -> None:
+    event_broker.publish(
+        event_type,
+        {"id": asset.id, "status": asset.status},
+        roles=ASSET_GATE_ROLES,
+        user_ids=[asset.registered_by_user_id],
+    )
+
+
+def publish_notifications(user_ids: Iterable[int]) -> None:
+    event_broker.publish("notification.created", roles=(), user_ids=user_ids)
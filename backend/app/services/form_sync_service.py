@@ -12,6 +12,7 @@ from ..core.database import SessionLocal
 from ..models import User, Guest, get_local_time
 from ..core.config import settings
 from .gsheets_reader import _get_service, read_form_responses, batch_update_status
+from .event_broker import publish_guests_created
 from ..utils.notifications import run_pending_list_notification, send_event_to_archive_background
 from ..utils.plate_formatter import format_license_plate
 
@@ -163,11 +164,8 @@ def sync_google_form_registrations():
                     except Exception as e:
                         logger.warning(f"Could not parse timestamp '{timestamp_str}': {e}")
 
-                # Ensure we save naive UTC if the DB driver prefers it, but keeping tzinfo usually works if configured right.
-                # However, to be safe against the "19:27" issue, we strip tzinfo after converting to UTC.
-                if estimated_dt and estimated_dt.tzinfo:
-                     estimated_dt = estimated_dt.replace(tzinfo=None)
-
+                # Giữ tzinfo để Guest tính đúng estimated_at_utc; SQLite vẫn lưu estimated_datetime
+                # dạng naive (giờ UTC với giá trị đã parse) như trước.
                 new_guest.estimated_datetime = estimated_dt
 
                 db.add(new_guest)
@@ -183,7 +181,13 @@ def sync_google_form_registrations():
         if updates_to_push:
             db.commit()
             logger.info(f"Committed {new_guests_count} new guests to DB.")
-            
+
+            # Đẩy sự kiện tới cổng bảo vệ / người đăng ký (ngay sau commit, không phụ thuộc Sheet/Telegram)
+            try:
+                publish_guests_created(new_guest_objects, "google_form")
+            except Exception as e:
+                logger.error(f"Error publishing guest events: {e}")
+
             # Batch update to Sheet
             batch_update_status(service, settings.GSHEETS_LIVE_SHEET_ID, updates_to_push)
 
@@ -5,31 +5,66 @@ from datetime import datetime, date
 from collections import Counter, defaultdict
 import pytz
 import logging
+import threading
 
+import httplib2
 from google.oauth2.service_account import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 
 from ..core.config import settings
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+HTTP_TIMEOUT_SECONDS = 30
 TZ = pytz.timezone(settings.TZ)
 logger = logging.getLogger("[GSheet Reader]")
 
+# Client dùng chung cho cả tiến trình (job nền, background task, request): credentials và
+# tài liệu discovery chỉ nạp một lần. httplib2.Http không an toàn đa luồng nên mỗi luồng
+# có một AuthorizedHttp riêng (giữ kết nối keep-alive, tự làm mới access token).
+_service = None
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+
+def _thread_http(credentials) -> AuthorizedHttp:
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+        _thread_local.http = http
+    return http
+
 def _get_service():
-    """Builds and returns a Google Sheets API service object."""
-    logger.info("Attempting to build Google Sheets service...")
-    try:
-        creds = Credentials.from_service_account_file(settings.GSHEETS_CREDENTIALS_PATH, scopes=SCOPES)
-        service = build("sheets", "v4", credentials=creds, cache_discovery=False)
-        logger.info("Successfully built Google Sheets service.")
-        return service
-    except FileNotFoundError:
-        logger.error(f"FATAL: Credentials file not found at '{settings.GSHEETS_CREDENTIALS_PATH}'.")
-        raise
-    except Exception as e:
-        logger.error(f"FATAL: Failed to build Google Sheets service: {e}")
-        raise
+    """Returns the process-wide Google Sheets API service object (built on first use, thread-safe)."""
+    global _service
+    if _service is not None:
+        return _service
+    with _service_lock:
+        if _service is not None:
+            return _service
+        logger.info("Attempting to build Google Sheets service...")
+        try:
+            creds = Credentials.from_service_account_file(settings.GSHEETS_CREDENTIALS_PATH, scopes=SCOPES)
+
+            def request_builder(http, *args, **kwargs):
+                # Bỏ qua http gắn với service, dùng http của luồng đang gọi
+                return HttpRequest(_thread_http(creds), *args, **kwargs)
+
+            _service = build(
+                "sheets", "v4",
+                http=_thread_http(creds),
+                requestBuilder=request_builder,
+                cache_discovery=False,
+            )
+            logger.info("Successfully built Google Sheets service.")
+            return _service
+        except FileNotFoundError:
+            logger.error(f"FATAL: Credentials file not found at '{settings.GSHEETS_CREDENTIALS_PATH}'.")
+            raise
+        except Exception as e:
+            logger.error(f"FATAL: Failed to build Google Sheets service: {e}")
+            raise
 
 def read_sheet_all(service, sheet_id: str, sheet_name: str) -> List[List]:
     """Reads all values from a given sheet."""
@@ -51,6 +86,21 @@ def read_sheet_all(service, sheet_id: str, sheet_name: str) -> List[List]:
         logger.error(f"An unexpected error occurred while reading sheet '{sheet_name}': {e}")
         return []
 
+def read_range(service, sheet_id: str, range_name: str) -> List[List]:
+    """Reads values of an A1 range. Unlike read_sheet_all, API errors are raised to the caller."""
+    resp = service.spreadsheets().values().get(spreadsheetId=sheet_id, range=range_name).execute()
+    return resp.get("values", [])
+
+def batch_get_ranges(service, sheet_id: str, ranges: List[str]) -> List[List[List]]:
+    """Reads several A1 ranges of one spreadsheet in a single values().batchGet call (raises on API errors)."""
+    resp = service.spreadsheets().values().batchGet(spreadsheetId=sheet_id, ranges=ranges).execute()
+    return [vr.get("values", []) for vr in resp.get("valueRanges", [])]
+
+def list_sheet_titles(service, sheet_id: str) -> List[str]:
+    """Returns the tab titles of a spreadsheet (raises on API errors)."""
+    resp = service.spreadsheets().get(spreadsheetId=sheet_id, fields="sheets.properties.title").execute()
+    return [s["properties"]["title"] for s in resp.get("sheets", [])]
+
 def read_form_responses(service, sheet_id: str) -> List[List]:
     """
     Reads form responses from 'Câu trả lời biểu mẫu 1'.
@@ -116,37 +166,28 @@ def batch_update_status(service, sheet_id: str, updates: List[Tuple[int, str]]):
     except Exception as e:
         logger.error(f"Failed to batch update status: {e}")
 
-def parse_rows(values: List[List]) -> List[Dict]:
-    """Parses raw sheet values into structured dictionaries."""
-    if not values or len(values) <= 1:
-        return []
-    
-    parsed_count = 0
-    rows = []
-    for r in values[1:]:
-        if not r or len(r) < 3 or not r[0] or not r[1] or not r[2]:
-            continue
-
-        plate = r[0].strip()
-        d_raw, t_raw = r[1], r[2]
-        d_obj, t_obj = None, None
-
-        if isinstance(d_raw, str) and d_raw:
-            for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
-                try: d_obj = datetime.strptime(d_raw, fmt).date(); break
-                except (ValueError, TypeError): continue
-        
-        if isinstance(t_raw, str) and t_raw:
-            for fmt in ("%H:%M:%S", "%H:%M"):
-                try: t_obj = datetime.strptime(t_raw, fmt).time(); break
-                except (ValueError, TypeError): continue
-        
-        if plate and d_obj and t_obj:
-            rows.append({"plate": plate, "date": d_obj, "time": t_obj})
-            parsed_count += 1
-            
-    logger.info(f"Successfully parsed {parsed_count} valid rows from raw data.")
-    return rows
+def parse_row(r: List) -> Optional[Dict]:
+    """Parses one sheet row [plate, date, time]; returns None if the row is incomplete or invalid."""
+    if not r or len(r) < 3 or not r[0] or not r[1] or not r[2]:
+        return None
+
+    plate = r[0].strip()
+    d_raw, t_raw = r[1], r[2]
+    d_obj, t_obj = None, None
+
+    if isinstance(d_raw, str) and d_raw:
+        for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y"):
+            try: d_obj = datetime.strptime(d_raw, fmt).date(); break
+            except (ValueError, TypeError): continue
+
+    if isinstance(t_raw, str) and t_raw:
+        for fmt in ("%H:%M:%S", "%H:%M"):
+            try: t_obj = datetime.strptime(t_raw, fmt).time(); break
+            except (ValueError, TypeError): continue
+
+    if plate and d_obj and t_obj:
+        return {"plate": plate, "date": d_obj, "time": t_obj}
+    return None
 
 def month_span(start: date, end: date) -> List[Tuple[int,int]]:
     res = []
@@ -158,48 +199,16 @@ def month_span(start: date, end: date) -> List[Tuple[int,int]]:
         if m > 12: m = 1; y += 1
     return res
 
+def archive_sheet_name(year: int, month: int) -> str:
+    """Monthly archive tab name inside the archive spreadsheet of a year (e.g. Thang01_2025)."""
+    return f"Thang{str(month).zfill(2)}_{year}"
+
 def normalize_text(s: Optional[str]) -> str:
     import unicodedata
     return unicodedata.normalize("NFD", (s or "")).encode("ascii", "ignore").decode("ascii").lower().strip()
 
-def filter_and_aggregate(q: Optional[str], start: Optional[date], end: Optional[date]):
-    try:
-        service = _get_service()
-    except Exception:
-        # If service fails to build, return empty data to prevent frontend crash
-        return [], {"daily": {}, "hours": {}, "heatmap": {}, "top10": {}}, {"totalInRange": "Lỗi"}
-
-    values_all = []
-    if settings.GSHEETS_LIVE_SHEET_ID:
-        live_values = read_sheet_all(service, settings.GSHEETS_LIVE_SHEET_ID, settings.GSHEETS_SHEET_NAME)
-        if live_values and len(live_values) > 1:
-            values_all.extend(live_values[1:])
-
-    if start and end:
-        logger.info(f"Date range detected. Reading from archive files between {start} and {end}.")
-        for y, m in month_span(start, end):
-            arch_id = settings.GSHEETS_ARCHIVE_SHEETS.get(str(y))
-            if arch_id:
-                sheet_name = f"Thang{str(m).zfill(2)}_{y}"
-                v = read_sheet_all(service, arch_id, sheet_name)
-                if v and len(v) > 1:
-                    values_all.extend(v[1:])
-    
-    rows = parse_rows([["Số xe", "Ngày", "Giờ"]] + values_all)
-    logger.info(f"Successfully parsed {len(rows)} rows from all sources.")
-
-    qn = normalize_text(q) if q else ""
-    out = []
-    for r in rows:
-        if start and r["date"] and r["date"] < start: continue
-        if end and r["date"] and r["date"] > end: continue
-        if qn and qn not in normalize_text(r["plate"]): continue
-        out.append(r)
-
-    out.sort(key=lambda x: (x["date"] or date.min, x["time"] or datetime.min.time()), reverse=True)
-    logger.info(f"{len(out)} rows remaining after filtering.")
-
-    # --- Aggregation logic (unchanged but now more reliable) ---
+def aggregate_rows(out: List[Dict]) -> Tuple[Dict, Dict]:
+    """Builds chart series and KPIs for already filtered rows."""
     daily, hours, plate_cnt = Counter(), Counter(), Counter()
     heatmap = defaultdict(lambda: Counter())
     for r in out:
@@ -232,7 +241,7 @@ def filter_and_aggregate(q: Optional[str], start: Optional[date], end: Optional[
     }
     kpi = {"totalInRange": total, "peakHour": peak_hour, "topPlate": top_plate, "avgPerDay": avg_per_day}
     
-    return out, charts, kpi
+    return charts, kpi
 
 def delete_row_by_guest_info(service, sheet_id: str, guest_info: dict):
     """
@@ -0,0 +1,161 @@
+# File: backend/app/services/image_derivatives.py
+"""
+Tạo ảnh thu nhỏ (thumb) và ảnh xem trước (preview) dạng WebP cho ảnh upload.
+
+Ảnh gốc chụp từ điện thoại thường vài MB; danh sách trên tablet ở cổng chỉ cần
+ảnh nhỏ. Sau khi service lưu ảnh gốc và commit, gọi image_derivatives.submit():
+việc giải mã / resize / nén chạy trong thread pool (Pillow nhả GIL khi xử lý ảnh),
+không chặn request. Xong thì ghi thumb_path / preview_path vào dòng ảnh tương ứng
+(GuestImage, AssetImage, PurchasingImage).
+
+Ảnh phái sinh không mang EXIF (vị trí GPS, model máy...): hướng xoay EXIF được áp
+vào điểm ảnh trước, rồi lưu WebP không kèm metadata.
+
+Nếu chưa cài Pillow thì bỏ qua; client dùng image_path gốc khi thumb_path rỗng.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.core import config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow là tùy chọn
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DERIVED_DIR = "derived"
+
+# kind -> (cạnh dài tối đa, chất lượng WebP)
+DERIVATIVES = {
+    "thumb": (320, 70),
+    "preview": (1280, 80),
+}
+
+
+def derivative_path(image_path: str, kind: str) -> str:
+    """'guests/abc.jpg' -> 'derived/guests/abc.thumb.webp' (tương đối so với UPLOAD_DIR)."""
+    stem = os.path.splitext(image_path.replace("\\", "/"))[0]
+    return f"{DERIVED_DIR}/{stem}.{kind}.webp"
+
+
+def render_derivatives(image_path: str) -> dict:
+    """Tạo các ảnh phái sinh cho một ảnh gốc. Trả về {kind: đường dẫn tương đối}."""
+    upload_dir = config.settings.UPLOAD_DIR
+    existing = {kind: derivative_path(image_path, kind) for kind in DERIVATIVES}
+    if _is_blob_path(image_path) and all(
+        os.path.exists(os.path.join(upload_dir, p)) for p in existing.values()
+    ):
+        return existing  # Blob đã có phái sinh từ lần upload trùng nội dung trước
+    largest = max(size for size, _ in DERIVATIVES.values())
+    results = {}
+
+    with Image.open(os.path.join(upload_dir, image_path)) as img:
+        # JPEG: giải mã luôn ở tỉ lệ nhỏ (1/2, 1/4, 1/8) đủ cho bản lớn nhất, nhanh hơn nhiều
+        img.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or "A" in img.getbands() else "RGB")
+
+        for kind, (size, quality) in DERIVATIVES.items():
+            rel_path = derivative_path(image_path, kind)
+            dest = os.path.join(upload_dir, rel_path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+            derived = img.copy()
+            derived.thumbnail((size, size), Image.LANCZOS)
+            tmp = f"{dest}.tmp"
+            derived.save(tmp, "WEBP", quality=quality, method=4)
+            os.replace(tmp, dest)
+            results[kind] = rel_path
+    return results
+
+
+def remove_derivatives(image) -> None:
+    """
+    Xóa file phái sinh của một dòng ảnh (khi xóa / lưu trữ ảnh gốc).
+    Ảnh trong blob store dùng chung phái sinh giữa các dòng nên để job GC xóa.
+    """
+    if _is_blob_path(getattr(image, "image_path", None)):
+        return
+    _remove_files(getattr(image, "thumb_path", None), getattr(image, "preview_path", None))
+
+
+def _is_blob_path(image_path) -> bool:
+    from app.modules.blob.service import is_blob_path
+    return is_blob_path(image_path)
+
+
+def _remove_files(*rel_paths) -> None:
+    for rel_path in rel_paths:
+        if not rel_path:
+            continue
+        try:
+            os.remove(os.path.join(config.settings.UPLOAD_DIR, rel_path))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"[image_derivatives] Could not remove {rel_path}: {e}")
+
+
+class ImageDerivativeWorker:
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers or min(4, max(1, (os.cpu_count() or 2) // 2))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="image-derivatives"
+                )
+            return self._executor
+
+    def submit(self, model, image_id: int, image_path: str):
+        """Xếp hàng tạo ảnh phái sinh cho dòng `model` có id `image_id`. Gọi SAU khi commit."""
+        if not self.enabled:
+            return None
+        return self._get_executor().submit(self._process, model, image_id, image_path)
+
+    def _process(self, model, image_id: int, image_path: str) -> None:
+        from app.core.database import SessionLocal
+
+        try:
+            paths = render_derivatives(image_path)
+        except Exception as e:
+            logger.warning(f"[image_derivatives] Could not process {image_path}: {e}")
+            return
+
+        db = SessionLocal()
+        try:
+            updated = db.query(model).filter(model.id == image_id).update(
+                {model.thumb_path: paths["thumb"], model.preview_path: paths["preview"]},
+                synchronize_session=False,
+            )
+            db.commit()
+            if not updated and not _is_blob_path(image_path):
+                # Ảnh đã bị xóa trong lúc đang xử lý
+                _remove_files(*paths.values())
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[image_derivatives] Could not save paths for {image_path}: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+image_derivatives = ImageDerivativeWorker()
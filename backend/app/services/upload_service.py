@@ -0,0 +1,138 @@
+# File: backend/app/services/upload_service.py
+"""
+Nhận file upload theo từng khối thay vì `await file.read()` toàn bộ vào bộ nhớ.
+
+receive_upload() đọc UploadFile từng khối (CHUNK_SIZE), ghi bất đồng bộ vào file tạm
+trong UPLOAD_DIR/tmp (cùng ổ đĩa với nơi lưu cuối nên os.replace là atomic), vừa ghi
+vừa tính SHA-256 và kiểm tra:
+  - kích thước: vượt MAX_UPLOAD_MB -> dừng đọc ngay, trả 413;
+  - loại file: nhận diện theo chữ ký đầu file (magic bytes), không tin content-type
+    hay phần mở rộng do client gửi -> sai loại trả 415.
+
+Kết quả là StagedUpload; service lưu tiếp bằng blob_service.put_staged() (đổi tên file
+tạm vào blob store). File tạm luôn bị xóa khi thoát khỏi context dù lưu hay lỗi.
+
+Ví dụ trong router:
+    async with receive_upload(file) as upload:
+        image = await run_in_threadpool(guest_service.upload_guest_image, db, guest_id, upload)
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import anyio
+from fastapi import UploadFile
+
+from app.core import config
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TMP_DIR = "tmp"
+CHUNK_SIZE = 256 * 1024
+
+# content-type -> (chữ ký đầu file, phần mở rộng lưu trữ)
+IMAGE_TYPES: Dict[str, str] = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+class UploadRejected(ValueError):
+    """File upload không hợp lệ (quá lớn / sai loại). status_code dùng cho HTTPException."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class StagedUpload:
+    path: str              # file tạm (tuyệt đối)
+    filename: str          # tên gốc do client gửi (chỉ để hiển thị / log)
+    content_type: str      # loại nhận diện từ nội dung file
+    extension: str
+    size: int
+    sha256: str
+
+    def open(self):
+        return open(self.path, "rb")
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def max_upload_bytes() -> int:
+    return config.settings.MAX_UPLOAD_MB * 1024 * 1024
+
+
+@asynccontextmanager
+async def receive_upload(
+    file: UploadFile,
+    max_bytes: Optional[int] = None,
+    allowed_types: Dict[str, str] = IMAGE_TYPES,
+) -> AsyncIterator[StagedUpload]:
+    """Stream `file` ra file tạm (giới hạn kích thước / loại). Xóa file tạm khi thoát."""
+    max_bytes = max_bytes or max_upload_bytes()
+    if file.size is not None and file.size > max_bytes:
+        raise UploadRejected(_too_large_message(max_bytes), 413)
+
+    tmp_dir = os.path.join(config.settings.UPLOAD_DIR, UPLOAD_TMP_DIR)
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    os.close(fd)
+
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        content_type = None
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                if content_type is None:
+                    # Khối đầu luôn đủ dài cho chữ ký các định dạng ảnh
+                    content_type = sniff_image_type(chunk)
+                    if content_type not in allowed_types:
+                        raise UploadRejected(
+                            f"Tệp {file.filename} không phải là ảnh hợp lệ (JPEG, PNG, GIF, WebP).", 415
+                        )
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(_too_large_message(max_bytes), 413)
+                digest.update(chunk)
+                await out.write(chunk)
+
+        if size == 0:
+            raise UploadRejected(f"Tệp {file.filename} rỗng.", 400)
+
+        yield StagedUpload(
+            path=tmp_path,
+            filename=file.filename or "",
+            content_type=content_type,
+            extension=allowed_types[content_type],
+            size=size,
+            sha256=digest.hexdigest(),
+        )
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError as e:
+                logger.warning(f"[upload] Could not remove temp file {tmp_path}: {e}")
+
+
+def _too_large_message(max_bytes: int) -> str:
+    return f"Tệp vượt quá dung lượng cho phép ({max_bytes // (1024 * 1024)} MB)."
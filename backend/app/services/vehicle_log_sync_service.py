@@ -0,0 +1,241 @@
+# File: backend/app/services/vehicle_log_sync_service.py
+"""
+Đồng bộ nhật ký xe từ Google Sheets vào bảng cục bộ vehicle_log_entries.
+
+Nguồn: sheet live (GSHEETS_LIVE_SHEET_ID / GSHEETS_SHEET_NAME) và các tab lưu trữ
+ThangMM_YYYY trong file lưu trữ của từng năm (GSHEETS_ARCHIVE_SHEETS).
+
+Mỗi sheet có một high-water mark (vehicle_log_sheets.rows_synced): lần chạy sau chỉ đọc
+từ dòng cuối đã đọc trở đi. Dòng cuối đó được đọc lại và so với nội dung đã lưu; khác
+(sheet bị xóa bớt, ghi lại, chuyển sang lưu trữ...) thì đọc lại toàn bộ sheet đó.
+Dòng cuối chưa đủ dữ liệu (đang nhập dở) không được tính vào mốc để lần sau đọc lại.
+
+Mỗi file lưu trữ chỉ tốn 2 lượt gọi API (liệt kê tab + một values().batchGet cho mọi tab
+tháng); sheet live và các file lưu trữ được đọc song song, ghi CSDL tuần tự sau đó.
+
+Job chạy định kỳ (VEHICLE_LOG_SYNC_SECONDS) và một lần full mỗi đêm để bắt các sửa đổi
+ở dòng cũ. Lỗi Google chỉ làm job bỏ qua lượt đó; /vehicle-log vẫn trả dữ liệu đã có.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models import VehicleLogEntry, VehicleLogSheetState, get_local_time
+from ..modules.vehicle_log.model import VEHICLE_LOG_LIVE_SOURCE
+from .gsheets_reader import (
+    _get_service, archive_sheet_name, batch_get_ranges, list_sheet_titles, normalize_text, parse_row, read_range,
+)
+
+logger = logging.getLogger("[Vehicle Log Sync]")
+
+# Số file (sheet live + mỗi file lưu trữ theo năm) được đọc đồng thời
+SHEETS_FETCH_WORKERS = 4
+
+# Job định kỳ và job full ban đêm không được ghi đè lên nhau
+_sync_lock = threading.Lock()
+
+# Pool sống suốt tiến trình: mỗi luồng giữ http keep-alive riêng của client Sheets
+# (gsheets_reader), tạo pool mới mỗi lượt sẽ bỏ mất các kết nối đó
+_fetch_pool: Optional[ThreadPoolExecutor] = None
+_fetch_pool_lock = threading.Lock()
+
+
+def _get_fetch_pool() -> ThreadPoolExecutor:
+    global _fetch_pool
+    with _fetch_pool_lock:
+        if _fetch_pool is None:
+            _fetch_pool = ThreadPoolExecutor(max_workers=SHEETS_FETCH_WORKERS, thread_name_prefix="vehicle-log-sync")
+        return _fetch_pool
+
+
+def shutdown_fetch_pool(wait: bool = False) -> None:
+    """Gọi khi tắt ứng dụng."""
+    global _fetch_pool
+    with _fetch_pool_lock:
+        if _fetch_pool is not None:
+            _fetch_pool.shutdown(wait=wait)
+            _fetch_pool = None
+
+
+def _fingerprint(row: Optional[List]) -> Optional[str]:
+    if row is None:
+        return None
+    return json.dumps(row[:3], ensure_ascii=False)
+
+
+@dataclass
+class _Fetched:
+    sheet_id: str
+    sheet_name: str
+    first_row: int          # số dòng trên sheet của values[0]
+    values: List[List]
+
+
+def _start_row(state: Optional[VehicleLogSheetState], sheet_id: str, sheet_name: str, full: bool) -> int:
+    """Dòng bắt đầu đọc: dòng cuối đã đồng bộ (đọc lại để kiểm tra), hoặc 1 nếu đọc lại từ đầu."""
+    if full or state is None or state.sheet_id != sheet_id or state.sheet_name != sheet_name:
+        return 1
+    return max(state.rows_synced, 1)
+
+
+def _fetch_live(service, sheet_id: str, sheet_name: str, first_row: int) -> Dict[str, _Fetched]:
+    values = read_range(service, sheet_id, f"'{sheet_name}'!A{first_row}:C")
+    return {VEHICLE_LOG_LIVE_SOURCE: _Fetched(sheet_id, sheet_name, first_row, values)}
+
+
+def _fetch_archive(service, year: str, archive_id: str, marks: Dict[str, int]) -> Dict[str, _Fetched]:
+    """Mọi tab tháng của một file lưu trữ: 1 lần liệt kê tab + 1 lần values().batchGet."""
+    titles = set(list_sheet_titles(service, archive_id))
+    names = [name for name in (archive_sheet_name(year, m) for m in range(1, 13)) if name in titles]
+    if not names:
+        return {}
+    ranges = [f"'{name}'!A{marks[name]}:C" for name in names]
+    value_ranges = batch_get_ranges(service, archive_id, ranges)
+    return {
+        name: _Fetched(archive_id, name, marks[name], values)
+        for name, values in zip(names, value_ranges)
+    }
+
+
+def _fetch_all(service, states: Dict[str, VehicleLogSheetState], full: bool) -> Tuple[Dict[str, _Fetched], Set[str]]:
+    """
+    Đọc sheet live và các file lưu trữ song song (tối đa SHEETS_FETCH_WORKERS luồng).
+    Trả về dữ liệu theo source và tập file lưu trữ đã đọc được (để gỡ tab không còn tồn tại).
+    """
+    pool = _get_fetch_pool()
+    tasks = {}
+    if settings.GSHEETS_LIVE_SHEET_ID:
+        sheet_id, sheet_name = settings.GSHEETS_LIVE_SHEET_ID, settings.GSHEETS_SHEET_NAME
+        first_row = _start_row(states.get(VEHICLE_LOG_LIVE_SOURCE), sheet_id, sheet_name, full)
+        tasks[pool.submit(_fetch_live, service, sheet_id, sheet_name, first_row)] = (VEHICLE_LOG_LIVE_SOURCE, None)
+    for year, archive_id in settings.GSHEETS_ARCHIVE_SHEETS.items():
+        marks = {
+            name: _start_row(states.get(name), archive_id, name, full)
+            for name in (archive_sheet_name(year, m) for m in range(1, 13))
+        }
+        tasks[pool.submit(_fetch_archive, service, year, archive_id, marks)] = (f"archive {year}", archive_id)
+
+    fetched: Dict[str, _Fetched] = {}
+    listed: Set[str] = set()
+    for future, (label, archive_id) in tasks.items():
+        try:
+            fetched.update(future.result())
+        except Exception as e:
+            logger.error(f"Could not read {label}: {e}")
+            continue
+        if archive_id:
+            listed.add(archive_id)
+    return fetched, listed
+
+
+def _reset(db: Session, state: VehicleLogSheetState) -> None:
+    db.query(VehicleLogEntry).filter(VehicleLogEntry.source == state.source).delete(synchronize_session=False)
+    state.rows_synced = 0
+    state.last_row = None
+
+
+def _apply_sheet(db: Session, service, source: str, fetched: _Fetched, full: bool) -> int:
+    """Ghi các dòng mới của một sheet vào bảng mirror. Trả về số dòng đã thêm."""
+    sheet_id, sheet_name = fetched.sheet_id, fetched.sheet_name
+    state = db.get(VehicleLogSheetState, source)
+    if state is None:
+        state = VehicleLogSheetState(source=source, sheet_id=sheet_id, sheet_name=sheet_name, rows_synced=0)
+        db.add(state)
+    elif full or state.sheet_id != sheet_id or state.sheet_name != sheet_name:
+        _reset(db, state)
+        state.sheet_id, state.sheet_name = sheet_id, sheet_name
+
+    # values bắt đầu từ dòng cuối đã đồng bộ: dòng đó phải không đổi
+    first_row, values = fetched.first_row, fetched.values
+    if state.rows_synced:
+        if not values or _fingerprint(values[0]) != state.last_row:
+            logger.info(f"Sheet '{source}' changed above row {state.rows_synced}; re-reading it fully.")
+            _reset(db, state)
+            first_row = 1
+            values = read_range(service, sheet_id, f"'{sheet_name}'!A1:C")
+        else:
+            first_row += 1
+            values = values[1:]
+
+    # Bỏ các dòng cuối chưa đủ dữ liệu (dòng 1 là tiêu đề, luôn được tính)
+    end = len(values)
+    while end > 0 and first_row + end - 1 > 1 and parse_row(values[end - 1]) is None:
+        end -= 1
+
+    entries = []
+    for offset, raw in enumerate(values[:end]):
+        row_number = first_row + offset
+        row = parse_row(raw) if row_number > 1 else None
+        if row:
+            entries.append({
+                "source": source,
+                "row_number": row_number,
+                "plate": row["plate"],
+                "plate_search": normalize_text(row["plate"]),
+                "day": row["date"],
+                "time": row["time"],
+            })
+    if entries:
+        db.execute(insert(VehicleLogEntry), entries)
+
+    if end:
+        state.rows_synced = first_row + end - 1
+        state.last_row = _fingerprint(values[end - 1])
+    state.synced_at = get_local_time()
+    return len(entries)
+
+
+def sync_vehicle_log_mirror(full: bool = False) -> None:
+    """Background job: mirror live + archived vehicle entries into vehicle_log_entries."""
+    try:
+        service = _get_service()
+    except Exception as e:
+        logger.error(f"Could not build GSheets service: {e}")
+        return
+
+    with _sync_lock:
+        _sync_all(service, full)
+
+
+def _sync_all(service, full: bool) -> None:
+    db: Session = SessionLocal()
+    try:
+        states = {state.source: state for state in db.query(VehicleLogSheetState).all()}
+        fetched, listed = _fetch_all(service, states, full)
+
+        added = 0
+        for source, data in fetched.items():
+            try:
+                added += _apply_sheet(db, service, source, data, full)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to sync sheet '{source}': {e}")
+
+        # Tab lưu trữ đã bị xóa / file không còn cấu hình: gỡ khỏi mirror
+        configured = set(settings.GSHEETS_ARCHIVE_SHEETS.values())
+        if settings.GSHEETS_LIVE_SHEET_ID:
+            configured.add(settings.GSHEETS_LIVE_SHEET_ID)
+        for state in db.query(VehicleLogSheetState).all():
+            if state.source in fetched:
+                continue
+            if state.sheet_id in listed or state.sheet_id not in configured:
+                logger.info(f"Removing sheet '{state.source}' from the vehicle log mirror.")
+                _reset(db, state)
+                db.delete(state)
+        db.commit()
+        if added:
+            logger.info(f"Vehicle log mirror: {added} new row(s).")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Vehicle log sync failed: {e}", exc_info=True)
+    finally:
+        db.close()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Module Name: excel_export.py
+Description: Engine xuất Excel dùng chung cho các module (khách, tài sản, mua sắm,
+             người dùng, nhật ký xe).
+
+Mỗi module khai báo một ExcelSheetSpec (tiêu đề, font, danh sách ExcelColumn) và
+truyền vào một iterable các dòng (thường là query SQLAlchemy với yield_per), engine
+sẽ ghi lần lượt từng dòng bằng xlsxwriter ở chế độ constant_memory vào file tạm
+trên đĩa rồi trả về StreamingResponse đọc file đó theo từng khối. Bộ nhớ dùng
+không phụ thuộc số dòng xuất.
+"""
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+import xlsxwriter
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_YIELD_PER = 1000
+_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ExcelColumn:
+    """
+    Một cột xuất Excel.
+
+    kind:
+      - "text"      : ghi dạng chuỗi
+      - "number"    : ghi số (None -> ô trống)
+      - "datetime"  : ghi ngày giờ Excel theo num_format (mặc định dd/mm/yyyy hh:mm)
+      - "date"      : như datetime, mặc định dd/mm/yyyy
+      - "row_number": số thứ tự (STT), không dùng `value`
+    width: None -> tự co theo độ dài dữ liệu dài nhất.
+    """
+    header: str
+    value: Optional[Callable[[Any], Any]] = None
+    kind: str = "text"
+    width: Optional[float] = None
+    num_format: Optional[str] = None
+
+
+ROW_NUMBER = ExcelColumn("STT", kind="row_number", width=5)
+
+_DEFAULT_NUM_FORMATS = {"datetime": "dd/mm/yyyy hh:mm", "date": "dd/mm/yyyy"}
+
+
+@dataclass(frozen=True)
+class ExcelSheetSpec:
+    sheet_name: str
+    columns: Sequence[ExcelColumn]
+    title: Optional[str] = None           # Dòng tiêu đề gộp ô phía trên header
+    title_format: dict = field(default_factory=dict)
+    header_format: dict = field(default_factory=dict)
+    cell_format: dict = field(default_factory=dict)
+    landscape: bool = False
+    paper: Optional[int] = None
+
+
+def write_xlsx(spec: ExcelSheetSpec, rows: Iterable[Any], path: str) -> int:
+    """Ghi `rows` ra file xlsx tại `path`. Trả về số dòng dữ liệu đã ghi."""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "remove_timezone": True})
+    try:
+        worksheet = workbook.add_worksheet(spec.sheet_name)
+        if spec.landscape:
+            worksheet.set_landscape()
+        if spec.paper:
+            worksheet.set_paper(spec.paper)
+
+        header_fmt = workbook.add_format(spec.header_format)
+        cell_fmt = workbook.add_format(spec.cell_format)
+        col_fmts = [
+            workbook.add_format({**spec.cell_format, "num_format": col.num_format or _DEFAULT_NUM_FORMATS[col.kind]})
+            if col.kind in _DEFAULT_NUM_FORMATS else cell_fmt
+            for col in spec.columns
+        ]
+        widths = [len(col.header) for col in spec.columns]
+
+        row_idx = 0
+        if spec.title:
+            last_col = len(spec.columns) - 1
+            title_fmt = workbook.add_format(spec.title_format)
+            if last_col > 0:
+                worksheet.merge_range(0, 0, 0, last_col, spec.title, title_fmt)
+            else:
+                worksheet.write_string(0, 0, spec.title, title_fmt)
+            row_idx = 1
+
+        for col_idx, col in enumerate(spec.columns):
+            worksheet.write_string(row_idx, col_idx, col.header, header_fmt)
+        row_idx += 1
+
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            for col_idx, col in enumerate(spec.columns):
+                value = count if col.kind == "row_number" else col.value(row)
+                length = _write_cell(worksheet, row_idx, col_idx, col.kind, value, col_fmts[col_idx])
+                if length > widths[col_idx]:
+                    widths[col_idx] = length
+            row_idx += 1
+
+        # Độ rộng cột lưu riêng, ghi vào file khi close() nên đặt sau cùng được
+        for col_idx, col in enumerate(spec.columns):
+            worksheet.set_column(col_idx, col_idx, col.width if col.width is not None else widths[col_idx] + 2)
+    finally:
+        workbook.close()
+    return count
+
+
+def _as_datetime(value):
+    """
+    Giá trị cột ngày giờ -> datetime/date để ghi bằng write_datetime theo num_format.
+    Chuỗi ISO (cột đọc qua SQL thô, dữ liệu ghi ngoài ứng dụng...) được parse; không
+    parse được thì trả lại nguyên giá trị và ô được ghi dạng chuỗi.
+    """
+    if isinstance(value, (datetime, date)):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.strip())
+        except ValueError:
+            return value
+    return value
+
+
+def _write_cell(worksheet, row: int, col: int, kind: str, value, fmt) -> int:
+    """Ghi một ô theo kiểu cột, trả về độ dài hiển thị (để tự co độ rộng cột)."""
+    if value is None or value == "":
+        worksheet.write_blank(row, col, None, fmt)
+        return 0
+    if kind in ("datetime", "date"):
+        value = _as_datetime(value)
+        if isinstance(value, (datetime, date)):
+            worksheet.write_datetime(row, col, value, fmt)
+            return 16 if kind == "datetime" else 10
+    if kind in ("number", "row_number") and isinstance(value, (int, float)):
+        worksheet.write_number(row, col, value, fmt)
+        return len(str(value))
+    text = str(value)
+    worksheet.write_string(row, col, text, fmt)
+    return len(text)
+
+
+def _iter_file(path: str) -> Iterator[bytes]:
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"[excel_export] Could not remove temp file {path}: {e}")
+
+
+def stream_xlsx(spec: ExcelSheetSpec, rows: Iterable[Any], filename: str) -> StreamingResponse:
+    """
+    Xuất `rows` ra file tạm rồi trả về StreamingResponse. File được tạo xong trước
+    khi gửi response nên lỗi khi ghi vẫn được router trả về thành HTTP 500.
+    """
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_xlsx(spec, rows, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return StreamingResponse(
+        _iter_file(path),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(os.path.getsize(path)),
+        },
+    )
@@ -477,3 +477,88 @@ def send_asset_event_to_archive_background(
 
 # === KẾT THÚC CẢI TIẾN 4 ===
 
+
+# === Sự kiện theo đoàn: MỘT tin nhắn lưu trữ cho cả nhóm khách + tài sản ===
+# event_type -> (icon, tiêu đề, nhãn dòng cuối)
+_BATCH_EVENTS = {
+    "Đăng ký mới (theo đoàn)": ("🆕", "KHÁCH MỚI ĐĂNG KÝ (THEO ĐOÀN)", "Đăng ký bởi"),
+    "Xác nhận vào cổng": ("✅", "XÁC NHẬN VÀO CỔNG THEO ĐOÀN", "Xác nhận bởi"),
+    "Xác nhận ra cổng": ("🚪", "XÁC NHẬN RA CỔNG THEO ĐOÀN", "Xác nhận bởi"),
+}
+
+def format_batch_event_for_archive(
+    guests: List[models.Guest],
+    assets: List[models.AssetLog],
+    event_type: str,
+    user_who_triggered: models.User
+) -> str:
+    """Định dạng sự kiện theo đoàn (đăng ký / vào / ra cổng) cho kênh lưu trữ."""
+    def esc(value) -> str:
+        return str(value or 'N/A').replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    event_icon, event_title, footer = _BATCH_EVENTS.get(
+        event_type, ("ℹ️", f"{event_type.upper()} THEO ĐOÀN", "Thực hiện bởi")
+    )
+    now_short = get_local_time().strftime('%H:%M %d/%m/%Y')
+
+    lines = [f"{event_icon} <b>[SỰ KIỆN] {event_title}</b>", ""]
+    if guests:
+        lines.append(f"👥 <b>Khách ({len(guests)}):</b>")
+        for i, guest in enumerate(guests, 1):
+            registered_by = guest.registered_by.full_name if guest.registered_by else "Không rõ"
+            lines.append(
+                f"{i}. {esc(guest.full_name)} ({esc(guest.id_card_number)}) - "
+                f"BKS: {esc(guest.license_plate)} - Đơn vị: {esc(guest.supplier_name)} - ĐK: {esc(registered_by)}"
+            )
+        lines.append("")
+    if assets:
+        lines.append(f"📦 <b>Tài sản ({len(assets)}):</b>")
+        for i, asset in enumerate(assets, 1):
+            lines.append(
+                f"{i}. {esc(asset.asset_description or asset.description_reason)} x{asset.quantity or 1} - "
+                f"{esc(asset.full_name)} ({esc(asset.department)}) → {esc(asset.destination)}"
+            )
+        lines.append("")
+    lines.append(f"{footer}: {esc(user_who_triggered.full_name)} (lúc {now_short})")
+
+    message = "\n".join(lines)
+    if len(message) > 4096:
+        message = message[:4090] + "\n..."
+    return message
+
+
+def send_batch_event_to_archive_background(
+    guest_ids: List[int],
+    asset_ids: List[int],
+    event_type: str,
+    triggered_by_user_id: int
+):
+    """Hàm chạy nền: gửi một tin nhắn tổng hợp cho một sự kiện theo đoàn."""
+    if not can_send_archive():
+        logger.info("Bỏ qua gửi sự kiện lưu trữ: Kênh lưu trữ chưa được cấu hình hoặc Telegram bị tắt.")
+        return
+
+    db: Session = SessionLocal()
+    try:
+        guests = db.query(models.Guest)\
+                   .options(joinedload(models.Guest.registered_by))\
+                   .filter(models.Guest.id.in_(guest_ids))\
+                   .order_by(models.Guest.id)\
+                   .all() if guest_ids else []
+        assets = db.query(models.AssetLog)\
+                   .filter(models.AssetLog.id.in_(asset_ids))\
+                   .order_by(models.AssetLog.id)\
+                   .all() if asset_ids else []
+        triggered_by_user = db.query(models.User).get(triggered_by_user_id)
+        if not triggered_by_user or not (guests or assets):
+            logger.error(f"Không đủ dữ liệu để gửi sự kiện theo đoàn (user {triggered_by_user_id}).")
+            return
+
+        message_text = format_batch_event_for_archive(guests, assets, event_type, triggered_by_user)
+        send_telegram_message(message_text, TELEGRAM_ARCHIVE_CHAT_ID)
+        logger.info(f"Đã gửi sự kiện '{event_type}' theo đoàn ({len(guests)} khách, {len(assets)} tài sản).")
+    except Exception as e:
+        logger.error(f"Lỗi khi gửi sự kiện theo đoàn: {e}", exc_info=True)
+    finally:
+        db.close()
+
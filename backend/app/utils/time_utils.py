@@ -6,3 +6,15 @@ def get_local_time():
     """Returns the current time in the timezone specified in settings."""
     tz = pytz.timezone(settings.TZ)
     return datetime.now(tz)
+
+def to_utc_naive(dt):
+    """
+    Chuẩn hóa datetime về UTC dạng naive (để lưu cột *_utc).
+    - aware: đổi sang UTC
+    - naive: coi là giờ địa phương theo settings.TZ
+    """
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = pytz.timezone(settings.TZ).localize(dt)
+    return dt.astimezone(pytz.utc).replace(tzinfo=None)
@@ -42,18 +42,15 @@ export function useDashboardData() {
   })
   const userActivity = ref({ users: [], date_range: 'All time' })
 
-  // Helper: Get section name by index
-  function getSectionName(index) {
-    const names = [
-      'Khách theo ngày',
-      'Tài sản theo ngày',
-      'Top xe',
-      'Tổng quan',
-      'Kiểm soát TS',
-      'An ninh khách'
-    ]
-    return names[index]
-  }
+  // Widgets loaded through the combined /reports/dashboard endpoint (one request)
+  const dashboardWidgets = [
+    { id: 'guests_daily', name: 'Khách theo ngày' },
+    { id: 'assets_daily', name: 'Tài sản theo ngày' },
+    { id: 'guests_by_plate', name: 'Top xe' },
+    { id: 'system_overview', name: 'Tổng quan', critical: true },
+    { id: 'asset_control', name: 'Kiểm soát TS', critical: true },
+    { id: 'visitor_security_index', name: 'An ninh khách' }
+  ]
 
   // Helper: API with timeout protection (15s)
   function apiWithTimeout(url, options, timeout = 15000) {
@@ -65,57 +62,55 @@ export function useDashboardData() {
     ])
   }
 
-  // Critical sections that need prominent error display
-  const criticalSections = [3, 4] // System Overview, Asset Control
+  function applyWidget(id, data) {
+    switch (id) {
+      case 'guests_daily':
+        Object.assign(guestsDaily, data)
+        break
+      case 'assets_daily':
+        assetsDaily.labels = data.labels || []
+        assetsDaily.outSeries = data.out_series || []
+        assetsDaily.inSeries = data.in_series || []
+        assetsDaily.cumulativeSeries = data.cumulative_series || []
+        break
+      case 'guests_by_plate':
+        Object.assign(guestsByPlate, data)
+        break
+      case 'system_overview':
+        systemOverview.value = data
+        break
+      case 'asset_control':
+        assetControl.value = data
+        break
+      case 'visitor_security_index':
+        visitorSecurity.value = data
+        break
+    }
+  }
 
-  // Main data loading function with Promise.allSettled
+  // Main data loading function: all widgets in one request
   async function loadDashboardData(params) {
     loading.value = true
     errors.value = []
 
     try {
-      const results = await Promise.allSettled([
-        apiWithTimeout('/reports/guests_daily', { params }),
-        apiWithTimeout('/reports/assets_daily', { params }),
-        apiWithTimeout('/reports/guests_by_plate', { params }),
-        apiWithTimeout('/reports/system-overview', { params }),
-        apiWithTimeout('/reports/asset-control', { params }),
-        apiWithTimeout('/reports/visitor-security-index', { params })
-      ])
+      const response = await apiWithTimeout('/reports/dashboard', {
+        params: { ...params, widgets: dashboardWidgets.map(w => w.id).join(',') }
+      })
+      const { widgets = {}, errors: widgetErrors = {} } = response.data
 
-      // Handle each result independently
-      results.forEach((result, index) => {
-        if (result.status === 'fulfilled') {
-          switch (index) {
-            case 0:
-              Object.assign(guestsDaily, result.value.data)
-              break
-            case 1:
-              console.log('🔧 [DEBUG] Assets Daily API Response:', result.value.data)
-              const apiData = result.value.data; assetsDaily.labels = apiData.labels || []; assetsDaily.outSeries = apiData.out_series || []; assetsDaily.inSeries = apiData.in_series || []; assetsDaily.cumulativeSeries = apiData.cumulative_series || []
-              break
-            case 2:
-              Object.assign(guestsByPlate, result.value.data)
-              break
-            case 3:
-              systemOverview.value = result.value.data
-              break
-            case 4:
-              assetControl.value = result.value.data
-              break
-            case 5:
-              visitorSecurity.value = result.value.data
-              break
-          }
+      // Handle each widget independently
+      dashboardWidgets.forEach(widget => {
+        if (widget.id in widgets) {
+          applyWidget(widget.id, widgets[widget.id])
         } else {
           // Log error but don't block UI
-          console.error(`API ${getSectionName(index)} failed:`, result.reason)
-
-          const isCritical = criticalSections.includes(index)
+          const reason = widgetErrors[widget.id] || 'No data'
+          console.error(`Widget ${widget.name} failed:`, reason)
           errors.value.push({
-            section: getSectionName(index),
-            error: result.reason,
-            critical: isCritical
+            section: widget.name,
+            error: reason,
+            critical: !!widget.critical
           })
         }
       })
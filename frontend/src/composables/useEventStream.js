@@ -0,0 +1,88 @@
+import { ref, onBeforeUnmount } from 'vue'
+import api from '../api'
+
+// Các loại sự kiện backend phát (app/services/event_broker.py)
+const EVENT_TYPES = [
+  'guest.created', 'guest.bulk_created', 'guest.checked_in', 'guest.checked_out', 'guest.batch_confirmed', 'guest.no_show',
+  'asset.created', 'asset.checked_out', 'asset.returned', 'asset.deleted',
+  'notification.created', 'resync'
+]
+
+// Kết nối SSE /events/stream. URL chỉ mang vé dùng một lần (POST /events/ticket),
+// không mang access token; mỗi lần kết nối lại xin vé mới.
+// handlers: { 'guest.created': fn, ..., '*': fn (mọi loại khác), open: fn (mỗi lần kết nối/kết nối lại) }
+export function useEventStream(handlers = {}) {
+  const connected = ref(false)
+  let source = null
+  let retryTimer = null
+  let stopped = false
+  let connecting = false
+
+  function dispatch (e) {
+    let event = null
+    try {
+      event = JSON.parse(e.data)
+    } catch (err) {
+      return
+    }
+    const fn = handlers[event.type] || handlers['*']
+    if (fn) fn(event)
+  }
+
+  function scheduleReconnect () {
+    if (stopped || retryTimer) return
+    retryTimer = setTimeout(() => {
+      retryTimer = null
+      if (!stopped) connect()
+    }, 5000)
+  }
+
+  async function connect () {
+    stopped = false
+    if (source || connecting) return
+    const token = localStorage.getItem('token')
+    if (!token || token === 'null' || token === 'undefined') return
+    connecting = true
+    let ticket = null
+    try {
+      const res = await api.post('/events/ticket')
+      ticket = res.data.ticket
+    } catch (err) {
+      scheduleReconnect()
+      return
+    } finally {
+      connecting = false
+    }
+    if (stopped || source) return
+    const url = `${api.defaults.baseURL}/events/stream?ticket=${encodeURIComponent(ticket)}`
+    source = new EventSource(url)
+    source.onopen = () => {
+      connected.value = true
+      if (handlers.open) handlers.open()
+    }
+    for (const type of EVENT_TYPES) {
+      source.addEventListener(type, dispatch)
+    }
+    source.onerror = () => {
+      connected.value = false
+      // Vé chỉ dùng được một lần: không để trình duyệt tự nối lại với vé cũ,
+      // đóng kết nối và xin vé mới (token đã được làm mới bởi interceptor của api)
+      if (source) source.close()
+      source = null
+      scheduleReconnect()
+    }
+  }
+
+  function close () {
+    stopped = true
+    if (retryTimer) clearTimeout(retryTimer)
+    retryTimer = null
+    if (source) source.close()
+    source = null
+    connected.value = false
+  }
+
+  onBeforeUnmount(close)
+
+  return { connected, connect, close }
+}
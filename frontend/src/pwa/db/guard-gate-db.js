@@ -13,6 +13,14 @@ export async function getGuestsSnapshot(userId) {
   const key = `guests:list:${userId}`;
   return db.snapshots.get(key);
 }
+// Trạng thái delta-sync (/sync/changes): version + bản ghi theo id
+export async function getSyncState(userId) {
+  const snap = await db.snapshots.get(`sync:state:${userId}`);
+  return snap?.data || null;
+}
+export async function saveSyncState(userId, data) {
+  await db.snapshots.put({ key: `sync:state:${userId}`, data, cachedAt: new Date().toISOString() });
+}
 export async function enqueueConfirm(guestId) {
   await db.queue.add({ type: 'confirmIn', payload: { guestId }, createdAt: Date.now() });
 }